@@ -4,7 +4,9 @@ from datetime import datetime
 
 from .. import db
 from ..services.twilio_client import send_whatsapp
+from ..services.day_scheduler import schedule_day
 from ..services.scheduler import create_one_time_schedule
+from ..services.week_snapshot import WeekSnapshot
 
 AREA_EMOJI = {
     "teaching": "\U0001F7E6",
@@ -31,12 +33,8 @@ def send_morning_briefing():
         dayplan = _auto_generate_dayplan(today, week_id, day_name.lower())
 
     # Week stats
-    week_tasks = db.get_tasks_for_week(week_id)
-    active_week = [t for t in week_tasks if t.get("status") != "dropped"]
-    done_week = [t for t in active_week if t.get("status") == "done"]
-    week_total = len(active_week)
-    week_done = len(done_week)
-    week_pct = round(week_done / week_total * 100) if week_total else 0
+    week = WeekSnapshot(db.get_tasks_for_week(week_id), project_map)
+    week_total, week_done, week_pct = week.total, week.done, week.pct_done
 
     # Today's tasks from blocks
     blocks = dayplan.get("blocks", [])
@@ -87,13 +85,11 @@ def send_morning_briefing():
     summary_parts = [f"\u23F1 {total_hours}h planned"]
     if urgent_count:
         summary_parts.append(f"\U0001F534 {urgent_count} urgent")
+    if dayplan.get("unplaced"):
+        summary_parts.append(f"\U0001F4E6 {len(dayplan['unplaced'])} didn't fit today")
 
     # Check neglected areas
-    areas_present = set()
-    for t in active_week:
-        proj = project_map.get(t.get("project_id"), {})
-        areas_present.add(proj.get("area", ""))
-    neglected = [a for a in ["teaching", "research", "admin", "personal"] if a not in areas_present]
+    neglected = week.neglected()
     if neglected:
         summary_parts.append(f"\u26A0 {', '.join(a.title() for a in neglected)} has 0 tasks this week")
 
@@ -126,44 +122,16 @@ def send_morning_briefing():
 def _auto_generate_dayplan(today: str, week_id: str, day_name: str) -> dict:
     """Auto-generate a day plan from assigned tasks."""
     tasks = db.get_tasks_for_week(week_id, day=day_name)
-    active = [t for t in tasks if t.get("status") not in ("dropped", "done")]
-
-    prio = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
-    active.sort(key=lambda t: prio.get(t.get("priority", "normal"), 2))
-
-    blocks = []
-    current_min = 480  # 08:00
-
-    for task in active:
-        hours = task.get("estimated_hours", 1)
-        duration = int(hours * 60)
-
-        # Lunch break
-        if current_min < 720 and current_min + duration > 720:
-            blocks.append({"start": "12:00", "end": "13:00", "task_id": None, "type": "break", "label": "Lunch"})
-            current_min = 780
-
-        if current_min >= 1080:  # 18:00
-            break
-
-        sh, sm = divmod(current_min, 60)
-        eh, em = divmod(min(current_min + duration, 1080), 60)
-        blocks.append({
-            "start": f"{sh:02d}:{sm:02d}",
-            "end": f"{eh:02d}:{em:02d}",
-            "task_id": task.get("id") or task.get("sk"),
-            "type": "work",
-            "label": task.get("name", ""),
-        })
-        current_min += duration
-
-    blocks.sort(key=lambda b: b["start"])
+    settings = db.get_settings()
+    capacity = settings.get("daily_capacity_hours", 8)
+    schedule = schedule_day(tasks, capacity)
 
     plan = {
         "pk": "DAYPLAN", "sk": today,
         "date": today, "week_id": week_id,
-        "day_capacity_hours": 8,
-        "blocks": blocks,
+        "day_capacity_hours": capacity,
+        "blocks": schedule["blocks"],
+        "unplaced": schedule["unplaced"],
         "morning_briefing_sent": False,
         "midday_checkin_sent": False,
         "evening_summary_sent": False,
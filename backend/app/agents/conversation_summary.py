@@ -0,0 +1,168 @@
+"""Rolling conversation summary — replaces the long raw transcript in prompts.
+
+One SUMMARY item holds a running summary of the conversation and the
+timestamp of the last chat message it covers. Prompts get the summary plus
+only the messages after that point, so their size stays flat and context
+carries over midnight.
+
+The summary is refreshed off the request path: once enough messages have
+piled up past covered_through, the webhook fires an async Lambda invocation
+(action "update_conversation_summary"), or a background thread in local dev.
+"""
+import json
+import threading
+import traceback
+from datetime import date, datetime, timedelta
+
+from .. import db
+from ..services import llm_limiter
+from ..config import (
+    ANTHROPIC_API_KEY, AWS_REGION, LAMBDA_ARN, TIMEZONE, INTENT_MODEL_FAST,
+    SUMMARY_EVERY_N_MESSAGES, SUMMARY_KEEP_RECENT_MESSAGES, SUMMARY_LOOKBACK_DAYS, SUMMARY_MAX_CHARS,
+)
+
+SUMMARY_PK = "SUMMARY"
+SUMMARY_SK = "USER"
+# Don't re-request while a recent request may still be running
+_REQUEST_COOLDOWN = timedelta(minutes=2)
+
+_SUMMARY_PROMPT = """You maintain a running summary of a WhatsApp conversation between a busy professor and their productivity assistant (PCP).
+
+Update the summary with the new messages below. Keep what still matters for future conversations: commitments, decisions, plans, moods, recurring topics, open questions, and anything the user asked PCP to remember. Drop small talk and resolved one-off queries (e.g. "what's next" and its answer). Refer to days by date, not "today".
+
+Write plain prose or short bullets, at most {max_chars} characters. Reply with the summary only.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW MESSAGES:
+{messages}"""
+
+
+def get_summary() -> dict | None:
+    return db.get_item(SUMMARY_PK, SUMMARY_SK)
+
+
+def messages_since_summary(chat_history: list[dict], summary: dict | None) -> list[dict]:
+    """Chat messages not yet folded into the summary."""
+    covered = (summary or {}).get("covered_through")
+    if not covered:
+        return list(chat_history)
+    return [m for m in chat_history if m.get("timestamp", "") > covered]
+
+
+def maybe_request_update(context: dict) -> None:
+    """Request a summary refresh when enough unsummarized messages have built up.
+
+    Called at the end of a message; never blocks on the update itself.
+    """
+    summary = context.get("conversation_summary")
+    # +1 for the reply just sent (not in the history loaded before the parse)
+    unsummarized = len(messages_since_summary(context.get("chat_history", []), summary)) + 1
+    # First message of a new day: fold the rest of yesterday in (a stub item
+    # holding only the request marker was never updated, so it doesn't count)
+    updated_on = (summary or {}).get("updated_on")
+    rolled_over = bool(updated_on) and updated_on < context.get("today", "")
+    if unsummarized < SUMMARY_EVERY_N_MESSAGES + SUMMARY_KEEP_RECENT_MESSAGES and not rolled_over:
+        return
+
+    requested = (summary or {}).get("update_requested_at")
+    now = datetime.utcnow()
+    if requested and datetime.fromisoformat(requested) > now - _REQUEST_COOLDOWN:
+        return
+    # Creates a stub item before the first summary, so the cooldown covers it too
+    db.update_item(SUMMARY_PK, SUMMARY_SK, {"update_requested_at": now.isoformat()})
+    request_update()
+
+
+def request_update() -> None:
+    """Run update_summary() asynchronously: a Lambda Event self-invoke, or a thread locally."""
+    if LAMBDA_ARN:
+        try:
+            import boto3
+            boto3.client("lambda", region_name=AWS_REGION).invoke(
+                FunctionName=LAMBDA_ARN,
+                InvocationType="Event",
+                Payload=json.dumps({"action": "update_conversation_summary"}).encode(),
+            )
+        except Exception:
+            traceback.print_exc()
+        return
+    threading.Thread(target=update_summary, name="conversation-summary", daemon=True).start()
+
+
+def update_summary() -> dict:
+    """Fold messages since covered_through into the summary and save it.
+
+    Earlier days are folded completely (prompts only show today's messages);
+    today's newest SUMMARY_KEEP_RECENT_MESSAGES stay out, since prompts show
+    them verbatim.
+    """
+    today = _local_today()
+    summary = get_summary() or {}
+    start = summary.get("covered_date") or (date.fromisoformat(today) - timedelta(days=SUMMARY_LOOKBACK_DAYS)).isoformat()
+
+    messages = []
+    day = date.fromisoformat(start)
+    while day.isoformat() <= today:
+        messages += db.get_chat_log(day.isoformat(), limit=0)
+        day += timedelta(days=1)
+    messages = messages_since_summary(messages, summary)
+
+    keep = [m for m in messages[-SUMMARY_KEEP_RECENT_MESSAGES:] if m.get("date") == today] \
+        if SUMMARY_KEEP_RECENT_MESSAGES else []
+    to_fold = messages[:len(messages) - len(keep)]
+    if not to_fold:
+        if summary:
+            db.update_item(SUMMARY_PK, SUMMARY_SK, {"updated_on": today})
+        return {"updated": False}
+
+    try:
+        text = _summarize(summary.get("summary", ""), to_fold)
+    except llm_limiter.LimiterBusy as e:
+        # Interactive parses have the LLM; a later message re-requests the update
+        print(f"[SUMMARY] Deferred: {e}")
+        return {"updated": False, "deferred": True}
+    item = {
+        "pk": SUMMARY_PK,
+        "sk": SUMMARY_SK,
+        "summary": text,
+        "covered_through": to_fold[-1]["timestamp"],
+        "covered_date": to_fold[-1].get("date", today),
+        "messages_summarized": summary.get("messages_summarized", 0) + len(to_fold),
+        "updated_on": today,
+        "updated_at": datetime.utcnow().isoformat(),
+    }
+    db.put_item(item)
+    print(f"[SUMMARY] Folded {len(to_fold)} messages, {len(text)} chars")
+    return {"updated": True, "messages": len(to_fold)}
+
+
+def _local_today() -> str:
+    try:
+        from zoneinfo import ZoneInfo
+        return datetime.now(ZoneInfo(TIMEZONE)).strftime("%Y-%m-%d")
+    except Exception:
+        return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def _summarize(previous: str, messages: list[dict]) -> str:
+    lines = "\n".join(
+        f"[{m.get('timestamp', '')[:16]}] {'User' if m.get('role') == 'user' else 'PCP'}: {m.get('content', '')[:300]}"
+        for m in messages
+    )
+    if not ANTHROPIC_API_KEY:
+        # Local dev: keep the most recent lines that fit
+        return (previous + "\n" + lines).strip()[-SUMMARY_MAX_CHARS:]
+
+    import anthropic
+    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    with llm_limiter.slot(llm_limiter.BACKGROUND):
+        response = client.messages.create(
+            model=INTENT_MODEL_FAST,
+            max_tokens=600,
+            messages=[{"role": "user", "content": _SUMMARY_PROMPT.format(
+                max_chars=SUMMARY_MAX_CHARS, summary=previous or "(none yet)", messages=lines,
+            )}],
+        )
+    return response.content[0].text.strip()[:SUMMARY_MAX_CHARS]
@@ -0,0 +1,156 @@
+"""Intent catalogue: the parameters of every intent the parser can return.
+
+The system prompt describes each intent (with examples); this module is the
+machine-readable side of the same catalogue. build_intent_tool() turns it
+into the tool schema Claude is forced to call, so parse results arrive as
+structured JSON instead of free-form text.
+"""
+from ..constants import AREAS, PRIORITIES
+
+_DAY = {"type": "string", "enum": ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]}
+_TASK_MATCH = {"type": "string", "description": "String to fuzzy match against task names"}
+_NULLABLE_STR = {"type": ["string", "null"]}
+
+_TASK = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "project_id": {**_NULLABLE_STR, "description": "null if ambiguous; then set project_candidates"},
+        "project_candidates": {"type": "array", "items": {"type": "string"}},
+        "subtype": _NULLABLE_STR,
+        "priority": {"type": "string", "enum": PRIORITIES},
+        "estimated_hours": {"type": ["number", "null"]},
+        "day": {"type": ["string", "null"], "enum": _DAY["enum"] + [None]},
+        "time": {**_NULLABLE_STR, "description": "HH:MM, 24h, 5-minute multiples"},
+        "time_hint": {"type": ["string", "null"], "enum": ["morning", "afternoon", "evening", None]},
+        "due_date": {**_NULLABLE_STR, "description": "YYYY-MM-DD"},
+        "course_week": _NULLABLE_STR,
+        "needs_clarification": {"type": "array", "items": {"type": "string", "enum": ["project", "hours", "day"]}},
+        "is_time_block": {"type": "boolean"},
+    },
+    "required": ["name"],
+}
+
+INTENT_CATALOGUE = {
+    # Task intake
+    "add_task": {
+        "tasks": {"type": "array", "items": _TASK},
+        "message_to_user": {"type": "string", "description": "Confirmation or clarification question"},
+    },
+    "complete_pending": {
+        "field": {"type": "string", "enum": ["project", "hours", "day", "confirm"]},
+        "value": {"type": "string"},
+    },
+    # Task management
+    "mark_done": {"task_match": _TASK_MATCH},
+    "mark_skipped": {"task_match": _TASK_MATCH},
+    "mark_doing": {"task_match": _TASK_MATCH},
+    "move_task": {"task_match": _TASK_MATCH, "to_day": _DAY},
+    "push_tomorrow": {"task_match": _TASK_MATCH},
+    # Queries
+    "query_next": {},
+    "query_today": {},
+    "query_day": {"day": _DAY},
+    "query_week": {},
+    # Conversational
+    "chat": {
+        "message": {"type": "string"},
+        "reply": {"type": "string", "description": "Your conversational reply, 1-3 sentences"},
+        "save_as_note": {"type": "boolean"},
+    },
+    # Check-in responses
+    "checkin_response": {"status": {"type": "string", "enum": ["done", "working", "skipped", "pushed"]}},
+    "acknowledge": {},
+    # Health tracking
+    "log_food": {"entry": {"type": "string"}},
+    "log_exercise": {"entry": {"type": "string"}, "duration": {"type": "string"}},
+    "log_sleep": {"hours": {"type": "number"}, "notes": {"type": "string"}},
+    # Subtypes
+    "manage_subtypes": {
+        "action": {"type": "string", "enum": ["add", "remove", "list"]},
+        "area": {"type": "string", "enum": AREAS},
+        "subtype": {"type": "string"},
+    },
+    # Reminders & agent config
+    "set_reminder": {
+        "message": {"type": "string"},
+        "date": {"type": "string"},
+        "time": {"type": "string"},
+        "recurring": {**_NULLABLE_STR, "description": "null | daily | weekly:day | monthly:N"},
+    },
+    "delete_reminder": {"reminder_number": {"type": "integer"}},
+    "list_reminders": {},
+    "modify_behavior": {
+        "setting": {"type": "string"},
+        "value": {"type": "string"},
+        "duration": {"type": "string", "enum": ["today", "tomorrow", "this_week", "permanent"]},
+    },
+    "add_note": {
+        "note": {"type": "string"},
+        "applies_until": _NULLABLE_STR,
+        "tagged_project": _NULLABLE_STR,
+        "tagged_task": _NULLABLE_STR,
+        "new_project_name": _NULLABLE_STR,
+        "new_project_area": {"type": ["string", "null"], "enum": AREAS + [None]},
+    },
+    "pause_agent": {"until": {"type": "string"}},
+    # Several actions in one message; items are intent objects like the top level
+    "batch": {"intents": {"type": "array", "description": "The actions, in the order the user gave them"}},
+    # Fallback
+    "unknown": {"raw": {"type": "string"}},
+}
+
+INTENT_TOOL_NAME = "record_intent"
+
+# Intents that can't be one action of a batch
+NOT_BATCHABLE = frozenset({"batch", "complete_pending", "chat", "unknown"})
+
+
+def build_intent_tool() -> dict:
+    """Build the tool definition from the catalogue.
+
+    The input is a flat object: "intent" (enum of all intent names) plus the
+    union of every intent's parameters. When two intents share a parameter
+    name with different schemas, the merged property keeps only what they
+    have in common. A batch's "intents" items use the same flat shape,
+    restricted to the batchable intents.
+    """
+    properties = {}
+    for params in INTENT_CATALOGUE.values():
+        for name, schema in params.items():
+            properties[name] = _merge_schema(properties[name], schema) if name in properties else schema
+
+    action = {
+        "type": "object",
+        "properties": {
+            "intent": {"type": "string", "enum": [n for n in INTENT_CATALOGUE if n not in NOT_BATCHABLE]},
+            **{name: schema for name, schema in properties.items() if name != "intents"},
+        },
+        "required": ["intent"],
+    }
+    properties["intents"] = {**properties["intents"], "items": action}
+
+    return {
+        "name": INTENT_TOOL_NAME,
+        "description": (
+            "Record the parsed intent of the user's message. Set 'intent' and only "
+            "the parameters listed for that intent in the system prompt."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "intent": {"type": "string", "enum": list(INTENT_CATALOGUE)},
+                **properties,
+            },
+            "required": ["intent"],
+        },
+    }
+
+
+def _merge_schema(a: dict, b: dict) -> dict:
+    if a == b:
+        return a
+    merged = {}
+    if a.get("type") == b.get("type"):
+        merged["type"] = a["type"]
+    return merged
@@ -0,0 +1,129 @@
+"""Local intent classifier: hashed n-gram features + a linear (softmax) model.
+
+Handles routine, parameterless intents ("what's next", "thanks") in-process
+so they skip the LLM. Trained from the chat log by
+scripts/train_intent_classifier.py; the model is a small JSON file of sparse
+weights. Anything the model isn't confident about goes to Claude.
+"""
+import json
+import math
+import os
+import random
+import re
+import zlib
+
+# Only intents with no parameters can be answered by a classifier
+LOCAL_INTENTS = ("query_next", "query_today", "query_week", "list_reminders", "acknowledge")
+OTHER = "__other__"
+
+N_FEATURES = 2 ** 18
+_WORD_RE = re.compile(r"[a-z0-9']+|[^\sa-z0-9']")
+
+
+def features(text: str, n_features: int = N_FEATURES) -> dict[int, float]:
+    """Hashed, L2-normalised word unigrams/bigrams and character trigrams."""
+    words = _WORD_RE.findall(text.lower().strip())
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(["<s>"] + words, words + ["</s>"])]
+    for w in words:
+        padded = f"^{w}$"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+
+    vec = {}
+    for g in grams:
+        idx = zlib.crc32(g.encode()) % n_features
+        vec[idx] = vec.get(idx, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+    return {i: v / norm for i, v in vec.items()}
+
+
+class IntentClassifier:
+    def __init__(self, labels: list[str], weights: dict, bias: dict, n_features: int = N_FEATURES):
+        self.labels = labels
+        self.weights = weights  # label -> {feature index -> weight}
+        self.bias = bias
+        self.n_features = n_features
+
+    def predict(self, text: str) -> tuple[str, float]:
+        """Return (label, probability) for the most likely label."""
+        probs = self._probs(features(text, self.n_features))
+        best = max(probs, key=probs.get)
+        return best, probs[best]
+
+    def _probs(self, x: dict[int, float]) -> dict[str, float]:
+        scores = {}
+        for label in self.labels:
+            w = self.weights[label]
+            scores[label] = self.bias[label] + sum(v * w.get(i, 0.0) for i, v in x.items())
+        top = max(scores.values())
+        exp = {label: math.exp(s - top) for label, s in scores.items()}
+        total = sum(exp.values())
+        return {label: e / total for label, e in exp.items()}
+
+    @classmethod
+    def train(cls, examples: list[tuple[str, str]], epochs: int = 30, lr: float = 0.5,
+              l2: float = 1e-4, seed: int = 7) -> "IntentClassifier":
+        """Fit by plain SGD on the softmax cross-entropy.
+
+        examples are (text, label) pairs; labels outside LOCAL_INTENTS are
+        folded into OTHER so the model learns when *not* to answer.
+        """
+        data = [(features(text), label if label in LOCAL_INTENTS else OTHER) for text, label in examples]
+        labels = sorted({label for _, label in data})
+        model = cls(labels, {label: {} for label in labels}, {label: 0.0 for label in labels})
+        rng = random.Random(seed)
+
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            step = lr / (1 + epoch * 0.1)
+            for x, y in data:
+                probs = model._probs(x)
+                for label in labels:
+                    grad = probs[label] - (1.0 if label == y else 0.0)
+                    if abs(grad) < 1e-6:
+                        continue
+                    w = model.weights[label]
+                    for i, v in x.items():
+                        w[i] = w.get(i, 0.0) * (1 - step * l2) - step * grad * v
+                    model.bias[label] -= step * grad
+
+        # Drop near-zero weights to keep the file small
+        for label in labels:
+            model.weights[label] = {i: w for i, w in model.weights[label].items() if abs(w) > 1e-4}
+        return model
+
+    def to_json(self) -> dict:
+        return {
+            "version": 1,
+            "n_features": self.n_features,
+            "labels": self.labels,
+            "bias": self.bias,
+            "weights": {label: {str(i): round(w, 5) for i, w in ws.items()} for label, ws in self.weights.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "IntentClassifier":
+        weights = {label: {int(i): w for i, w in ws.items()} for label, ws in data["weights"].items()}
+        return cls(data["labels"], weights, data["bias"], data.get("n_features", N_FEATURES))
+
+
+_model = None
+_loaded = False
+
+
+def load(path: str) -> IntentClassifier | None:
+    """Load the model once per process. Missing/unreadable model -> None (disabled)."""
+    global _model, _loaded
+    if _loaded:
+        return _model
+    _loaded = True
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            _model = IntentClassifier.from_json(json.load(f))
+        print(f"[CLASSIFIER] Loaded {path} ({len(_model.labels)} labels)")
+    except Exception as e:
+        print(f"[CLASSIFIER ERROR] Could not load {path}: {e}")
+        _model = None
+    return _model
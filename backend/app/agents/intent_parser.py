@@ -1,11 +1,68 @@
 """Parse WhatsApp messages into structured intents using Claude API."""
+import contextvars
+import copy
 import json
+import re
+import time
 import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 
-from ..config import ANTHROPIC_API_KEY, TIMEZONE
+from ..config import (
+    ANTHROPIC_API_KEY, TIMEZONE, PROMPT_CONTEXT_TOKEN_BUDGET,
+    INTENT_CACHE_SIZE, INTENT_CACHE_TTL_SECONDS,
+    INTENT_MODEL_FAST, INTENT_MODEL_FULL, INTENT_MAX_TOKENS_FAST, INTENT_MAX_TOKENS_FULL,
+    ROUTE_FAST_MAX_CHARS, ROUTE_FAST_MAX_WORDS, ROUTE_ESCALATE,
+    LLM_LATENCY_BUDGET_SECONDS, LLM_HEDGE_AFTER_SECONDS,
+    INTENT_CLASSIFIER_PATH, INTENT_CLASSIFIER_THRESHOLD, NOTES_TOP_K, SUMMARY_KEEP_RECENT_MESSAGES,
+)
+from ..constants import DAYS
+from ..services import llm_limiter, note_index, project_matcher, week_snapshot
+from ..services.ttl_cache import TTLCache
+from ..tracing import span, traced, set_attrs
+from . import intent_classifier
+from .conversation_summary import messages_since_summary
+from .intent_catalogue import INTENT_CATALOGUE, INTENT_TOOL_NAME, NOT_BATCHABLE, build_intent_tool
+from .prompt_budget import estimate_tokens, fit_sections
+
+# Intents whose JSON depends only on the message and the fingerprinted context
+# (see _intent_cache_key). Generated text (chat replies, add_task questions) is never
+# cached, nor are task actions: their task_match is picked from the clock and
+# today's schedule, so a hit could mark or move a stale task.
+CACHEABLE_INTENTS = {
+    "query_next", "query_today", "query_day", "query_week", "list_reminders",
+    "acknowledge", "checkin_response",
+}
+
+# Model tiers for intent parsing; see _choose_tier
+TIERS = {
+    "fast": {"model": INTENT_MODEL_FAST, "max_tokens": INTENT_MAX_TOKENS_FAST},
+    "full": {"model": INTENT_MODEL_FULL, "max_tokens": INTENT_MAX_TOKENS_FULL},
+}
+# Fast-tier results re-run on the full tier: intake and chat need its judgement
+# or writing, and unknown may be a miss. Chat replies to bare acknowledgements
+# (_NO_CONTENT_REPLIES) stay on the fast tier.
+ESCALATE_INTENTS = {"add_task", "chat", "unknown"}
+_NO_CONTENT_REPLIES = {
+    "thanks", "thank you", "thx", "ty", "ok", "okay", "k", "ok cool", "cool", "nice",
+    "great", "got it", "sounds good", "sure", "lol", "haha", "np", "\U0001F44D", "\U0001F64F",
+}
+# Cues that a message is task intake, a note, or carries several intents
+_FULL_TIER_CUES = (
+    "add ", "need to", "needs to", "remind", " by ", "due ", "note", "idea", "thought",
+    " and ", " then ", ",", ";", "\n",
+)
 
 _client = None
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="intent-llm")
+_section_cache: dict = {}
+_intent_cache = TTLCache(INTENT_CACHE_SIZE, INTENT_CACHE_TTL_SECONDS)
+# Complete string values only: the closing quote must have arrived
+_INTENT_RE = re.compile(r'"intent"\s*:\s*"([a-z_]+)"')
+_TASK_MATCH_RE = re.compile(r'"task_match"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_CLAUSE_SPLIT_RE = re.compile(r",\s*(?:and\s+|then\s+)?")
+# Built once so the tool definition is byte-stable (it is part of the cached prompt prefix)
+_INTENT_TOOL = build_intent_tool()
 
 
 def _get_client():
@@ -16,62 +73,325 @@ def _get_client():
     return _client
 
 
-def parse_intent(message: str, context: dict) -> dict:
-    """Send user message + context to Claude, get structured intent JSON back."""
-    if not ANTHROPIC_API_KEY:
-        return _mock_parse(message)
+@traced("parse_intent")
+def parse_intent(message: str, context: dict, on_intent=None) -> dict:
+    """Send user message + context to Claude, get structured intent JSON back.
 
-    system_prompt = _build_system_prompt(context)
+    The response is streamed. on_intent(name, fields), if given, is called as
+    soon as the intent name (and task_match, for intents that take one) has
+    arrived, before the rest of the tool input, so callers can start loading
+    what the intent will need.
 
+    The result's "route" says what resolved it: "llm" (a cache hit included),
+    "rules", "classifier" or "fallback".
+    """
+    if not ANTHROPIC_API_KEY:
+        return {**_mock_parse(message), "route": "rules"}
+
+    # Recurring messages ("what's next", "thanks") reuse a recent result
+    cache_key = _intent_cache_key(message, context)
+    cached = _intent_cache.get(cache_key)
+    if cached is not None:
+        set_attrs(intent_cache="hit")
+        return copy.deepcopy(cached)
+    set_attrs(intent_cache="miss")
+
+    # Routine messages: rules, then the local classifier, before paying for Claude
+    local = _local_parse(message, context)
+    if local is not None:
+        return local
+
+    with span("build_system_prompt"):
+        system_prompt = _build_system_prompt(context, message)
+
+    # One deadline covers the whole parse, including a fast->full escalation
+    deadline = time.monotonic() + LLM_LATENCY_BUDGET_SECONDS if LLM_LATENCY_BUDGET_SECONDS > 0 else None
+    tier = _choose_tier(message)
+    intent = _parse_within_budget(message, system_prompt, tier, deadline, on_intent)
+    if (tier == "fast" and ROUTE_ESCALATE and intent.get("intent") in ESCALATE_INTENTS
+            and not intent.get("timed_out") and not _is_no_content_chat(message, intent)):
+        tier = "full"
+        intent = _parse_within_budget(message, system_prompt, tier, deadline, on_intent)
+    set_attrs(route="llm", tier=tier)
+
+    if intent.get("timed_out"):
+        return {**_budget_fallback(message, context), "route": "fallback"}
+    intent["route"] = "llm"
+    if intent.get("intent") in CACHEABLE_INTENTS and "error" not in intent:
+        _intent_cache.set(cache_key, copy.deepcopy(intent))
+    return intent
+
+
+# Rule results trusted without the LLM (anything else from _mock_parse is a guess)
+_RULE_FAST_PATH = {"query_next", "query_today", "query_week", "checkin_response"}
+
+
+def _local_parse(message: str, context: dict) -> dict | None:
+    """Answer routine messages without the LLM, or return None to escalate.
+
+    Skipped while a task is pending (short replies there usually answer the
+    clarification question). Check-in replies only count when a check-in is
+    actually open.
+    """
+    if context.get("pending"):
+        return None
+    open_checkin = any(
+        ci.get("type") in ("block_end", "morning") and not ci.get("response")
+        for ci in context.get("recent_checkins", [])
+    )
+
+    rule = _mock_parse(message)
+    if rule["intent"] in _RULE_FAST_PATH and (rule["intent"] != "checkin_response" or open_checkin):
+        set_attrs(route="rules")
+        return {**rule, "route": "rules"}
+
+    model = intent_classifier.load(INTENT_CLASSIFIER_PATH)
+    if model is None or open_checkin:
+        return None
+    with span("intent_classifier") as s:
+        label, confidence = model.predict(message)
+        s.set(label=label, confidence=round(confidence, 3))
+    if label == intent_classifier.OTHER or confidence < INTENT_CLASSIFIER_THRESHOLD:
+        return None
+    set_attrs(route="classifier")
+    return {"intent": label, "route": "classifier"}
+
+
+def intent_cache_stats() -> dict:
+    """Hit/miss/eviction counters for the intent result cache."""
+    return _intent_cache.stats()
+
+
+def _intent_cache_key(message: str, context: dict) -> tuple:
+    """Normalized message + fingerprint of the context fields that can change its intent.
+
+    The date covers relative days ("tomorrow"); the pending task decides
+    complete_pending vs a fresh parse; the latest check-in decides whether an
+    emoji is a check-in response.
+    """
+    normalized = " ".join(message.lower().split()).rstrip("!?.")
+    pending = context.get("pending") or {}
+    checkins = context.get("recent_checkins") or []
+    last_checkin = checkins[-1] if checkins else {}
+    return (
+        normalized,
+        context.get("today"),
+        bool(pending),
+        tuple(pending.get("needs", [])),
+        last_checkin.get("sk") or last_checkin.get("id"),
+        bool(last_checkin.get("response")),
+    )
+
+
+def _choose_tier(message: str) -> str:
+    """Route short, simple messages to the fast tier; intake, notes and multi-part messages to the full one."""
+    msg = " " + message.lower().strip() + " "
+    if len(message) > ROUTE_FAST_MAX_CHARS or len(msg.split()) > ROUTE_FAST_MAX_WORDS:
+        return "full"
+    if any(cue in msg for cue in _FULL_TIER_CUES):
+        return "full"
+    return "fast"
+
+
+def _is_no_content_chat(message: str, intent: dict) -> bool:
+    """A chat reply to a bare acknowledgement ("thanks", "ok cool"): nothing for the full tier to add."""
+    return intent.get("intent") == "chat" and " ".join(message.lower().split()).strip("!.") in _NO_CONTENT_REPLIES
+
+
+def _parse_within_budget(message: str, system_prompt: list, tier: str, deadline: float | None,
+                         on_intent=None) -> dict:
+    """Run the LLM parse, giving up at `deadline` (monotonic) with {"timed_out": True}.
+
+    With LLM_HEDGE_AFTER_SECONDS set, a second identical request is fired if
+    the first hasn't answered by then, and whichever succeeds first wins.
+    Requests still running at the deadline are abandoned; their late results
+    are discarded.
+    """
+    if deadline is None:
+        return _parse_with_llm(message, system_prompt, tier, on_intent=on_intent)
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return {"intent": "unknown", "raw": message, "timed_out": True}
+
+    futures = [_submit(message, system_prompt, tier, remaining, on_intent)]
+    if 0 < LLM_HEDGE_AFTER_SECONDS < remaining:
+        done, _ = wait(futures, timeout=LLM_HEDGE_AFTER_SECONDS)
+        if not done:
+            set_attrs(hedged=True)
+            futures.append(_submit(message, system_prompt, tier, deadline - time.monotonic(), on_intent))
+
+    pending = set(futures)
+    result = None
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            result = future.result()
+            if "error" not in result:
+                _abandon(pending)
+                return result
+
+    if result is not None and not pending:
+        return result  # every request failed outright; surface the error
+    _abandon(pending)
+    set_attrs(timed_out=True)
+    print(f"[LLM] parse_intent tier={tier} exceeded {LLM_LATENCY_BUDGET_SECONDS}s budget")
+    return {"intent": "unknown", "raw": message, "timed_out": True}
+
+
+def _submit(message: str, system_prompt: list, tier: str, timeout: float, on_intent=None):
+    # Each worker runs in a copy of the current context so its spans join this trace
+    ctx = contextvars.copy_context()
+    return _executor.submit(ctx.run, _parse_with_llm, message, system_prompt, tier, timeout, on_intent)
+
+
+def _abandon(futures) -> None:
+    for future in futures:
+        future.cancel()
+
+
+def _budget_fallback(message: str, context: dict) -> dict:
+    """Answer without the LLM: the rule-based parser if it recognises the
+    message, otherwise a holding reply asking the user to resend."""
+    intent = _mock_parse(message) if not context.get("pending") else {"intent": "unknown"}
+    if intent.get("intent") != "unknown":
+        return intent
+    return {
+        "intent": "chat",
+        "message": message,
+        "reply": "One sec — I'm running slow right now. Send that again in a moment?",
+        "save_as_note": False,
+    }
+
+
+def _parse_with_llm(message: str, system_prompt: list, tier: str = "full", timeout: float = None,
+                    on_intent=None) -> dict:
+    model = TIERS[tier]["model"]
     try:
         client = _get_client()
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1024,
-            system=system_prompt,
-            messages=[{"role": "user", "content": message}],
-        )
-        text = response.content[0].text.strip()
-        return _extract_json(text)
+        queued_at = time.monotonic()
+        with span("llm.messages.stream", model=model, tier=tier) as s, llm_limiter.slot(timeout=timeout):
+            if timeout:
+                # Time spent waiting for a slot comes out of the request's budget
+                timeout = max(timeout - (time.monotonic() - queued_at), 0.1)
+            with client.messages.stream(
+                model=model,
+                max_tokens=TIERS[tier]["max_tokens"],
+                system=system_prompt,
+                tools=[_INTENT_TOOL],
+                tool_choice={"type": "tool", "name": INTENT_TOOL_NAME},
+                messages=[{"role": "user", "content": message}],
+                **({"timeout": timeout} if timeout else {}),
+            ) as stream:
+                partial = ""
+                announced = on_intent is None
+                t0 = time.perf_counter()
+                for event in stream:
+                    if announced or event.type != "content_block_delta" or event.delta.type != "input_json_delta":
+                        continue
+                    partial += event.delta.partial_json
+                    early = _early_intent(partial)
+                    if early:
+                        announced = True
+                        s.set(early_intent=early["intent"], early_intent_ms=round((time.perf_counter() - t0) * 1000, 2))
+                        _announce(on_intent, early)
+                response = stream.get_final_message()
+            _record_usage(s, response.usage, tier, model)
+        return _tool_input(response, message)
+    except llm_limiter.LimiterBusy as e:
+        # Queued past the latency budget: same as the call itself running over
+        print(f"[LLM] parse_intent tier={tier}: {e}")
+        return {"intent": "unknown", "raw": message, "timed_out": True}
     except Exception as e:
         traceback.print_exc()
         return {"intent": "unknown", "raw": message, "error": str(e)}
 
 
-def _extract_json(text: str) -> dict:
-    """Extract JSON from Claude's response, handling code blocks."""
-    # Try direct parse
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-
-    # Try extracting from code block
-    if "```" in text:
-        parts = text.split("```")
-        for part in parts[1::2]:  # Odd indices are inside code blocks
-            cleaned = part.strip()
-            if cleaned.startswith("json"):
-                cleaned = cleaned[4:].strip()
-            try:
-                return json.loads(cleaned)
-            except json.JSONDecodeError:
-                continue
-
-    # Try finding JSON object in text
-    start = text.find("{")
-    end = text.rfind("}")
-    if start >= 0 and end > start:
-        try:
-            return json.loads(text[start:end + 1])
-        except json.JSONDecodeError:
-            pass
+def _early_intent(partial_json: str) -> dict | None:
+    """Pick the intent name (and task_match) out of an incomplete tool-input JSON.
 
-    return {"intent": "unknown", "raw": text}
+    Returns None until everything the intent's handler keys on has arrived.
+    """
+    m = _INTENT_RE.search(partial_json)
+    if not m or m.group(1) not in INTENT_CATALOGUE:
+        return None
+    early = {"intent": m.group(1)}
+    if "task_match" in INTENT_CATALOGUE[early["intent"]]:
+        tm = _TASK_MATCH_RE.search(partial_json)
+        if not tm:
+            return None
+        early["task_match"] = json.loads(f'"{tm.group(1)}"')
+    return early
 
 
-def _build_system_prompt(ctx: dict) -> str:
-    """Build the full system prompt with all context injected."""
+def _announce(on_intent, early: dict) -> None:
+    # A failing callback must never cost us the parse
+    try:
+        on_intent(early["intent"], early)
+    except Exception:
+        traceback.print_exc()
+
+
+def _record_usage(s, usage, tier: str, model: str) -> None:
+    """Record token usage, including prompt-cache reads/writes, on the span and log."""
+    cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    s.set(
+        input_tokens=usage.input_tokens,
+        output_tokens=usage.output_tokens,
+        cache_read_tokens=cache_read,
+        cache_write_tokens=cache_write,
+    )
+    print(
+        f"[LLM] parse_intent tier={tier} model={model} input={usage.input_tokens} output={usage.output_tokens} "
+        f"cache_read={cache_read} cache_write={cache_write}"
+    )
+
+
+def _tool_input(response, message: str) -> dict:
+    """Pull the record_intent tool call out of a forced tool-use response."""
+    for block in response.content:
+        if getattr(block, "type", None) == "tool_use" and block.name == INTENT_TOOL_NAME:
+            return _normalize_batch(dict(block.input), message)
+    return {"intent": "unknown", "raw": message, "error": f"no tool call (stop_reason={response.stop_reason})"}
+
+
+def _normalize_batch(intent: dict, message: str) -> dict:
+    """Drop batch items that can't be batched; a batch of one is just that intent."""
+    if intent.get("intent") != "batch":
+        return intent
+    actions = [
+        a for a in intent.get("intents") or []
+        if isinstance(a, dict) and a.get("intent") in INTENT_CATALOGUE and a["intent"] not in NOT_BATCHABLE
+    ]
+    if not actions:
+        return {"intent": "unknown", "raw": message}
+    if len(actions) == 1:
+        return actions[0]
+    return {"intent": "batch", "intents": actions}
+
+
+def _build_system_prompt(ctx: dict, message: str = "") -> list[dict]:
+    """Build the system prompt as content blocks for Anthropic prompt caching.
+
+    The static instructions block is byte-identical on every call and marked
+    with cache_control; only the small context block after it changes.
+    """
+    return [
+        {"type": "text", "text": _STATIC_PROMPT, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": _build_context_prompt(ctx, message)},
+    ]
+
+
+def _build_context_prompt(ctx: dict, message: str = "") -> str:
+    """Build the per-message context block (date, tasks, schedule, history).
+
+    With a message, only the NOTES_TOP_K agent notes most relevant to it are
+    included; without one, all active notes are.
+    """
     def _local_now():
         try:
             from zoneinfo import ZoneInfo
@@ -86,10 +406,16 @@ def _build_system_prompt(ctx: dict) -> str:
     persona = settings.get("agent_persona", "David Goggins")
 
     # Format projects
-    projects_text = ""
-    for p in ctx.get("projects", []):
-        keywords = ", ".join(p.get("match_keywords", []))
-        projects_text += f"- {p.get('name')} (area: {p.get('area')}, id: {p.get('id') or p.get('sk')}) [keywords: {keywords}]\n"
+    projects = ctx.get("projects", [])
+    projects_text = _memo_section(
+        "projects",
+        tuple((p.get("id") or p.get("sk"), p.get("name"), p.get("area"), tuple(p.get("match_keywords", [])))
+              for p in projects),
+        lambda: _render_projects(projects),
+    )
+    # Projects the message names, resolved here so the model needn't match keywords itself
+    mentions = project_matcher.for_projects(projects).scan(message) if message and projects else []
+    mentions_text = _render_mentions(mentions)
 
     # Format today's tasks
     tasks_text = ""
@@ -101,16 +427,11 @@ def _build_system_prompt(ctx: dict) -> str:
 
     # Format week schedule summary
     week_tasks = ctx.get("week_tasks", [])
-    week_text = ""
-    for day in ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]:
-        day_tasks = [t for t in week_tasks if t.get("day") == day and t.get("status") not in ("dropped",)]
-        hrs = sum(t.get("estimated_hours", 0) for t in day_tasks)
-        done = len([t for t in day_tasks if t.get("status") == "done"])
-        total = len(day_tasks)
-        free = max(0, 8 - hrs)
-        week_text += f"  {day.title()}: {hrs}h planned, {done}/{total} done, {free}h free\n"
-        for t in day_tasks:
-            week_text += f"    - {t.get('name')} ({t.get('status')}, {t.get('estimated_hours', 0)}h)\n"
+    week_text = _memo_section(
+        "week",
+        tuple((t.get("day"), t.get("status"), t.get("name"), t.get("estimated_hours", 0)) for t in week_tasks),
+        lambda: _render_week(week_snapshot.for_context(ctx)),
+    )
 
     # Format pending task
     pending = ctx.get("pending")
@@ -130,50 +451,195 @@ def _build_system_prompt(ctx: dict) -> str:
         checkins_text = "(no recent check-ins)\n"
 
     # Agent notes
-    notes_text = ""
-    for n in ctx.get("agent_notes", []):
-        notes_text += f"- {n.get('note')} (until: {n.get('applies_until', 'indefinite')})\n"
-
-    # Chat history
+    notes = _relevant_notes(ctx, message, {(m["project"].get("id") or m["project"].get("sk")) for m in mentions})
+    notes_text = _memo_section(
+        "notes",
+        tuple((n.get("id") or n.get("sk"), n.get("note"), n.get("applies_until")) for n in notes),
+        lambda: _render_notes(notes),
+    )
+
+    # Conversation: rolling summary + only the messages it doesn't cover yet
+    summary = ctx.get("conversation_summary") or {}
+    summary_text = ""
+    if summary.get("summary"):
+        summary_text = f"CONVERSATION SO FAR (summary, may span several days):\n{summary['summary']}\n\n"
     chat_text = ""
-    for msg in ctx.get("chat_history", [])[-15:]:
+    # Only the last few turns verbatim, so the section stays the same size
+    # while a summary update is pending or lagging
+    unsummarized = messages_since_summary(ctx.get("chat_history", []), summary)
+    for msg in unsummarized[max(0, len(unsummarized) - SUMMARY_KEEP_RECENT_MESSAGES):]:
         role = msg.get("role", "user")
         content = msg.get("content", "")[:200]
         chat_text += f"{'You' if role == 'user' else 'PCP'}: {content}\n"
     if not chat_text:
         chat_text = "(no prior messages today)\n"
 
-    return f"""You are PCP, a personal productivity assistant for a teaching professor. You manage tasks AND have real conversations. Parse the user's WhatsApp message and return a JSON object with the intent and parameters.
-
-PERSONALITY: {persona} — be warm, direct, concise, and human. You remember earlier messages and can discuss the user's work, day, ideas, or anything. Don't lecture. If the user shares a thought or wants to chat, have a real conversation — reference their tasks, projects, and earlier messages where relevant.
+    if not notes_text:
+        notes_text = "(none)\n"
+
+    fields = {
+        "persona": persona,
+        "today": today,
+        "day_of_week": day_of_week,
+        "current_time": current_time,
+        "timezone": TIMEZONE,
+        "projects_text": projects_text,
+        "mentions_text": mentions_text,
+        "tasks_text": tasks_text,
+        "week_text": week_text,
+        "pending_text": pending_text,
+        "summary_text": summary_text,
+        "chat_text": chat_text,
+        "checkins_text": checkins_text,
+        "notes_text": notes_text,
+    }
+    prompt = _CONTEXT_TEMPLATE.format(**fields)
+
+    # Enforce the token budget: trim lowest-priority sections first
+    overflow = estimate_tokens(prompt) - PROMPT_CONTEXT_TOKEN_BUDGET
+    if overflow > 0:
+        fields.update(_trim_to_budget(notes, fields, overflow))
+        prompt = _CONTEXT_TEMPLATE.format(**fields)
+    return prompt
+
+
+def _trim_to_budget(notes: list[dict], fields: dict, overflow: int) -> dict:
+    """Trim context sections by priority to remove ~overflow tokens.
+
+    Dropped first: older notes, then week task details, then the oldest chat
+    messages, then the pending task, and today's tasks last of all.
+    """
+    note_items = [_note_line(n) for n in notes]
+    oldest_notes_first = sorted(range(len(notes)), key=lambda i: notes[i].get("created_at", ""))
+
+    week_items = fields["week_text"].rstrip("\n").split("\n")
+    week_details_last_first = [i for i in range(len(week_items) - 1, -1, -1) if week_items[i].startswith("    - ")]
+
+    chat_items = fields["chat_text"].rstrip("\n").split("\n")
+
+    trimmed = fit_sections([
+        {"name": "notes_text", "items": note_items, "drop_order": oldest_notes_first},
+        {"name": "week_text", "items": week_items, "drop_order": week_details_last_first},
+        {"name": "chat_text", "items": chat_items, "drop_order": range(len(chat_items))},
+        {"name": "pending_text", "items": fields["pending_text"].split("\n")},
+        {"name": "tasks_text", "items": fields["tasks_text"].rstrip("\n").split("\n")},
+    ], overflow)
+    trimmed["pending_text"] = trimmed["pending_text"].rstrip("\n") or "null"
+    trimmed["notes_text"] = trimmed["notes_text"] or "(none)\n"
+    return trimmed
+
+
+_CONTEXT_TEMPLATE = """PERSONALITY: {persona} — be warm, direct, concise, and human. You remember earlier messages and can discuss the user's work, day, ideas, or anything. Don't lecture. If the user shares a thought or wants to chat, have a real conversation — reference their tasks, projects, and earlier messages where relevant.
 
 CURRENT DATE: {today}
 CURRENT DAY: {day_of_week}
-CURRENT TIME: {current_time} (America/Chicago)
+CURRENT TIME: {current_time} ({timezone})
 
 USER'S PROJECTS:
 {projects_text}
-TODAY'S TASKS:
+{mentions_text}TODAY'S TASKS:
 {tasks_text}
 WEEK SCHEDULE:
 {week_text}
 PENDING TASK (if user is in middle of adding a task):
 {pending_text}
 
-CONVERSATION HISTORY (today):
+{summary_text}CONVERSATION HISTORY (today):
 {chat_text}
 RECENT CHECK-INS:
 {checkins_text}
 ACTIVE NOTES:
-{notes_text or "(none)"}
+{notes_text}"""
+
+
+def _memo_section(name: str, key: tuple, render) -> str:
+    """Return a rendered prompt section, re-rendering only when its inputs change.
+
+    key is a fingerprint of exactly the fields the section prints, so repeated
+    messages against the same state reuse the previous text. One entry is kept
+    per section (the latest state).
+    """
+    cached = _section_cache.get(name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    text = render()
+    _section_cache[name] = (key, text)
+    return text
+
+
+def _render_projects(projects: list[dict]) -> str:
+    text = ""
+    for p in projects:
+        keywords = ", ".join(p.get("match_keywords", []))
+        text += f"- {p.get('name')} (area: {p.get('area')}, id: {p.get('id') or p.get('sk')}) [keywords: {keywords}]\n"
+    return text
+
+
+def _render_mentions(mentions: list[dict]) -> str:
+    if not mentions:
+        return ""
+    lines, seen = [], set()
+    for m in mentions:
+        p = m["project"]
+        pid = p.get("id") or p.get("sk")
+        if pid in seen:
+            continue
+        seen.add(pid)
+        lines.append(f'- "{m["keyword"]}" -> {p.get("name")} (id: {pid})\n')
+    return "PROJECTS MENTIONED IN THIS MESSAGE (matched by keyword):\n" + "".join(lines) + "\n"
+
+
+def _render_week(week: week_snapshot.WeekSnapshot) -> str:
+    """Render the per-day week summary from the week's snapshot."""
+    text = ""
+    for day in DAYS:
+        s = week.day_stats(day)
+        free = max(0, 8 - s["hours"])
+        text += f"  {day.title()}: {s['hours']}h planned, {s['done']}/{s['tasks']} done, {free}h free\n"
+        for t in week.rows(day):
+            text += f"    - {t.get('name')} ({t.get('status')}, {t.get('estimated_hours', 0)}h)\n"
+    return text
+
+
+def _relevant_notes(ctx: dict, message: str, project_ids: set = ()) -> list[dict]:
+    """Pick the agent notes to show: top-k by BM25, boosted by tagged project/task.
+
+    project_ids are the projects the message mentions.
+    """
+    notes = ctx.get("agent_notes", [])
+    if not message or len(notes) <= NOTES_TOP_K:
+        return notes
+
+    msg_terms = set(note_index.tokenize(message))
+    task_ids = set()
+    for t in ctx.get("week_tasks", []):
+        name_terms = set(note_index.tokenize(t.get("name", "")))
+        if name_terms and len(name_terms & msg_terms) * 2 >= len(name_terms):
+            task_ids.add(t.get("id") or t.get("sk"))
+
+    with span("note_retrieval", notes=len(notes)) as s:
+        picked = note_index.top_notes(message, notes, NOTES_TOP_K, project_ids, task_ids)
+        s.set(picked=len(picked))
+    return picked
+
+
+def _render_notes(notes: list[dict]) -> str:
+    return "".join(_note_line(n) + "\n" for n in notes)
+
+
+def _note_line(note: dict) -> str:
+    return f"- {note.get('note')} (until: {note.get('applies_until', 'indefinite')})"
+
+
+_STATIC_PROMPT = """You are PCP, a personal productivity assistant for a teaching professor. You manage tasks AND have real conversations. Parse the user's WhatsApp message into an intent and its parameters, and record it by calling the record_intent tool. The user's current context (date, projects, tasks, schedule, conversation) follows after these instructions.
 
 POSSIBLE INTENTS:
 
 Task intake (smart — infer as much as possible):
-- add_task: {{
+- add_task: {
     "intent": "add_task",
     "tasks": [
-      {{
+      {
         "name": "...",
         "project_id": "..." or null (if ambiguous, set null and ask),
         "project_candidates": ["id1", "id2"] (if ambiguous),
@@ -187,29 +653,29 @@ Task intake (smart — infer as much as possible):
         "course_week": "N" or null,
         "needs_clarification": ["project", "hours", "day"] (list of fields agent should ask about),
         "is_time_block": false (true if personal commitment, not work)
-      }}
+      }
     ],
     "message_to_user": "..." (confirmation or clarification question)
-  }}
+  }
 
-- complete_pending: {{ "intent": "complete_pending", "field": "project|hours|day|confirm", "value": "..." }}
+- complete_pending: { "intent": "complete_pending", "field": "project|hours|day|confirm", "value": "..." }
 
 Task management:
-- mark_done: {{ "intent": "mark_done", "task_match": "string to fuzzy match" }}
-- mark_skipped: {{ "intent": "mark_skipped", "task_match": "..." }}
-- mark_doing: {{ "intent": "mark_doing", "task_match": "..." }}
-- move_task: {{ "intent": "move_task", "task_match": "...", "to_day": "wednesday" }}
-- push_tomorrow: {{ "intent": "push_tomorrow", "task_match": "..." }}
+- mark_done: { "intent": "mark_done", "task_match": "string to fuzzy match" }
+- mark_skipped: { "intent": "mark_skipped", "task_match": "..." }
+- mark_doing: { "intent": "mark_doing", "task_match": "..." }
+- move_task: { "intent": "move_task", "task_match": "...", "to_day": "wednesday" }
+- push_tomorrow: { "intent": "push_tomorrow", "task_match": "..." }
 
 Queries:
-- query_next: {{ "intent": "query_next" }}
-- query_today: {{ "intent": "query_today" }}
-- query_day: {{ "intent": "query_day", "day": "monday|tuesday|...|saturday|sunday" }}
+- query_next: { "intent": "query_next" }
+- query_today: { "intent": "query_today" }
+- query_day: { "intent": "query_day", "day": "monday|tuesday|...|saturday|sunday" }
   Use this when user asks about a SPECIFIC day like "what's on wednesday", "what's due tomorrow", "show me friday", "tomorrow's schedule"
-- query_week: {{ "intent": "query_week" }}
+- query_week: { "intent": "query_week" }
 
 Conversational:
-- chat: {{ "intent": "chat", "message": "...", "reply": "...", "save_as_note": true|false }}
+- chat: { "intent": "chat", "message": "...", "reply": "...", "save_as_note": true|false }
   Use when the user shares a thought, asks a question, wants to discuss their day/work, or has a freeform conversation.
   "reply" = YOUR natural conversational response (1-3 sentences). Reference their tasks, projects, schedule, and CONVERSATION HISTORY.
   "save_as_note" = true only if the message contains a thought/idea worth remembering later. false for casual chat/questions.
@@ -230,24 +696,24 @@ SYSTEM INFO (for answering questions about PCP):
   Supported commands: "add [task]", "done with [task]", "what's next", "push [task] to thursday", "what's due tomorrow", "show week", "set reminder", "list subtypes"
 
 Check-in responses:
-- checkin_response: {{ "intent": "checkin_response", "status": "done|working|skipped|pushed" }}
-- acknowledge: {{ "intent": "acknowledge" }}
+- checkin_response: { "intent": "checkin_response", "status": "done|working|skipped|pushed" }
+- acknowledge: { "intent": "acknowledge" }
 
 Health tracking:
-- log_food: {{ "intent": "log_food", "entry": "..." }}
-- log_exercise: {{ "intent": "log_exercise", "entry": "...", "duration": "..." }}
-- log_sleep: {{ "intent": "log_sleep", "hours": N, "notes": "..." }}
+- log_food: { "intent": "log_food", "entry": "..." }
+- log_exercise: { "intent": "log_exercise", "entry": "...", "duration": "..." }
+- log_sleep: { "intent": "log_sleep", "hours": N, "notes": "..." }
 
 Subtypes management:
-- manage_subtypes: {{ "intent": "manage_subtypes", "action": "add|remove|list", "area": "teaching|research|admin|personal", "subtype": "..." }}
+- manage_subtypes: { "intent": "manage_subtypes", "action": "add|remove|list", "area": "teaching|research|admin|personal", "subtype": "..." }
   Examples: "add subtype Peer Review to research", "list subtypes for teaching", "remove subtype Labs from teaching"
 
 Reminders & agent config:
-- set_reminder: {{ "intent": "set_reminder", "message": "...", "date": "...", "time": "...", "recurring": null | "daily" | "weekly:day" | "monthly:N" }}
-- delete_reminder: {{ "intent": "delete_reminder", "reminder_number": N }}
-- list_reminders: {{ "intent": "list_reminders" }}
-- modify_behavior: {{ "intent": "modify_behavior", "setting": "...", "value": "...", "duration": "today|tomorrow|this_week|permanent" }}
-- add_note: {{ "intent": "add_note", "note": "...", "applies_until": "...", "tagged_project": "project_id or null", "tagged_task": "fuzzy task name or null", "new_project_name": "name or null", "new_project_area": "teaching|research|admin|personal or null" }}
+- set_reminder: { "intent": "set_reminder", "message": "...", "date": "...", "time": "...", "recurring": null | "daily" | "weekly:day" | "monthly:N" }
+- delete_reminder: { "intent": "delete_reminder", "reminder_number": N }
+- list_reminders: { "intent": "list_reminders" }
+- modify_behavior: { "intent": "modify_behavior", "setting": "...", "value": "...", "duration": "today|tomorrow|this_week|permanent" }
+- add_note: { "intent": "add_note", "note": "...", "applies_until": "...", "tagged_project": "project_id or null", "tagged_task": "fuzzy task name or null", "new_project_name": "name or null", "new_project_area": "teaching|research|admin|personal or null" }
   Use for thoughts/ideas the user wants to save, optionally tagged to a project or task.
   If the user references a project that exists, set tagged_project to its id.
   If they reference a project that DOESN'T exist, set new_project_name and new_project_area so we create it.
@@ -257,29 +723,43 @@ Reminders & agent config:
     "thought on signaling paper: add robustness checks" → tagged_project: Signaling Theory's id
     "idea for a new course on AI ethics" → new_project_name: "AI Ethics Course", new_project_area: "teaching"
     "just a random thought: need to reorganize my office" → no tags
-- pause_agent: {{ "intent": "pause_agent", "until": "..." }}
+- pause_agent: { "intent": "pause_agent", "until": "..." }
+
+Several actions in one message:
+- batch: { "intent": "batch", "intents": [ {intent object}, {intent object}, ... ] }
+  Each item is an intent object exactly as described above, in the order the user gave them.
+  Example: "done with grading, push slides to thursday, and add email for 550" →
+    { "intent": "batch", "intents": [
+      { "intent": "mark_done", "task_match": "grading" },
+      { "intent": "move_task", "task_match": "slides", "to_day": "thursday" },
+      { "intent": "add_task", "tasks": [{ "name": "Email", "project_id": "...", ... }], "message_to_user": "..." }
+    ] }
 
 Fallback:
-- unknown: {{ "intent": "unknown", "raw": "..." }}
+- unknown: { "intent": "unknown", "raw": "..." }
 
 RULES:
 - IMPORTANT: Not everything is a task. If the user shares a thought, feeling, observation, or reflection (e.g. "I haven't been exercising", "feeling overwhelmed", "had a great class today"), use the "chat" intent — do NOT turn it into add_task.
 - Only use add_task if the user is clearly asking to CREATE or SCHEDULE something specific (e.g. "add slides for 358", "need to grade homework by friday")
 - For "what's tomorrow", "what's due tomorrow", "show wednesday" etc → use query_day with the appropriate day name. Convert "tomorrow" to the actual day name based on CURRENT DAY.
-- For add_task: ALWAYS try to infer project from keywords. Match "358" to BADM 358, "signaling" to Signaling Theory, "dentist" to Health, "taxes" to Finances, etc.
+- For add_task: ALWAYS try to infer project from keywords. Projects under PROJECTS MENTIONED IN THIS MESSAGE are already matched — use them. Otherwise match "358" to BADM 358, "signaling" to Signaling Theory, "dentist" to Health, "taxes" to Finances, etc.
 - For add_task: infer subtype from action words: "grade" → Grading, "write/draft" → Writing, "slides/lecture" → Slides, "call/book" → Doctors or Errands
 - For add_task: if user says "by friday" or "due friday", set due_date AND day=friday
 - For add_task: if user's message contains MULTIPLE tasks, return multiple items in the tasks array
+- If the message asks for several DIFFERENT actions (complete one task, move another, add a third), use batch with one item per action. Several new tasks alone are one add_task. Never put chat, complete_pending or unknown inside a batch
 - If a PENDING TASK exists and the user's reply looks like an answer to a question (a number, a day name, "yes", an hour amount), use complete_pending intent
 - If the message is just an emoji (✅, 👍), interpret as acknowledge or checkin_response
 - For task matching, be fuzzy — "slides" matches "Prepare Week 6 slides"
 - If user mentions food, tea, meals, protein, sugar → use log_food
 - If user mentions exercise, gym, run, walk, workout → use log_exercise
-- Return ONLY a valid JSON object"""
+- Always answer by calling the record_intent tool with the intent object as its input — never reply with plain text"""
 
 
 def _mock_parse(message: str) -> dict:
-    """Simple rule-based parser for local dev without Claude API."""
+    """Simple rule-based parser for local dev without Claude API.
+
+    Also the deterministic fallback when Claude misses its latency budget.
+    """
     msg = message.lower().strip()
 
     if msg in ("✅", "👍", "yes", "y", "ok", "done"):
@@ -290,6 +770,11 @@ def _mock_parse(message: str) -> dict:
         return {"intent": "checkin_response", "status": "skipped"}
     if msg in ("🔄", "push", "pushed"):
         return {"intent": "checkin_response", "status": "pushed"}
+    if "," in msg:
+        # "done with grading, push slides to thursday": a batch if every part parses
+        actions = [_mock_parse(p) for p in _CLAUSE_SPLIT_RE.split(message) if p.strip()]
+        if len(actions) > 1 and all(a["intent"] not in NOT_BATCHABLE for a in actions):
+            return {"intent": "batch", "intents": actions}
     if "what's next" in msg or "whats next" in msg:
         return {"intent": "query_next"}
     if msg in ("today", "what's today", "show today"):
@@ -0,0 +1,67 @@
+"""Token budgeting for the intent-parser context block."""
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English prompt text)."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def fit_sections(sections: list[dict], overflow: int) -> dict:
+    """Trim prompt sections until about `overflow` tokens have been removed.
+
+    sections are ordered lowest priority first; each is a dict with:
+        name: key in the returned dict
+        items: list of entries (lines, messages, notes)
+        drop_order: indices of items to remove, in order (default: last first)
+
+    Sections are trimmed one at a time, so a higher-priority section is only
+    touched once everything below it is exhausted. A trimmed section gets a
+    trailing "(N omitted)" line. Returns name -> rendered text.
+    """
+    # Work in characters so per-item rounding can't undershoot the target
+    overflow *= CHARS_PER_TOKEN
+    out = {}
+    for sec in sections:
+        items = sec["items"]
+        if overflow <= 0 or not items:
+            out[sec["name"]] = _join(items)
+            continue
+
+        order = sec.get("drop_order")
+        if order is None:
+            order = range(len(items) - 1, -1, -1)
+
+        # The "(N omitted)" marker counts against the section's own savings
+        dropped = set()
+        saved = 0
+        for i in order:
+            if saved - _marker_len(len(dropped)) >= overflow:
+                break
+            dropped.add(i)
+            saved += len(items[i]) + 1
+
+        # Not worth it if the marker is longer than what it replaces
+        # (e.g. a one-line "(none)" placeholder)
+        if dropped and saved <= _marker_len(len(dropped)):
+            dropped = set()
+
+        kept = [item for i, item in enumerate(items) if i not in dropped]
+        if dropped:
+            kept.append(_marker(len(dropped)))
+            overflow -= saved - _marker_len(len(dropped))
+        out[sec["name"]] = _join(kept)
+    return out
+
+
+def _marker(n: int) -> str:
+    return f"  ({n} omitted to fit the context budget)"
+
+
+def _marker_len(n: int) -> int:
+    return len(_marker(n)) + 1 if n else 0
+
+
+def _join(items: list[str]) -> str:
+    return "".join(f"{item}\n" for item in items)
@@ -3,6 +3,8 @@ import json
 import traceback
 from ..config import ANTHROPIC_API_KEY
 from .. import db
+from ..services import week_snapshot
+from ..tracing import traced
 
 _client = None
 
@@ -21,70 +23,52 @@ PRIORITY_EMOJI = {
 }
 
 
+STATUS_ICON = {"done": "\u2705", "doing": "\U0001F535"}
+_DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# Message templates, compiled once (bound str.format)
+_TASK_LINE = "{icon} {name} ({hours}h){time}".format
+_WEEK_LINE = "*{day}*: {done}/{total} | {hours}h".format
+_ADDED_TASK = (
+    "\u2705 Added to *{day}*{time}:\n"
+    "{emoji} *{project}* \u2014 {name}\n"
+    "\U0001F4C1 {subtype} | "
+    "\u23F1 {hours}h | "
+    "{prio_emoji} {prio}"
+).format
+
+# intent name -> renderer(intent, result, context); filled in by @_renders
+_RENDERERS = {}
+
+
+def _renders(*actions):
+    def register(fn):
+        for action in actions:
+            _RENDERERS[action] = fn
+        return fn
+    return register
+
+
+@traced("generate_response")
 def generate_response(intent: dict, result: dict, context: dict) -> str:
     """Generate WhatsApp response. Uses templates for common cases, Claude for complex ones."""
     action = intent.get("intent", "unknown")
+    if result.get("error"):
+        # Handler couldn't act (no/ambiguous task match, bad reminder number, ...)
+        return f"\u26A0 {result['error']}"
+    renderer = _RENDERERS.get(action)
+    if renderer is None:
+        return f"Got it. ({action})"
 
     try:
-        # Template-based responses
-        if action == "mark_done":
-            return _resp_mark_done(result, context)
-        elif action == "mark_doing":
-            return _resp_mark_doing(result)
-        elif action == "mark_skipped":
-            return _resp_mark_skipped(result)
-        elif action == "move_task":
-            return _resp_move_task(result, intent)
-        elif action == "push_tomorrow":
-            return _resp_push_tomorrow(result)
-        elif action == "add_task":
-            return _resp_add_task(intent, result, context)
-        elif action == "complete_pending":
-            return _resp_complete_pending(result, context)
-        elif action == "query_next":
-            return _resp_query_next(result)
-        elif action == "query_today":
-            return _resp_query_today(context)
-        elif action == "query_day":
-            return _resp_query_day(result)
-        elif action == "query_week":
-            return _resp_query_week(context)
-        elif action == "checkin_response":
-            return _resp_checkin(intent, result, context)
-        elif action == "acknowledge":
-            return "\u2705"
-        elif action == "set_reminder":
-            return _resp_set_reminder(result)
-        elif action == "list_reminders":
-            return _resp_list_reminders(result)
-        elif action == "delete_reminder":
-            return _resp_delete_reminder(result)
-        elif action == "modify_behavior":
-            return _resp_modify_behavior(result)
-        elif action == "add_note":
-            return _resp_add_note(result)
-        elif action == "log_food":
-            return _resp_log_food(intent)
-        elif action == "log_exercise":
-            return _resp_log_exercise(intent)
-        elif action == "log_sleep":
-            return _resp_log_sleep(intent)
-        elif action == "pause_agent":
-            return _resp_pause(result)
-        elif action == "manage_subtypes":
-            return _resp_manage_subtypes(result)
-        elif action == "chat":
-            return _resp_chat(result)
-        elif action == "unknown":
-            return _resp_unknown(intent)
-        else:
-            return f"Got it. ({action})"
+        return renderer(intent, result, context)
     except Exception as e:
         traceback.print_exc()
         return "Something went wrong processing that. Try again?"
 
 
-def _resp_mark_done(result, context):
+@_renders("mark_done")
+def _resp_mark_done(intent, result, context):
     task = result.get("task", {})
     name = task.get("name", "task")
     msg = f"\u2705 *{name}* marked done."
@@ -97,17 +81,20 @@ def _resp_mark_done(result, context):
     return msg
 
 
-def _resp_mark_doing(result):
+@_renders("mark_doing")
+def _resp_mark_doing(intent, result, context):
     task = result.get("task", {})
     return f"\U0001F535 *{task.get('name', 'task')}* -- working on it."
 
 
-def _resp_mark_skipped(result):
+@_renders("mark_skipped")
+def _resp_mark_skipped(intent, result, context):
     task = result.get("task", {})
     return f"\u23ED *{task.get('name', 'task')}* skipped."
 
 
-def _resp_move_task(result, intent):
+@_renders("move_task")
+def _resp_move_task(intent, result, context):
     task = result.get("task", {})
     to_day = intent.get("to_day", "?")
     load = result.get("day_load", 0)
@@ -117,11 +104,13 @@ def _resp_move_task(result, intent):
     return msg
 
 
-def _resp_push_tomorrow(result):
+@_renders("push_tomorrow")
+def _resp_push_tomorrow(intent, result, context):
     task = result.get("task", {})
     return f"\U0001F4C5 *{task.get('name', 'task')}* pushed to tomorrow."
 
 
+@_renders("add_task")
 def _resp_add_task(intent, result, context):
     # If the intent itself has a message_to_user (e.g., clarification question)
     if intent.get("message_to_user") and result.get("pending"):
@@ -131,37 +120,35 @@ def _resp_add_task(intent, result, context):
     if not tasks_results:
         return intent.get("message_to_user", "Task noted.")
 
+    projects = _projects_by_id(context)
     msgs = []
     for tr in tasks_results:
         if tr.get("pending"):
             return tr.get("message", intent.get("message_to_user", "Need more info. What else?"))
         if tr.get("created"):
             t = tr["task"]
-            project = _get_project_name(t.get("project_id"), context)
-            area = _get_area(t.get("project_id"), context)
-            emoji = AREA_EMOJI.get(area, "\U0001F4CB")
+            project = projects.get(t.get("project_id")) or {}
             day = t.get("day", "unscheduled")
             prio = t.get('priority', 'normal')
-            prio_emoji = PRIORITY_EMOJI.get(prio, '\U0001F7E1')
-            time_str = ""
-            if t.get("block_start"):
-                time_str = f" @ {t['block_start']}"
-                if t.get("block_end"):
-                    time_str += f"-{t['block_end']}"
-            msgs.append(
-                f"\u2705 Added to *{day.title() if day else 'Unscheduled'}*{time_str}:\n"
-                f"{emoji} *{project}* \u2014 {t.get('name')}\n"
-                f"\U0001F4C1 {t.get('subtype') or 'General'} | "
-                f"\u23F1 {t.get('estimated_hours', 1)}h | "
-                f"{prio_emoji} {prio}"
-            )
+            msgs.append(_ADDED_TASK(
+                day=day.title() if day else 'Unscheduled',
+                time=_time_range(t),
+                emoji=AREA_EMOJI.get(project.get("area", "admin"), "\U0001F4CB"),
+                project=project.get("name", "Unknown"),
+                name=t.get('name'),
+                subtype=t.get('subtype') or 'General',
+                hours=t.get('estimated_hours', 1),
+                prio_emoji=PRIORITY_EMOJI.get(prio, '\U0001F7E1'),
+                prio=prio,
+            ))
 
     if len(msgs) == 1:
         return msgs[0]
     return "\n\n".join(f"{i+1}. {m}" for i, m in enumerate(msgs))
 
 
-def _resp_complete_pending(result, context):
+@_renders("complete_pending")
+def _resp_complete_pending(intent, result, context):
     if result.get("created"):
         t = result["task"]
         project = _get_project_name(t.get("project_id"), context)
@@ -176,15 +163,27 @@ def _resp_complete_pending(result, context):
     return "Got it."
 
 
-def _resp_query_next(result):
+@_renders("query_next")
+def _resp_query_next(intent, result, context):
     task = result.get("next_task")
     if not task:
         return "Nothing left for today. You're done!"
-    time_str = task.get("block_start", "")
-    return f"Next: *{task.get('name')}*" + (f" ({time_str})" if time_str else "")
+    block = result.get("block") or {}
+    if task is result.get("current_task"):
+        msg = f"Now: *{task.get('name')}*" + (f" (until {block['end']})" if block.get("end") else "")
+    else:
+        time_str = block.get("start") or task.get("block_start", "")
+        msg = f"Next: *{task.get('name')}*" + (f" ({time_str})" if time_str else "")
+    missed = [t for t in result.get("overdue", []) if t is not task]
+    if missed:
+        names = ", ".join(t.get("name", "task") for t in missed[:3])
+        more = f" +{len(missed) - 3} more" if len(missed) > 3 else ""
+        msg += f"\nStill open from earlier: {names}{more}"
+    return msg
 
 
-def _resp_query_today(context):
+@_renders("query_today")
+def _resp_query_today(intent, result, context):
     tasks = context.get("today_tasks", [])
     if not tasks:
         return "No tasks scheduled for today."
@@ -192,34 +191,22 @@ def _resp_query_today(context):
     active.sort(key=lambda t: t.get("block_start") or "99:99")
     done = [t for t in active if t.get("status") == "done"]
     lines = [f"*TODAY* \u2014 {len(done)}/{len(active)} done\n"]
-    for t in active:
-        icon = "\u2705" if t["status"] == "done" else "\U0001F535" if t["status"] == "doing" else "\u2B1C"
-        time_str = ""
-        if t.get("block_start"):
-            time_str = f" @ {t['block_start']}"
-            if t.get("block_end"):
-                time_str += f"-{t['block_end']}"
-        lines.append(f"{icon} {t.get('name')} ({t.get('estimated_hours', 0)}h){time_str}")
+    lines += _task_lines(active)
     return "\n".join(lines)
 
 
-def _resp_query_week(context):
-    tasks = context.get("week_tasks", [])
-    active = [t for t in tasks if t.get("status") not in ("dropped",)]
-    done = len([t for t in active if t.get("status") == "done"])
-    total = len(active)
-    pct = round(done / total * 100) if total else 0
-
-    lines = [f"*WEEK* \u2014 {done}/{total} ({pct}%)\n"]
-    for day in ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]:
-        dt = [t for t in active if t.get("day") == day]
-        hrs = sum(t.get("estimated_hours", 0) for t in dt)
-        d = len([t for t in dt if t.get("status") == "done"])
-        lines.append(f"*{day[:3].upper()}*: {d}/{len(dt)} | {hrs}h")
+@_renders("query_week")
+def _resp_query_week(intent, result, context):
+    week = week_snapshot.for_context(context)
+    lines = [f"*WEEK* \u2014 {week.done}/{week.total} ({week.pct_done}%)\n"]
+    for day in _DAYS:
+        s = week.day_stats(day)
+        lines.append(_WEEK_LINE(day=day[:3].upper(), done=s["done"], total=s["tasks"], hours=s["hours"]))
     return "\n".join(lines)
 
 
-def _resp_query_day(result):
+@_renders("query_day")
+def _resp_query_day(intent, result, context):
     tasks = result.get("tasks", [])
     day = result.get("day", "")
     day_label = day.title() if day else "that day"
@@ -232,18 +219,12 @@ def _resp_query_day(result):
     # Sort by block_start time, unscheduled at the end
     active.sort(key=lambda t: t.get("block_start") or "99:99")
     lines = [f"*{day_label.upper()}* \u2014 {len(done)}/{len(active)} done\n"]
-    for t in active:
-        icon = "\u2705" if t["status"] == "done" else "\U0001F535" if t["status"] == "doing" else "\u2B1C"
-        time_str = ""
-        if t.get("block_start"):
-            time_str = f" @ {t['block_start']}"
-            if t.get("block_end"):
-                time_str += f"-{t['block_end']}"
-        lines.append(f"{icon} {t.get('name')} ({t.get('estimated_hours', 0)}h){time_str}")
+    lines += _task_lines(active)
     return "\n".join(lines)
 
 
-def _resp_chat(result):
+@_renders("chat")
+def _resp_chat(intent, result, context):
     reply = result.get("reply", "")
     if reply:
         prefix = "\U0001F4CC " if result.get("saved") else ""
@@ -251,6 +232,7 @@ def _resp_chat(result):
     return "\U0001F4AC Got it."
 
 
+@_renders("checkin_response")
 def _resp_checkin(intent, result, context):
     status = intent.get("status", "done")
     task = result.get("task", {})
@@ -269,14 +251,21 @@ def _resp_checkin(intent, result, context):
     return "\U0001F44D"
 
 
-def _resp_set_reminder(result):
+@_renders("acknowledge")
+def _resp_acknowledge(intent, result, context):
+    return "\u2705"
+
+
+@_renders("set_reminder")
+def _resp_set_reminder(intent, result, context):
     r = result.get("reminder", {})
     if r.get("recurrence"):
         return f"\U0001F501 Recurring reminder set: {r.get('message')} \u2014 {r.get('recurrence')}, {r.get('trigger_time', '')}"
     return f"\u23F0 Reminder set: {r.get('message', '')} \u2014 {r.get('trigger_date', '')} {r.get('trigger_time', '')}"
 
 
-def _resp_list_reminders(result):
+@_renders("list_reminders")
+def _resp_list_reminders(intent, result, context):
     reminders = result.get("reminders", [])
     if not reminders:
         return "No active reminders."
@@ -288,15 +277,18 @@ def _resp_list_reminders(result):
     return "\n".join(lines)
 
 
-def _resp_delete_reminder(result):
+@_renders("delete_reminder")
+def _resp_delete_reminder(intent, result, context):
     return f"\u2705 Deleted: {result.get('message', 'reminder')}"
 
 
-def _resp_modify_behavior(result):
+@_renders("modify_behavior")
+def _resp_modify_behavior(intent, result, context):
     return f"\u2705 {result.get('message', 'Behavior updated.')}"
 
 
-def _resp_add_note(result):
+@_renders("add_note")
+def _resp_add_note(intent, result, context):
     note = result.get("note", "")
     msg = f"\U0001F4CC Noted: {note}"
 
@@ -312,26 +304,31 @@ def _resp_add_note(result):
     return msg
 
 
-def _resp_log_food(intent):
+@_renders("log_food")
+def _resp_log_food(intent, result, context):
     return f"\U0001F4DD Food logged: {intent.get('entry', '')}"
 
 
-def _resp_log_exercise(intent):
+@_renders("log_exercise")
+def _resp_log_exercise(intent, result, context):
     duration = intent.get("duration", "")
     return f"\U0001F3CB Exercise logged: {intent.get('entry', '')}" + (f" ({duration})" if duration else "")
 
 
-def _resp_log_sleep(intent):
+@_renders("log_sleep")
+def _resp_log_sleep(intent, result, context):
     hours = intent.get("hours", "?")
     return f"\U0001F4A4 Sleep logged: {hours}h" + (f" \u2014 {intent.get('notes', '')}" if intent.get("notes") else "")
 
 
-def _resp_pause(result):
+@_renders("pause_agent")
+def _resp_pause(intent, result, context):
     until = result.get("until", "further notice")
     return f"\U0001F515 Agent paused until {until}."
 
 
-def _resp_manage_subtypes(result):
+@_renders("manage_subtypes")
+def _resp_manage_subtypes(intent, result, context):
     action = result.get("action", "list")
     subtypes = result.get("subtypes", {})
     if action == "list":
@@ -351,23 +348,55 @@ def _resp_manage_subtypes(result):
     return "Subtypes updated."
 
 
-def _resp_unknown(intent):
+@_renders("batch")
+def _resp_batch(intent, result, context):
+    """One reply for a multi-intent message: each action's reply, in order."""
+    return "\n".join(
+        generate_response(sub_intent, sub_result, context)
+        for sub_intent, sub_result in zip(intent.get("intents", []), result.get("results", []))
+    )
+
+
+@_renders("unknown")
+def _resp_unknown(intent, result, context):
     return "I didn't understand that. Try:\n\u2022 \"done with [task]\"\n\u2022 \"what's next\"\n\u2022 \"add [task description]\"\n\u2022 \"push [task] to thursday\""
 
 
+def _task_lines(tasks: list[dict]) -> list[str]:
+    return [
+        _TASK_LINE(
+            icon=STATUS_ICON.get(t["status"], "\u2B1C"),
+            name=t.get('name'),
+            hours=t.get('estimated_hours', 0),
+            time=_time_range(t),
+        )
+        for t in tasks
+    ]
+
+
+def _time_range(task: dict) -> str:
+    if not task.get("block_start"):
+        return ""
+    if task.get("block_end"):
+        return f" @ {task['block_start']}-{task['block_end']}"
+    return f" @ {task['block_start']}"
+
+
+def _projects_by_id(context: dict) -> dict:
+    """Project id -> project, built once per context.
+
+    Handlers don't change context["projects"] (a project created mid-message
+    isn't added to it); if the list is ever replaced, the index is rebuilt.
+    """
+    projects = context.get("projects", [])
+    cached = context.get("projects_by_id")
+    if cached is None or cached[0] is not projects:
+        cached = context["projects_by_id"] = (projects, {(p.get("id") or p.get("sk")): p for p in projects})
+    return cached[1]
+
+
 def _get_project_name(project_id: str, context: dict) -> str:
     if not project_id:
         return "Unknown"
-    for p in context.get("projects", []):
-        if (p.get("id") or p.get("sk")) == project_id:
-            return p.get("name", "Unknown")
-    return "Unknown"
+    return _projects_by_id(context).get(project_id, {}).get("name", "Unknown")
 
-
-def _get_area(project_id: str, context: dict) -> str:
-    if not project_id:
-        return "admin"
-    for p in context.get("projects", []):
-        if (p.get("id") or p.get("sk")) == project_id:
-            return p.get("area", "admin")
-    return "admin"
@@ -0,0 +1,126 @@
+"""Shadow mode: try a candidate intent parser on live traffic without using it.
+
+With SHADOW_PARSER set (e.g. "app.agents.intent_parser_v2:parse_intent"),
+a SHADOW_SAMPLE_RATE share of messages is also parsed by the candidate, in
+a background thread, after the primary parse has returned. The two results
+are diffed and logged as one "[SHADOW]" JSON line with both latencies:
+
+    [SHADOW] {"match": false, "primary": "move_task", "candidate": "push_tomorrow",
+              "diff": {...}, "primary_ms": 812.4, "candidate_ms": 356.1, ...}
+
+The candidate gets a snapshot of the context and no on_intent callback, and
+its LLM calls run at background priority, so the user's reply never waits
+on it. Candidates must not write (no DB writes, no shared caches).
+
+On Lambda the thread only runs while the container is active; a shadow
+parse still in flight when the response returns finishes on the next
+invocation of that container.
+"""
+import copy
+import importlib
+import json
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from ..config import SHADOW_PARSER, SHADOW_SAMPLE_RATE
+from ..services import llm_limiter
+from ..tracing import span
+
+# Long free text differs on every run; only whether it is present is compared
+_TEXT_FIELDS = {"reply", "message_to_user", "raw", "message"}
+# Bookkeeping, not part of the parse
+_IGNORED_FIELDS = {"route"}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="shadow")
+_candidate = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def _load_candidate():
+    """Import the SHADOW_PARSER function once per process. Failure -> disabled."""
+    global _candidate, _loaded
+    with _lock:
+        if _loaded:
+            return _candidate
+        _loaded = True
+        module_name, sep, attr = SHADOW_PARSER.partition(":")
+        if not sep:
+            module_name, _, attr = SHADOW_PARSER.rpartition(".")
+        try:
+            _candidate = getattr(importlib.import_module(module_name), attr)
+            print(f"[SHADOW] Candidate parser {SHADOW_PARSER}, sample rate {SHADOW_SAMPLE_RATE}")
+        except Exception as e:
+            print(f"[SHADOW ERROR] Could not load {SHADOW_PARSER}: {e}")
+            _candidate = None
+        return _candidate
+
+
+def maybe_shadow(message: str, context: dict, primary: dict, primary_ms: float) -> None:
+    """Queue a shadow parse of this message if it falls in the sample.
+
+    Call right after the primary parse, before the intent is executed
+    (handlers mutate the context).
+    """
+    if not SHADOW_PARSER or SHADOW_SAMPLE_RATE <= 0 or random.random() >= SHADOW_SAMPLE_RATE:
+        return
+    candidate = _load_candidate()
+    if candidate is None:
+        return
+    if llm_limiter.background_queue_full():
+        print("[SHADOW] Skipped: LLM queue is busy")
+        return
+    snapshot = copy.deepcopy({k: v for k, v in context.items() if k != "prefetch"})
+    _executor.submit(_run, candidate, message, snapshot, copy.deepcopy(primary), primary_ms)
+
+
+def _run(candidate, message: str, context: dict, primary: dict, primary_ms: float) -> None:
+    try:
+        with span("shadow_parse", root=True, parser=SHADOW_PARSER), llm_limiter.priority(llm_limiter.BACKGROUND):
+            t0 = time.perf_counter()
+            result = candidate(message, context)
+            candidate_ms = (time.perf_counter() - t0) * 1000
+        diff = diff_intents(primary, result)
+        print("[SHADOW] " + json.dumps({
+            "match": not diff,
+            "primary": primary.get("intent"),
+            "candidate": result.get("intent"),
+            "diff": diff,
+            "primary_ms": round(primary_ms, 1),
+            "candidate_ms": round(candidate_ms, 1),
+            "message": message[:200],
+        }, default=str))
+    except Exception:
+        traceback.print_exc()
+
+
+def diff_intents(primary: dict, candidate: dict) -> dict:
+    """Fields whose values differ, as {field: [primary, candidate]}.
+
+    Free-text fields only count when one side has them and the other
+    doesn't; other strings compare case-insensitively. A batch is diffed item
+    by item, keyed "intents[i]".
+    """
+    diff = {}
+    for key in sorted(set(primary) | set(candidate)):
+        if key in _IGNORED_FIELDS:
+            continue
+        a, b = primary.get(key), candidate.get(key)
+        if key == "intents" and isinstance(a, list) and isinstance(b, list):
+            for i in range(max(len(a), len(b))):
+                sub = diff_intents(a[i] if i < len(a) else {}, b[i] if i < len(b) else {})
+                if sub:
+                    diff[f"intents[{i}]"] = sub
+            continue
+        if key in _TEXT_FIELDS:
+            if bool(a) != bool(b):
+                diff[key] = [a, b]
+        elif isinstance(a, str) and isinstance(b, str):
+            if a.strip().lower() != b.strip().lower():
+                diff[key] = [a, b]
+        elif a != b:
+            diff[key] = [a, b]
+    return diff
@@ -3,7 +3,9 @@ import uuid
 from datetime import datetime, timedelta
 
 from .. import db
+from ..constants import DAYS
 from ..services.twilio_client import send_whatsapp
+from ..services.week_snapshot import WeekSnapshot
 
 
 def send_evening_summary():
@@ -17,16 +19,12 @@ def send_evening_summary():
     projects = db.list_projects(active_only=True)
     project_map = {(p.get("id") or p.get("sk")): p for p in projects}
 
+    # One read of the week covers today, tomorrow and what's behind
+    week = WeekSnapshot(db.get_tasks_for_week(week_id), project_map)
+
     # Get today's tasks
     day_lower = day_name.lower()
-    tasks = db.get_tasks_for_week(week_id, day=day_lower)
-    active = [t for t in tasks if t.get("status") != "dropped"]
-
-    # Categorize
-    done = [t for t in active if t.get("status") == "done"]
-    doing = [t for t in active if t.get("status") == "doing"]
-    skipped = [t for t in active if t.get("status") == "skipped"]
-    todo = [t for t in active if t.get("status") == "todo"]
+    active = week.rows(day_lower)
 
     lines = [
         f"*Day summary* \u2014 {day_name}, {_format_date(today)}.",
@@ -55,31 +53,29 @@ def send_evening_summary():
     lines.append("")
 
     # Score
-    complete = len(done)
+    complete = week.day_stats(day_lower)["done"]
     total = len(active)
-    carried = len(todo) + len(doing)
-    lines.append(f"Score: {complete}/{total} complete | {carried} carried forward | {len(skipped)} skipped")
+    carried = len(week.rows(day_lower, status=("todo", "doing")))
+    skipped = len(week.rows(day_lower, status="skipped"))
+    lines.append(f"Score: {complete}/{total} complete | {carried} carried forward | {skipped} skipped")
 
     # Tomorrow preview
     tomorrow = (datetime.utcnow() + timedelta(days=1))
     tomorrow_day = tomorrow.strftime("%A").lower()
-    tomorrow_tasks = db.get_tasks_for_week(week_id, day=tomorrow_day)
-    tomorrow_active = [t for t in tomorrow_tasks if t.get("status") not in ("dropped", "done")]
-    tomorrow_hours = sum(t.get("estimated_hours", 0) for t in tomorrow_active)
+    tomorrow_stats = week.day_stats(tomorrow_day)
+    tomorrow_count = tomorrow_stats["tasks"] - tomorrow_stats["done"]
+    tomorrow_hours = tomorrow_stats["hours"] - tomorrow_stats["done_hours"]
 
-    if tomorrow_active:
+    if tomorrow_count:
         lines.extend([
             "",
-            f"Tomorrow has {tomorrow_hours}h planned across {len(tomorrow_active)} tasks.",
+            f"Tomorrow has {tomorrow_hours}h planned across {tomorrow_count} tasks.",
         ])
 
     # Check for overdue/behind tasks
     behind_tasks = []
-    all_week = db.get_tasks_for_week(week_id)
-    for t in all_week:
-        if t.get("status") in ("todo", "doing") and t.get("priority") in ("urgent", "high"):
-            if t.get("day") and t["day"] < day_lower:
-                behind_tasks.append(t)
+    for day in DAYS[:DAYS.index(day_lower)]:
+        behind_tasks += week.rows(day, status=("todo", "doing"), priority=("urgent", "high"))
 
     if behind_tasks:
         lines.extend([
@@ -21,6 +21,85 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
 LAMBDA_ARN = os.getenv("LAMBDA_ARN", "")
 SCHEDULER_ROLE_ARN = os.getenv("SCHEDULER_ROLE_ARN", "")
 
+# Webhook redelivery dedupe (Twilio MessageSid / Telegram update_id)
+WEBHOOK_DEDUPE_TTL_HOURS = int(os.getenv("WEBHOOK_DEDUPE_TTL_HOURS", "48"))
+WEBHOOK_CLAIM_TIMEOUT_SECONDS = int(os.getenv("WEBHOOK_CLAIM_TIMEOUT_SECONDS", "120"))
+
+# Rapid-fire messages within this window are merged into one parse/reply (0 = off)
+BURST_WINDOW_SECONDS = float(os.getenv("BURST_WINDOW_SECONDS", "0"))
+
+# Estimated-token budget for the per-message context block of the intent prompt
+PROMPT_CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTEXT_TOKEN_BUDGET", "2500"))
+
+# Intent result cache for recurring messages (per warm container)
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "256"))
+INTENT_CACHE_TTL_SECONDS = int(os.getenv("INTENT_CACHE_TTL_SECONDS", "900"))
+
+# Intent parser model tiers: short/simple messages go to the fast tier
+INTENT_MODEL_FAST = os.getenv("INTENT_MODEL_FAST", "claude-3-5-haiku-20241022")
+INTENT_MODEL_FULL = os.getenv("INTENT_MODEL_FULL", "claude-sonnet-4-20250514")
+INTENT_MAX_TOKENS_FAST = int(os.getenv("INTENT_MAX_TOKENS_FAST", "512"))
+INTENT_MAX_TOKENS_FULL = int(os.getenv("INTENT_MAX_TOKENS_FULL", "1024"))
+ROUTE_FAST_MAX_CHARS = int(os.getenv("ROUTE_FAST_MAX_CHARS", "40"))
+ROUTE_FAST_MAX_WORDS = int(os.getenv("ROUTE_FAST_MAX_WORDS", "6"))
+# Re-run on the full tier when the fast tier returns add_task / chat / unknown
+# (not chat replies to bare acknowledgements like "thanks")
+ROUTE_ESCALATE = os.getenv("ROUTE_ESCALATE", "true").lower() == "true"
+
+# Agent notes in the intent prompt: the k most relevant to the message (BM25)
+NOTES_TOP_K = int(os.getenv("NOTES_TOP_K", "6"))
+
+# Local intent classifier (scripts/train_intent_classifier.py). Routine
+# parameterless intents it is at least this confident about skip the LLM.
+# No model file = disabled. (Not under app/models/: that would shadow app/models.py.)
+INTENT_CLASSIFIER_PATH = os.getenv(
+    "INTENT_CLASSIFIER_PATH", str(Path(__file__).resolve().parent / "data" / "intent_classifier.json")
+)
+INTENT_CLASSIFIER_THRESHOLD = float(os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.9"))
+
+# Rolling conversation summary: prompts get the summary plus at most the last
+# SUMMARY_KEEP_RECENT_MESSAGES messages after it (keep it at 4-6: the last two
+# or three turns). Refreshed in the background once N messages have
+# accumulated beyond those.
+SUMMARY_EVERY_N_MESSAGES = int(os.getenv("SUMMARY_EVERY_N_MESSAGES", "6"))
+SUMMARY_KEEP_RECENT_MESSAGES = int(os.getenv("SUMMARY_KEEP_RECENT_MESSAGES", "6"))
+SUMMARY_LOOKBACK_DAYS = int(os.getenv("SUMMARY_LOOKBACK_DAYS", "2"))
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "1500"))
+
+# Latency budget for the intent LLM call (0 = no budget). Past the budget the
+# parser falls back to rules / a holding reply. Optionally hedge with a second
+# request after LLM_HEDGE_AFTER_SECONDS (0 = no hedging).
+LLM_LATENCY_BUDGET_SECONDS = float(os.getenv("LLM_LATENCY_BUDGET_SECONDS", "8"))
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))
+
+# Concurrency limit for Anthropic calls (per process). Interactive parses are
+# served first; background work (summaries) gets at most its own share of the
+# slots and is deferred when LLM_BACKGROUND_MAX_QUEUE calls are already waiting.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_BACKGROUND_MAX_CONCURRENCY = int(os.getenv("LLM_BACKGROUND_MAX_CONCURRENCY", "1"))
+LLM_BACKGROUND_MAX_QUEUE = int(os.getenv("LLM_BACKGROUND_MAX_QUEUE", "2"))
+LLM_BACKGROUND_MAX_WAIT_SECONDS = float(os.getenv("LLM_BACKGROUND_MAX_WAIT_SECONDS", "30"))
+
+# Shadow mode: a candidate parse_intent ("package.module:function") runs in the
+# background on this share of live messages; its result is diffed against the
+# primary and logged with both latencies. Never affects the reply.
+SHADOW_PARSER = os.getenv("SHADOW_PARSER", "")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0"))
+
+# Day-plan generation ("HH:MM" local times). A break of DAYPLAN_BREAK_MINUTES
+# goes in before a task that would stretch back-to-back work past
+# DAYPLAN_BREAK_EVERY_MINUTES (0 = no breaks besides lunch).
+DAYPLAN_DAY_START = os.getenv("DAYPLAN_DAY_START", "08:00")
+DAYPLAN_DAY_END = os.getenv("DAYPLAN_DAY_END", "18:00")
+DAYPLAN_LUNCH_START = os.getenv("DAYPLAN_LUNCH_START", "12:00")
+DAYPLAN_LUNCH_END = os.getenv("DAYPLAN_LUNCH_END", "13:00")
+DAYPLAN_BREAK_EVERY_MINUTES = int(os.getenv("DAYPLAN_BREAK_EVERY_MINUTES", "150"))
+DAYPLAN_BREAK_MINUTES = int(os.getenv("DAYPLAN_BREAK_MINUTES", "30"))
+
+# Pipeline tracing: comma-separated exporters ("console", "file") or "off"
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "console")
+TRACE_FILE = os.getenv("TRACE_FILE", "/tmp/pcp-traces.jsonl")
+
 DEFAULT_SETTINGS = {
     "weekly_capacity_hours": 40,
     "daily_capacity_hours": 8,
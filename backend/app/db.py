@@ -1,12 +1,25 @@
 import boto3
 from boto3.dynamodb.conditions import Key, Attr
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 from decimal import Decimal
 import json
+import time
+import traceback
+import uuid
 
-from .config import TABLE_NAME, AWS_REGION, LOCAL_DYNAMODB_URL, DEFAULT_SETTINGS
+from .tracing import span
+from .config import (
+    TABLE_NAME, AWS_REGION, LOCAL_DYNAMODB_URL, DEFAULT_SETTINGS,
+    WEBHOOK_DEDUPE_TTL_HOURS, WEBHOOK_CLAIM_TIMEOUT_SECONDS,
+)
 
 _table = None
+_write_buffer: ContextVar = ContextVar("write_buffer", default=None)
+_transaction: ContextVar = ContextVar("transaction", default=None)
+# TransactWriteItems limit
+TRANSACTION_MAX_ITEMS = 100
 
 
 def _convert_decimals(obj):
@@ -49,32 +62,109 @@ def get_table():
 
 def put_item(item: dict) -> None:
     item = _convert_floats(item)
-    get_table().put_item(Item=item)
+    txn = _transaction.get()
+    if txn is not None:
+        txn.put(item)
+        return
+    with span("db.put_item", pk=item.get("pk")):
+        get_table().put_item(Item=item)
+
+
+def batch_put_items(items: list[dict]) -> None:
+    """Write many items with BatchWriteItem (25 per request, retries unprocessed)."""
+    with span("db.batch_put_items", count=len(items)):
+        with get_table().batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=_convert_floats(item))
+
+
+def put_log_item(item: dict) -> None:
+    """Put an audit/log item (chat log, check-ins).
+
+    Inside buffered_writes() the write is deferred and batched; otherwise it
+    is written immediately.
+    """
+    buffer = _write_buffer.get()
+    if buffer is None:
+        put_item(item)
+    else:
+        buffer.append(item)
+
+
+@contextmanager
+def buffered_writes():
+    """Collect put_log_item writes and flush them in one batch on exit.
+
+    The flush also runs when the block raises, so log writes are never lost
+    to an error later in the request.
+    """
+    items = []
+    token = _write_buffer.set(items)
+    try:
+        yield items
+    finally:
+        _write_buffer.reset(token)
+        if items:
+            try:
+                batch_put_items(items)
+            except Exception:
+                traceback.print_exc()
+
+
+def put_item_conditional(item: dict, condition: str, names: dict = None, values: dict = None) -> bool:
+    """Put an item only if the condition holds. Returns False if the condition failed."""
+    item = _convert_floats(item)
+    kwargs = {"Item": item, "ConditionExpression": condition}
+    if names:
+        kwargs["ExpressionAttributeNames"] = names
+    if values:
+        kwargs["ExpressionAttributeValues"] = _convert_floats(values)
+    table = get_table()
+    with span("db.put_item_conditional", pk=item.get("pk")) as s:
+        try:
+            table.put_item(**kwargs)
+            return True
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            s.set(condition_failed=True)
+            return False
 
 
 def get_item(pk: str, sk: str) -> dict | None:
-    resp = get_table().get_item(Key={"pk": pk, "sk": sk})
+    txn = _transaction.get()
+    if txn is not None and txn.has(pk, sk):
+        return txn.read(pk, sk)
+    with span("db.get_item", pk=pk):
+        resp = get_table().get_item(Key={"pk": pk, "sk": sk})
     item = resp.get("Item")
     return _convert_decimals(item) if item else None
 
 
 def delete_item(pk: str, sk: str) -> None:
-    get_table().delete_item(Key={"pk": pk, "sk": sk})
+    txn = _transaction.get()
+    if txn is not None:
+        txn.delete(pk, sk)
+        return
+    with span("db.delete_item", pk=pk):
+        get_table().delete_item(Key={"pk": pk, "sk": sk})
 
 
-def query_pk(pk: str, sk_prefix: str = None, limit: int = None) -> list[dict]:
+def query_pk(pk: str, sk_prefix: str = None, limit: int = None, consistent: bool = False) -> list[dict]:
     kwargs = {"KeyConditionExpression": Key("pk").eq(pk)}
+    if consistent:
+        kwargs["ConsistentRead"] = True
     if sk_prefix:
         kwargs["KeyConditionExpression"] &= Key("sk").begins_with(sk_prefix)
     if limit:
         kwargs["Limit"] = limit
-    resp = get_table().query(**kwargs)
-    items = resp.get("Items", [])
-    # Handle pagination
-    while "LastEvaluatedKey" in resp:
-        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    with span("db.query_pk", pk=pk) as s:
         resp = get_table().query(**kwargs)
-        items.extend(resp.get("Items", []))
+        items = resp.get("Items", [])
+        # Handle pagination
+        while "LastEvaluatedKey" in resp:
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+            resp = get_table().query(**kwargs)
+            items.extend(resp.get("Items", []))
+        s.set(items=len(items))
     return _convert_decimals(items)
 
 
@@ -86,12 +176,14 @@ def query_gsi(index_name: str, pk_attr: str, pk_value: str,
     }
     if filter_pk:
         kwargs["FilterExpression"] = Attr("pk").eq(filter_pk)
-    resp = get_table().query(**kwargs)
-    items = resp.get("Items", [])
-    while "LastEvaluatedKey" in resp:
-        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    with span("db.query_gsi", index=index_name, key=pk_value) as s:
         resp = get_table().query(**kwargs)
-        items.extend(resp.get("Items", []))
+        items = resp.get("Items", [])
+        while "LastEvaluatedKey" in resp:
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+            resp = get_table().query(**kwargs)
+            items.extend(resp.get("Items", []))
+        s.set(items=len(items))
     return _convert_decimals(items)
 
 
@@ -108,16 +200,126 @@ def update_item(pk: str, sk: str, updates: dict) -> dict:
         expr_parts.append(f"{pn} = {pv}")
         names[pn] = key
         values[pv] = val
-    resp = get_table().update_item(
-        Key={"pk": pk, "sk": sk},
-        UpdateExpression="SET " + ", ".join(expr_parts),
-        ExpressionAttributeNames=names,
-        ExpressionAttributeValues=values,
-        ReturnValues="ALL_NEW",
-    )
+    txn = _transaction.get()
+    if txn is not None:
+        txn.update(pk, sk, updates)
+        return _convert_decimals({"pk": pk, "sk": sk, **updates})
+    with span("db.update_item", pk=pk):
+        resp = get_table().update_item(
+            Key={"pk": pk, "sk": sk},
+            UpdateExpression="SET " + ", ".join(expr_parts),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_NEW",
+        )
     return _convert_decimals(resp.get("Attributes", {}))
 
 
+class _Transaction:
+    """Writes collected by transaction(), one pending operation per item.
+
+    A later write to the same item is folded into the pending one (DynamoDB
+    rejects a transaction that touches an item twice): updates merge into a
+    pending put or update, a put or delete replaces whatever was pending.
+    """
+
+    def __init__(self):
+        self.ops = {}  # (pk, sk) -> ("put", item) | ("update", updates) | ("delete", None)
+        self.on_commit = []
+        self._read_cache = {}
+
+    def has(self, pk: str, sk: str) -> bool:
+        return (pk, sk) in self.ops
+
+    def put(self, item: dict) -> None:
+        self.ops[(item["pk"], item["sk"])] = ("put", dict(item))
+
+    def delete(self, pk: str, sk: str) -> None:
+        self.ops[(pk, sk)] = ("delete", None)
+
+    def update(self, pk: str, sk: str, updates: dict) -> None:
+        kind, data = self.ops.get((pk, sk), ("update", {}))
+        if kind == "delete":
+            kind, data = "update", {}
+        self.ops[(pk, sk)] = (kind, {**data, **updates})
+
+    def read(self, pk: str, sk: str) -> dict | None:
+        """The item as it will be once the transaction commits."""
+        kind, data = self.ops[(pk, sk)]
+        if kind == "delete":
+            return None
+        if kind == "put":
+            return _convert_decimals(data)
+        if (pk, sk) not in self._read_cache:
+            with span("db.get_item", pk=pk):
+                resp = get_table().get_item(Key={"pk": pk, "sk": sk})
+            self._read_cache[(pk, sk)] = resp.get("Item")
+        current = self._read_cache[(pk, sk)]
+        return _convert_decimals({**(current or {"pk": pk, "sk": sk}), **data})
+
+    def commit(self) -> None:
+        from boto3.dynamodb.types import TypeSerializer
+        ser = TypeSerializer().serialize
+        requests = []
+        for (pk, sk), (kind, data) in self.ops.items():
+            key = {"pk": ser(pk), "sk": ser(sk)}
+            if kind == "put":
+                requests.append({"Put": {"TableName": TABLE_NAME, "Item": {k: ser(v) for k, v in data.items()}}})
+            elif kind == "delete":
+                requests.append({"Delete": {"TableName": TABLE_NAME, "Key": key}})
+            elif data:
+                names = {f"#k{i}": k for i, k in enumerate(data)}
+                values = {f":v{i}": ser(v) for i, v in enumerate(data.values())}
+                requests.append({"Update": {
+                    "TableName": TABLE_NAME,
+                    "Key": key,
+                    "UpdateExpression": "SET " + ", ".join(f"#k{i} = :v{i}" for i in range(len(data))),
+                    "ExpressionAttributeNames": names,
+                    "ExpressionAttributeValues": values,
+                }})
+        if len(requests) > TRANSACTION_MAX_ITEMS:
+            # Splitting it would give up all-or-nothing; write nothing instead
+            raise ValueError(f"transaction touches {len(requests)} items (limit {TRANSACTION_MAX_ITEMS})")
+        if requests:
+            with span("db.transact_write_items", count=len(requests)):
+                get_table().meta.client.transact_write_items(TransactItems=requests)
+
+
+@contextmanager
+def transaction():
+    """Defer put_item/update_item/delete_item and commit them together on exit.
+
+    Used to run several intents of one message as a unit: their writes go out
+    in a single TransactWriteItems call, all or nothing. A transaction over
+    TRANSACTION_MAX_ITEMS items raises ValueError on exit and writes nothing.
+    get_item inside the block sees the pending writes; queries don't. Nothing
+    is written if the block raises. Nested calls join the outer transaction.
+    """
+    if _transaction.get() is not None:
+        yield _transaction.get()
+        return
+    txn = _Transaction()
+    token = _transaction.set(txn)
+    try:
+        yield txn
+    finally:
+        _transaction.reset(token)
+    if txn.ops:
+        txn.commit()
+    for fn in txn.on_commit:
+        fn()
+
+
+def after_commit(fn) -> None:
+    """Call fn once the current transaction's writes are committed, or now
+    if there is none (in-process state that must not run ahead of the table)."""
+    txn = _transaction.get()
+    if txn is None:
+        fn()
+    else:
+        txn.on_commit.append(fn)
+
+
 # ── Entity-Specific Operations ──
 
 
@@ -213,8 +415,11 @@ def get_chat_log(date_str: str, limit: int = 20) -> list[dict]:
     return msgs
 
 
-def save_chat_message(date_str: str, role: str, content: str, intent: str = None) -> None:
-    """Save a chat message (user or assistant)."""
+def save_chat_message(date_str: str, role: str, content: str, intent: str = None, route: str = None) -> None:
+    """Save a chat message (user or assistant).
+
+    route: what resolved the intent ("llm", "rules", "classifier", ...).
+    """
     from datetime import datetime as dt
     now = dt.utcnow()
     msg_id = now.strftime("%Y%m%dT%H%M%S%f")
@@ -228,7 +433,99 @@ def save_chat_message(date_str: str, role: str, content: str, intent: str = None
     }
     if intent:
         item["intent"] = intent
-    put_item(item)
+    if route:
+        item["route"] = route
+    put_log_item(item)
+
+
+def claim_webhook_delivery(source: str, delivery_id: str) -> dict | None:
+    """Claim a webhook delivery (e.g. Twilio MessageSid) for processing.
+
+    Returns None if this call won the claim, or the existing record if the
+    delivery was already processed (or is still being processed). A claim
+    stuck in "processing" past WEBHOOK_CLAIM_TIMEOUT_SECONDS can be taken over.
+    """
+    now = datetime.utcnow()
+    stale_before = (now - timedelta(seconds=WEBHOOK_CLAIM_TIMEOUT_SECONDS)).isoformat()
+    sk = f"{source}#{delivery_id}"
+    item = {
+        "pk": "WEBHOOK",
+        "sk": sk,
+        "source": source,
+        "delivery_id": delivery_id,
+        "status": "processing",
+        "created_at": now.isoformat(),
+        "ttl": int(time.time()) + WEBHOOK_DEDUPE_TTL_HOURS * 3600,
+    }
+    claimed = put_item_conditional(
+        item,
+        "attribute_not_exists(pk) OR (#s = :processing AND created_at < :stale)",
+        names={"#s": "status"},
+        values={":processing": "processing", ":stale": stale_before},
+    )
+    if claimed:
+        return None
+    return get_item("WEBHOOK", sk) or {"status": "processing"}
+
+
+def complete_webhook_delivery(source: str, delivery_id: str, response: str) -> None:
+    """Mark a claimed webhook delivery as processed and cache the reply sent."""
+    update_item("WEBHOOK", f"{source}#{delivery_id}", {
+        "status": "done",
+        "response": response,
+        "completed_at": datetime.utcnow().isoformat(),
+    })
+
+
+def release_webhook_delivery(source: str, delivery_id: str) -> None:
+    """Drop an unfinished claim after a failed attempt so the provider's retry is processed.
+
+    Deliveries already marked done are kept, so a failure after the reply went
+    out does not cause a second reply on redelivery.
+    """
+    table = get_table()
+    with span("db.release_webhook_delivery"):
+        try:
+            table.delete_item(
+                Key={"pk": "WEBHOOK", "sk": f"{source}#{delivery_id}"},
+                ConditionExpression="#s = :processing",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={":processing": "processing"},
+            )
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            pass
+
+
+def add_burst_message(channel: str, text: str) -> str:
+    """Buffer an inbound message for burst coalescing. Returns its sort key."""
+    now = datetime.utcnow()
+    msg_id = f"{now.strftime('%Y%m%dT%H%M%S%f')}#{uuid.uuid4().hex[:8]}"
+    put_item({
+        "pk": f"BURST#{channel}",
+        "sk": msg_id,
+        "text": text,
+        "received_at": now.isoformat(),
+        "ttl": int(time.time()) + 3600,
+    })
+    return msg_id
+
+
+def get_burst_messages(channel: str, max_age_seconds: int = 120) -> list[dict]:
+    """Get buffered burst messages for a channel, oldest first, ignoring stale leftovers.
+
+    Strongly consistent: each request checks whether its own just-written
+    message is the newest, and an eventually consistent read can miss it.
+    """
+    cutoff = (datetime.utcnow() - timedelta(seconds=max_age_seconds)).isoformat()
+    msgs = query_pk(f"BURST#{channel}", consistent=True)
+    return [m for m in msgs if m.get("received_at", "") >= cutoff]
+
+
+def clear_burst_messages(channel: str, msg_ids: list[str]) -> None:
+    with span("db.clear_burst_messages", count=len(msg_ids)):
+        with get_table().batch_writer() as batch:
+            for msg_id in msg_ids:
+                batch.delete_item(Key={"pk": f"BURST#{channel}", "sk": msg_id})
 
 
 def list_active_behavior_overrides() -> list[dict]:
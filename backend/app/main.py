@@ -6,6 +6,7 @@ from fastapi.responses import JSONResponse
 from mangum import Mangum
 
 from .routes import projects, tasks, weeks, dayplans, settings
+from .services import llm_limiter
 
 app = FastAPI(title="PCP Workboard API")
 
@@ -38,7 +39,13 @@ except ImportError:
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "service": "pcp-workboard"}
+    # llm: this container's LLM slot usage and queue-wait stats;
+    # intent_cache: hit/miss counters of its intent result cache
+    from .agents.intent_parser import intent_cache_stats
+    return {
+        "status": "ok", "service": "pcp-workboard",
+        "llm": llm_limiter.stats(), "intent_cache": intent_cache_stats(),
+    }
 
 
 @app.exception_handler(Exception)
@@ -83,6 +90,9 @@ def _handle_scheduled_action(event, context):
         elif action == "reminder":
             from .agents.reminders import send_reminder
             return send_reminder(event["reminder_id"])
+        elif action == "update_conversation_summary":
+            from .agents.conversation_summary import update_summary
+            return update_summary()
         else:
             return {"statusCode": 400, "body": f"Unknown action: {action}"}
     except Exception as e:
@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from ..auth import verify_api_key
 from ..models import AgentNoteCreate
 from .. import db
+from ..services import note_index
 
 router = APIRouter()
 
@@ -29,6 +30,7 @@ def create_note(body: AgentNoteCreate, _=Depends(verify_api_key)):
     }
     item = {k: v for k, v in item.items() if v is not None}
     db.put_item(item)
+    note_index.upsert(item)
     return item
 
 
@@ -38,4 +40,5 @@ def delete_note(note_id: str, _=Depends(verify_api_key)):
     if not existing:
         raise HTTPException(404, "Note not found")
     db.update_item("AGENTNOTE", note_id, {"active": False})
+    note_index.remove(note_id)
     return {"deleted": True}
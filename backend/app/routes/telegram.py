@@ -5,10 +5,8 @@ from fastapi import APIRouter, Request
 
 from .. import db
 from ..config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
-from ..agents.intent_parser import parse_intent
-from ..agents.responder import generate_response
 from ..services.telegram_client import send_telegram
-from .whatsapp import _build_context, _execute_intent, _record_checkin
+from .whatsapp import _handle_message, _release_delivery
 
 router = APIRouter()
 
@@ -16,49 +14,35 @@ router = APIRouter()
 @router.post("/webhook")
 async def telegram_webhook(request: Request):
     """Handle incoming Telegram bot messages."""
+    chat_id = ""
+    update_id = ""
     try:
         update = await request.json()
         message = update.get("message", {})
         text = message.get("text", "").strip()
         chat_id = str(message.get("chat", {}).get("id", ""))
+        update_id = str(update.get("update_id", ""))
 
         if not text:
             return {"ok": True}
 
+        # Telegram redelivers until it gets a 2xx — process each update_id once
+        if update_id and db.claim_webhook_delivery("telegram", update_id) is not None:
+            return {"ok": True, "duplicate": True}
+
         # Save chat_id on first message so we can send proactive messages later
         if chat_id and not TELEGRAM_CHAT_ID:
             _save_telegram_chat_id(chat_id)
 
-        # Load context (shared with WhatsApp)
-        context = _build_context()
-
-        # Save user message to chat log
-        db.save_chat_message(context["today"], "user", text)
-
-        # Parse intent via Claude
-        intent = parse_intent(text, context)
-
-        # Execute intent
-        result = _execute_intent(intent, context)
-
-        # Generate response
-        response_text = generate_response(intent, result, context)
-
-        # Send response via Telegram
-        send_telegram(response_text, chat_id=chat_id)
-
-        # Save agent response to chat log
-        action = intent.get("intent", "unknown")
-        db.save_chat_message(context["today"], "assistant", response_text, intent=action)
+        def reply(response_text: str) -> None:
+            send_telegram(response_text, chat_id=chat_id)
+            if update_id:
+                db.complete_webhook_delivery("telegram", update_id, response_text)
 
-        # Log the check-in
-        _record_checkin(
-            context["today"],
-            result.get("task", {}).get("sk") or result.get("task", {}).get("id"),
-            "user_message",
-            f"User: {text[:100]} | Agent: {response_text[:100]}",
-            response=text,
-        )
+        # Shared agent pipeline (context, intent, reply, chat log)
+        if await _handle_message("telegram", text, reply) is None and update_id:
+            # Folded into a burst that a later message answers
+            db.complete_webhook_delivery("telegram", update_id, "")
 
     except Exception as e:
         traceback.print_exc()
@@ -67,6 +51,7 @@ async def telegram_webhook(request: Request):
                 send_telegram("Something went wrong. Try again in a moment.", chat_id=chat_id)
         except Exception:
             pass
+        _release_delivery("telegram", update_id)
 
     return {"ok": True}
 
@@ -1,25 +1,30 @@
 """WhatsApp webhook handler — the core of the agent."""
+import asyncio
+import contextvars
+import functools
+import time
 import traceback
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 from fastapi import APIRouter, Request, Response
 
 from .. import db
-from ..config import TIMEZONE
+from ..config import TIMEZONE, BURST_WINDOW_SECONDS
+from ..tracing import span, traced, set_attrs
+from ..agents import conversation_summary, shadow
 from ..agents.intent_parser import parse_intent
 from ..agents.responder import generate_response
+from ..services import note_index, task_index, week_snapshot, next_task as next_task_engine
 from ..services.twilio_client import send_whatsapp
-from ..services.task_service import (
-    find_matching_task,
-    get_next_task,
-    create_task_from_intent,
-    calculate_day_load,
-    get_free_slots,
-)
+from ..services.task_service import create_task_from_intent
 
 router = APIRouter()
 
+# DB reads started while the intent is still streaming in (see _start_prefetch)
+_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
 
 def _local_now() -> datetime:
     """Get current datetime in the user's configured timezone."""
@@ -44,6 +49,7 @@ def _day_name() -> str:
     return _local_now().strftime("%A").lower()
 
 
+@traced("build_context")
 def _build_context() -> dict:
     """Load all context needed for intent parsing."""
     today = _today()
@@ -60,6 +66,7 @@ def _build_context() -> dict:
     settings = db.get_settings()
     dayplan = db.get_dayplan(today)
     chat_history = db.get_chat_log(today, limit=15)
+    summary = conversation_summary.get_summary()
 
     now = _local_now()
     current_time = now.strftime("%H:%M")
@@ -79,50 +86,35 @@ def _build_context() -> dict:
         "settings": settings,
         "dayplan": dayplan,
         "chat_history": chat_history,
+        "conversation_summary": summary,
     }
 
 
 @router.post("/webhook")
 async def whatsapp_webhook(request: Request):
     """Handle incoming Twilio WhatsApp messages."""
+    message_sid = ""
     try:
         form_data = await request.form()
         message_body = form_data.get("Body", "").strip()
         from_number = form_data.get("From", "")
+        message_sid = form_data.get("MessageSid", "")
 
         if not message_body:
             return Response(content="<Response></Response>", media_type="application/xml")
 
-        # Load context
-        context = _build_context()
-
-        # Save user message to chat log
-        db.save_chat_message(context["today"], "user", message_body)
-
-        # Parse intent via Claude
-        intent = parse_intent(message_body, context)
-
-        # Execute intent
-        result = _execute_intent(intent, context)
-
-        # Generate response
-        response_text = generate_response(intent, result, context)
-
-        # Send response via Twilio
-        send_whatsapp(response_text)
+        # Twilio redelivers on timeouts/5xx — process each MessageSid once
+        if message_sid and db.claim_webhook_delivery("twilio", message_sid) is not None:
+            return Response(content="<Response></Response>", media_type="application/xml")
 
-        # Save agent response to chat log
-        action = intent.get("intent", "unknown")
-        db.save_chat_message(context["today"], "assistant", response_text, intent=action)
+        def reply(text: str) -> None:
+            send_whatsapp(text)
+            if message_sid:
+                db.complete_webhook_delivery("twilio", message_sid, text)
 
-        # Log the check-in
-        _record_checkin(
-            context["today"],
-            result.get("task", {}).get("sk") or result.get("task", {}).get("id"),
-            "user_message",
-            f"User: {message_body[:100]} | Agent: {response_text[:100]}",
-            response=message_body,
-        )
+        if await _handle_message("whatsapp", message_body, reply) is None and message_sid:
+            # Folded into a burst that a later message answers
+            db.complete_webhook_delivery("twilio", message_sid, "")
 
     except Exception as e:
         traceback.print_exc()
@@ -130,11 +122,90 @@ async def whatsapp_webhook(request: Request):
             send_whatsapp("Something went wrong. Try again in a moment.")
         except Exception:
             pass
+        _release_delivery("twilio", message_sid)
 
     # Always return 200 to Twilio
     return Response(content="<Response></Response>", media_type="application/xml")
 
 
+async def _handle_message(channel: str, text: str, send) -> str | None:
+    """Run the agent pipeline for one inbound message and send the reply.
+
+    Shared by the WhatsApp and Telegram webhooks. Returns the reply sent, or
+    None if the message was folded into a burst answered by a later request.
+    Chat log and check-in writes are buffered and flushed in one batch at the end.
+    Each message is traced as one span tree (see app/tracing.py).
+    """
+    with span("message", root=True, channel=channel, chars=len(text)):
+        with db.buffered_writes():
+            return await _run_pipeline(channel, text, send)
+
+
+async def _run_pipeline(channel: str, text: str, send) -> str | None:
+    # Save user message to chat log (each message of a burst is logged on its own)
+    db.save_chat_message(_today(), "user", text)
+
+    # Merge rapid-fire messages into one parse + one reply
+    with span("coalesce_burst") as s:
+        message = await _coalesce_burst(channel, text)
+        s.set(coalesced=message is None)
+    if message is None:
+        return None
+
+    # Load context
+    context = _build_context()
+
+    # Parse intent via Claude; reads the handler needs start as soon as the intent is known
+    t0 = time.perf_counter()
+    intent = parse_intent(message, context, on_intent=functools.partial(_start_prefetch, context))
+    shadow.maybe_shadow(message, context, intent, (time.perf_counter() - t0) * 1000)
+
+    # Execute intent
+    result = _execute_intent(intent, context)
+
+    # Generate response
+    response_text = generate_response(intent, result, context)
+
+    # Send response
+    with span("send", channel=channel):
+        send(response_text)
+
+    # Save agent response to chat log
+    action = intent.get("intent", "unknown")
+    db.save_chat_message(context["today"], "assistant", response_text, intent=action, route=intent.get("route"))
+    conversation_summary.maybe_request_update(context)
+
+    # Log the check-in
+    _record_checkin(
+        context["today"],
+        result.get("task", {}).get("sk") or result.get("task", {}).get("id"),
+        "user_message",
+        f"User: {message[:100]} | Agent: {response_text[:100]}",
+        response=message,
+    )
+    return response_text
+
+
+async def _coalesce_burst(channel: str, text: str) -> str | None:
+    """Wait out the burst window and merge messages that arrived within it.
+
+    Only the request holding the newest buffered message processes the burst;
+    earlier requests return None. Returns the text unchanged when disabled.
+    """
+    if BURST_WINDOW_SECONDS <= 0:
+        return text
+
+    msg_id = db.add_burst_message(channel, text)
+    await asyncio.sleep(BURST_WINDOW_SECONDS)
+
+    burst = db.get_burst_messages(channel)
+    if not burst or burst[-1]["sk"] != msg_id:
+        return None
+
+    db.clear_burst_messages(channel, [m["sk"] for m in burst])
+    return "\n".join(m.get("text", "") for m in burst)
+
+
 @router.post("/status")
 async def whatsapp_status(request: Request):
     """Twilio delivery status callback."""
@@ -143,18 +214,39 @@ async def whatsapp_status(request: Request):
 
 @router.post("/test-message")
 async def test_message(request: Request):
-    """Simulate a WhatsApp message for local testing (no Twilio signature needed)."""
+    """Simulate a WhatsApp message for local testing (no Twilio signature needed).
+
+    Pass an optional "message_id" to exercise webhook redelivery dedupe.
+    """
     body = await request.json()
     message = body.get("message", "")
+    message_id = body.get("message_id", "")
     if not message:
         return {"error": "No message provided"}
 
-    context = _build_context()
-    db.save_chat_message(context["today"], "user", message)
-    intent = parse_intent(message, context)
-    result = _execute_intent(intent, context)
-    response_text = generate_response(intent, result, context)
-    db.save_chat_message(context["today"], "assistant", response_text, intent=intent.get("intent"))
+    if message_id:
+        existing = db.claim_webhook_delivery("test", message_id)
+        if existing is not None:
+            return {"duplicate": True, "status": existing.get("status"), "response": existing.get("response")}
+
+    try:
+        with span("test_message", root=True), db.buffered_writes():
+            context = _build_context()
+            db.save_chat_message(context["today"], "user", message)
+            t0 = time.perf_counter()
+            intent = parse_intent(message, context, on_intent=functools.partial(_start_prefetch, context))
+            shadow.maybe_shadow(message, context, intent, (time.perf_counter() - t0) * 1000)
+            result = _execute_intent(intent, context)
+            response_text = generate_response(intent, result, context)
+            db.save_chat_message(context["today"], "assistant", response_text,
+                                 intent=intent.get("intent"), route=intent.get("route"))
+            conversation_summary.maybe_request_update(context)
+    except Exception:
+        _release_delivery("test", message_id)
+        raise
+
+    if message_id:
+        db.complete_webhook_delivery("test", message_id, response_text)
 
     return {
         "intent": intent,
@@ -163,9 +255,55 @@ async def test_message(request: Request):
     }
 
 
+def _release_delivery(source: str, delivery_id: str) -> None:
+    """Release a webhook claim after a failure so a redelivery can retry it."""
+    if not delivery_id:
+        return
+    try:
+        db.release_webhook_delivery(source, delivery_id)
+    except Exception:
+        traceback.print_exc()
+
+
+def _start_prefetch(context: dict, action: str, fields: dict) -> None:
+    """Start the DB reads an intent's handler will need, while the LLM finishes.
+
+    Called from parse_intent's stream as soon as the intent name is known.
+    Futures go in context["prefetch"]; handlers collect them with _prefetched().
+    Task matching and settings need no read here: week tasks and settings
+    are already in the context (_build_context).
+    """
+    loads = {}
+    if action in ("list_reminders", "delete_reminder"):
+        loads["reminders"] = db.list_active_reminders
+    elif action == "checkin_response":
+        checkin = _last_open_checkin(context)
+        if checkin and checkin.get("task_id"):
+            loads["checkin_task"] = functools.partial(db.get_item, "TASK", checkin["task_id"])
+
+    prefetch = context.setdefault("prefetch", {})
+    for key, load in loads.items():
+        if key not in prefetch:
+            # Run in a copy of this context so the reads show up in the trace
+            prefetch[key] = _prefetch_pool.submit(contextvars.copy_context().run, load)
+
+
+def _prefetched(context: dict, key: str, load):
+    """Result of a read started by _start_prefetch, or load() if none was started."""
+    future = context.get("prefetch", {}).get(key)
+    if future is not None:
+        try:
+            return future.result()
+        except Exception:
+            traceback.print_exc()
+    return load()
+
+
+@traced("execute_intent")
 def _execute_intent(intent: dict, context: dict) -> dict:
     """Execute the parsed intent and return result data."""
     action = intent.get("intent", "unknown")
+    set_attrs(intent=action)
 
     if action == "add_task":
         return _handle_add_task(intent, context)
@@ -198,23 +336,40 @@ def _execute_intent(intent: dict, context: dict) -> dict:
     elif action == "set_reminder":
         return _handle_set_reminder(intent)
     elif action == "delete_reminder":
-        return _handle_delete_reminder(intent)
+        return _handle_delete_reminder(intent, context)
     elif action == "list_reminders":
-        return {"reminders": db.list_active_reminders()}
+        return {"reminders": _prefetched(context, "reminders", db.list_active_reminders)}
     elif action == "modify_behavior":
         return _handle_modify_behavior(intent)
     elif action == "add_note":
-        return _handle_add_note(intent)
+        return _handle_add_note(intent, context)
     elif action in ("log_food", "log_exercise", "log_sleep"):
         return _handle_health_log(intent, context)
     elif action == "pause_agent":
         return _handle_pause_agent(intent)
     elif action == "manage_subtypes":
-        return _handle_manage_subtypes(intent)
+        return _handle_manage_subtypes(intent, context)
+    elif action == "batch":
+        return _handle_batch(intent, context)
     else:
         return {"unknown": True}
 
 
+def _handle_batch(intent: dict, context: dict) -> dict:
+    """Run the actions of a multi-intent message in order, as one unit.
+
+    All actions share the context, so a later one sees what an earlier one
+    changed (handlers update the task dicts they touch). Their writes are
+    committed together in one transaction after the last action; note index
+    updates wait for that commit (db.after_commit).
+    """
+    results = []
+    with db.transaction():
+        for action in intent.get("intents", []):
+            results.append(_execute_intent(action, context))
+    return {"results": results}
+
+
 def _handle_add_task(intent: dict, context: dict) -> dict:
     """Handle smart task intake."""
     tasks_data = intent.get("tasks", [])
@@ -293,18 +448,32 @@ def _handle_complete_pending(intent: dict, context: dict) -> dict:
     return {"created": True, "task": task}
 
 
+def _match_task(context: dict, match_str: str, today_first: bool = False) -> tuple[dict | None, str | None]:
+    """Find the week task the user means: (task, None) or (None, error message).
+
+    With today_first, today's tasks win over the rest of the week. Near-tied
+    candidates are not guessed between; the error asks which one, listing
+    each with its day and status so same-named tasks can be told apart.
+    """
+    today = {id(t) for t in context.get("today_tasks", [])} if today_first else None
+    match = task_index.for_context(context).best(match_str, prefer=(lambda t: id(t) in today) if today else None)
+    if match["task"] is None:
+        return None, f"No matching task found for '{match_str}'."
+    if match["ambiguous"]:
+        names = ", ".join(
+            f"*{t.get('name')}* ({(t.get('day') or 'unscheduled').title()}, {t.get('status', 'todo')})"
+            for _, t in match["candidates"][:4]
+        )
+        return None, f"'{match_str}' matches more than one task: {names}. Which one?"
+    return match["task"], None
+
+
 def _handle_status_change(intent: dict, context: dict, new_status: str) -> dict:
     """Handle mark_done, mark_doing, mark_skipped."""
     match_str = intent.get("task_match", "")
-    today_tasks = context.get("today_tasks", [])
-    task = find_matching_task(match_str, today_tasks)
-
-    if not task:
-        # Try all week tasks
-        task = find_matching_task(match_str, context.get("week_tasks", []))
-
-    if not task:
-        return {"error": f"No matching task found for '{match_str}'."}
+    task, error = _match_task(context, match_str, today_first=True)
+    if error:
+        return {"error": error}
 
     task_id = task.get("id") or task.get("sk")
     updates = {"status": new_status}
@@ -317,8 +486,7 @@ def _handle_status_change(intent: dict, context: dict, new_status: str) -> dict:
     task["status"] = new_status
 
     # Get next task
-    remaining = [t for t in today_tasks if (t.get("id") or t.get("sk")) != task_id and t.get("status") in ("todo", "doing")]
-    next_task = get_next_task(remaining, context.get("dayplan"))
+    next_task = next_task_engine.for_context(context).next(context.get("current_time"), exclude={task_id})
 
     return {"task": task, "next_task": next_task}
 
@@ -326,25 +494,23 @@ def _handle_status_change(intent: dict, context: dict, new_status: str) -> dict:
 def _handle_move_task(intent: dict, context: dict) -> dict:
     match_str = intent.get("task_match", "")
     to_day = intent.get("to_day", "")
-    task = find_matching_task(match_str, context.get("week_tasks", []))
-    if not task:
-        return {"error": f"No matching task for '{match_str}'."}
+    task, error = _match_task(context, match_str)
+    if error:
+        return {"error": error}
 
     task_id = task.get("id") or task.get("sk")
     db.update_item("TASK", task_id, {"day": to_day})
     task["day"] = to_day
 
-    load = calculate_day_load(context.get("week_tasks", []), to_day)
-    return {"task": task, "day_load": load + task.get("estimated_hours", 0)}
+    # The moved task is one of the week tasks, so it's already in the load
+    return {"task": task, "day_load": week_snapshot.for_context(context).day_load(to_day)}
 
 
 def _handle_push_tomorrow(intent: dict, context: dict) -> dict:
     match_str = intent.get("task_match", "")
-    task = find_matching_task(match_str, context.get("today_tasks", []))
-    if not task:
-        task = find_matching_task(match_str, context.get("week_tasks", []))
-    if not task:
-        return {"error": f"No matching task for '{match_str}'."}
+    task, error = _match_task(context, match_str, today_first=True)
+    if error:
+        return {"error": error}
 
     # Determine tomorrow's day name
     from datetime import timedelta
@@ -356,25 +522,26 @@ def _handle_push_tomorrow(intent: dict, context: dict) -> dict:
 
 
 def _handle_query_next(context: dict) -> dict:
-    next_task = get_next_task(context.get("today_tasks", []), context.get("dayplan"))
-    return {"next_task": next_task}
+    engine = next_task_engine.for_context(context)
+    now = context.get("current_time")
+    next_task = engine.next(now)
+    return {
+        "next_task": next_task,
+        "block": engine.block(next_task),
+        "current_task": engine.current(now),
+        "overdue": engine.overdue(now),
+    }
 
 
 def _handle_checkin_response(intent: dict, context: dict) -> dict:
     """Handle emoji/text responses to block check-ins."""
     status = intent.get("status", "done")
 
-    # Find the most recent unresponded check-in
-    checkins = context.get("recent_checkins", [])
-    last_checkin = None
-    for ci in reversed(checkins):
-        if ci.get("type") in ("block_end", "morning") and not ci.get("response"):
-            last_checkin = ci
-            break
+    last_checkin = _last_open_checkin(context)
 
     task = None
     if last_checkin and last_checkin.get("task_id"):
-        task = db.get_item("TASK", last_checkin["task_id"])
+        task = _prefetched(context, "checkin_task", lambda: db.get_item("TASK", last_checkin["task_id"]))
 
     if task:
         task_id = task.get("id") or task.get("sk")
@@ -402,14 +569,20 @@ def _handle_checkin_response(intent: dict, context: dict) -> dict:
             "response_at": datetime.utcnow().isoformat(),
         })
 
-    next_task = get_next_task(
-        [t for t in context.get("today_tasks", []) if t.get("status") in ("todo", "doing")],
-        context.get("dayplan"),
-    )
+    exclude = {task.get("id") or task.get("sk")} if task else set()
+    next_task = next_task_engine.for_context(context).next(context.get("current_time"), exclude=exclude)
 
     return {"task": task or {}, "next_task": next_task, "status": status}
 
 
+def _last_open_checkin(context: dict) -> dict | None:
+    """The most recent check-in the user hasn't responded to."""
+    for ci in reversed(context.get("recent_checkins", [])):
+        if ci.get("type") in ("block_end", "morning") and not ci.get("response"):
+            return ci
+    return None
+
+
 def _handle_set_reminder(intent: dict) -> dict:
     reminder_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
@@ -430,9 +603,9 @@ def _handle_set_reminder(intent: dict) -> dict:
     return {"reminder": item}
 
 
-def _handle_delete_reminder(intent: dict) -> dict:
+def _handle_delete_reminder(intent: dict, context: dict) -> dict:
     num = intent.get("reminder_number", 0)
-    reminders = db.list_active_reminders()
+    reminders = _prefetched(context, "reminders", db.list_active_reminders)
     if 0 < num <= len(reminders):
         r = reminders[num - 1]
         db.update_item("REMINDER", r["sk"], {"active": False})
@@ -468,7 +641,7 @@ def _handle_modify_behavior(intent: dict) -> dict:
     return {"message": f"{intent.get('setting', 'Setting')} updated to {intent.get('value', '')} ({duration})."}
 
 
-def _handle_add_note(intent: dict) -> dict:
+def _handle_add_note(intent: dict, context: dict) -> dict:
     note_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
 
@@ -497,9 +670,7 @@ def _handle_add_note(intent: dict) -> dict:
     tagged_task_id = None
     tagged_task_name = None
     if intent.get("tagged_task"):
-        from ..services.task_service import find_matching_task
-        week_tasks = db.get_tasks_for_week(_week_id())
-        matched = find_matching_task(intent["tagged_task"], week_tasks)
+        matched = task_index.for_context(context).best(intent["tagged_task"])["task"]
         if matched:
             tagged_task_id = matched.get("id") or matched.get("sk")
             tagged_task_name = matched.get("name")
@@ -519,6 +690,7 @@ def _handle_add_note(intent: dict) -> dict:
     }
     item = {k: v for k, v in item.items() if v is not None}
     db.put_item(item)
+    db.after_commit(functools.partial(note_index.upsert, item))
 
     return {
         "note": intent.get("note", ""),
@@ -558,7 +730,7 @@ def _handle_pause_agent(intent: dict) -> dict:
     return {"until": until}
 
 
-def _handle_manage_subtypes(intent: dict) -> dict:
+def _handle_manage_subtypes(intent: dict, context: dict) -> dict:
     """Add, remove, or list subtypes for an area."""
     from ..config import DEFAULT_SETTINGS
     action = intent.get("action", "list")
@@ -566,7 +738,7 @@ def _handle_manage_subtypes(intent: dict) -> dict:
     subtype = intent.get("subtype", "")
 
     # Get current subtypes from settings
-    settings = db.get_settings()
+    settings = context["settings"] if "settings" in context else db.get_settings()
     custom_subtypes = settings.get("custom_subtypes", {})
 
     # Default subtypes per area
@@ -634,7 +806,7 @@ def _handle_chat(intent: dict, context: dict) -> dict:
 
     if save and message:
         note_id = str(uuid.uuid4())
-        db.put_item({
+        note = {
             "pk": "AGENTNOTE",
             "sk": note_id,
             "id": note_id,
@@ -643,7 +815,9 @@ def _handle_chat(intent: dict, context: dict) -> dict:
             "affects": "general",
             "active": True,
             "created_at": datetime.utcnow().isoformat(),
-        })
+        }
+        db.put_item(note)
+        db.after_commit(functools.partial(note_index.upsert, note))
     return {"reply": reply, "saved": save}
 
 
@@ -663,4 +837,4 @@ def _record_checkin(date: str, task_id: str | None, check_type: str, message: st
         "created_at": datetime.utcnow().isoformat(),
     }
     item = {k: v for k, v in item.items() if v is not None}
-    db.put_item(item)
+    db.put_log_item(item)
@@ -0,0 +1,232 @@
+"""Day-plan scheduler: pack a day's tasks into time blocks.
+
+The day is kept as a sorted list of disjoint free intervals (FreeTime).
+Tasks that already have a block_start time are fixed and reserved first, then
+lunch takes whatever of its window is still free, then the remaining tasks
+are packed first-fit by priority, due date and size, around everything
+already placed. A break goes in before a task that would take a stretch of
+back-to-back work past break_every minutes. Planned work (fixed blocks
+included) stays within the day's capacity.
+
+Tasks that don't fit are reported, not silently dropped:
+    {"task_id", "name", "hours", "reason": "capacity" | "no_room"}
+Fixed blocks that overlap one another are kept as given and reported under
+"conflicts".
+"""
+import bisect
+import re
+
+from ..config import (
+    DAYPLAN_DAY_START, DAYPLAN_DAY_END, DAYPLAN_LUNCH_START, DAYPLAN_LUNCH_END,
+    DAYPLAN_BREAK_EVERY_MINUTES, DAYPLAN_BREAK_MINUTES,
+)
+
+PRIO_ORDER = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
+MIN_BLOCK_MINUTES = 5
+
+_TIME_RE = re.compile(r"^\s*(\d{1,2})(?:[:.](\d{2}))?\s*(?:([ap])\.?\s*m?\.?)?\s*$", re.IGNORECASE)
+
+
+def to_minutes(hhmm: str) -> int:
+    h, m = map(int, hhmm.split(":")[:2])
+    return h * 60 + m
+
+
+def parse_time(value) -> int | None:
+    """A task's block time in minutes after midnight, or None if it isn't one.
+
+    block_start/block_end are free-form strings; besides "HH:MM" this takes
+    "9:30 AM", "2pm" and the like.
+    """
+    match = _TIME_RE.match(str(value or ""))
+    if not match:
+        return None
+    h, m, meridiem = int(match.group(1)), int(match.group(2) or 0), (match.group(3) or "").lower()
+    if meridiem:
+        if not 1 <= h <= 12:
+            return None
+        h = h % 12 + (12 if meridiem == "p" else 0)
+    elif match.group(2) is None:
+        return None  # a bare number isn't a time
+    if h > 23 or m > 59:
+        return None
+    return h * 60 + m
+
+
+def fmt_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _round_to_5min(minutes: float) -> int:
+    return int(round(minutes / 5) * 5)
+
+
+def task_minutes(task: dict) -> int:
+    """A task's block length: its estimate rounded to 5 minutes, at least 5."""
+    hours = task.get("estimated_hours", 1) or 0
+    return max(MIN_BLOCK_MINUTES, _round_to_5min(float(hours) * 60))
+
+
+class FreeTime:
+    """Disjoint free intervals [start, end) in minutes, kept sorted."""
+
+    def __init__(self, start: int, end: int):
+        self._starts = [start] if end > start else []
+        self._ends = [end] if end > start else []
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends))
+
+    def total(self) -> int:
+        return sum(e - s for s, e in self)
+
+    def reserve(self, start: int, end: int) -> int:
+        """Remove [start, end) from the free time; returns how many minutes were free."""
+        i = max(0, bisect.bisect_right(self._starts, start) - 1)
+        freed = 0
+        while i < len(self._starts) and self._starts[i] < end:
+            s, e = self._starts[i], self._ends[i]
+            if e <= start:
+                i += 1
+                continue
+            freed += min(e, end) - max(s, start)
+            pieces = [(a, b) for a, b in ((s, start), (end, e)) if b > a]
+            self._starts[i:i + 1] = [a for a, _ in pieces]
+            self._ends[i:i + 1] = [b for _, b in pieces]
+            i += len(pieces)
+        return freed
+
+    def free_within(self, start: int, end: int) -> list[tuple[int, int]]:
+        """The free parts of [start, end)."""
+        i = max(0, bisect.bisect_right(self._starts, start) - 1)
+        out = []
+        for s, e in zip(self._starts[i:], self._ends[i:]):
+            if s >= end:
+                break
+            if e > start:
+                out.append((max(s, start), min(e, end)))
+        return out
+
+    def first_fit(self, duration: int, not_before: int = 0) -> int | None:
+        """Earliest start >= not_before with duration free minutes after it."""
+        i = max(0, bisect.bisect_right(self._starts, not_before) - 1)
+        for s, e in zip(self._starts[i:], self._ends[i:]):
+            start = max(s, not_before)
+            if e - start >= duration:
+                return start
+        return None
+
+    def gap_end(self, at: int) -> int:
+        """End of the free interval containing at."""
+        i = bisect.bisect_right(self._starts, at) - 1
+        return self._ends[i] if i >= 0 and self._ends[i] > at else at
+
+
+def _block(start: int, end: int, task: dict = None, label: str = "") -> dict:
+    return {
+        "start": fmt_time(start),
+        "end": fmt_time(end),
+        "task_id": (task.get("id") or task.get("sk")) if task else None,
+        "type": "work" if task else "break",
+        "label": task.get("name", "") if task else label,
+    }
+
+
+def _unplaced(task: dict, reason: str) -> dict:
+    return {
+        "task_id": task.get("id") or task.get("sk"),
+        "name": task.get("name", ""),
+        "hours": task.get("estimated_hours", 0),
+        "reason": reason,
+    }
+
+
+def schedule_day(
+    tasks: list[dict],
+    capacity_hours: float = 8,
+    day_start: str = DAYPLAN_DAY_START,
+    day_end: str = DAYPLAN_DAY_END,
+    lunch: tuple = (DAYPLAN_LUNCH_START, DAYPLAN_LUNCH_END),
+    break_every: int = DAYPLAN_BREAK_EVERY_MINUTES,
+    break_minutes: int = DAYPLAN_BREAK_MINUTES,
+) -> dict:
+    """Plan the day's open tasks.
+
+    Returns {"blocks": [...], "unplaced": [...], "conflicts": [...],
+    "planned_hours": float, "free_hours": float}; blocks are sorted by start and never overlap,
+    except for conflicting fixed blocks.
+    """
+    open_tasks = [t for t in tasks if t.get("status") not in ("dropped", "done")]
+    start_min, end_min = to_minutes(day_start), to_minutes(day_end)
+    free = FreeTime(start_min, end_min)
+    capacity = int(float(capacity_hours) * 60)
+    used = 0
+    blocks, unplaced, conflicts = [], [], []
+    run_start_by_end = {}  # end of a stretch of back-to-back work -> its start
+
+    # Fixed blocks first, in time order; a block_start that isn't a time
+    # leaves the task flexible
+    starts = {id(t): parse_time(t.get("block_start")) for t in open_tasks}
+    fixed = sorted((t for t in open_tasks if starts[id(t)] is not None), key=lambda t: starts[id(t)])
+    for t in fixed:
+        s = starts[id(t)]
+        e = parse_time(t.get("block_end"))
+        if e is None or e <= s:
+            e = s + task_minutes(t)
+        inside = max(0, min(e, end_min) - max(s, start_min))
+        if free.reserve(s, e) < inside:
+            conflicts.append(_unplaced(t, "overlaps another fixed block"))
+        blocks.append(_block(s, e, t))
+        used += e - s
+        run_start_by_end[e] = run_start_by_end.pop(s, s)
+
+    # Lunch gets whatever of its window the fixed blocks left free
+    if lunch:
+        for s, e in free.free_within(to_minutes(lunch[0]), to_minutes(lunch[1])):
+            free.reserve(s, e)
+            blocks.append(_block(s, e, label="Lunch"))
+
+    flexible = [t for t in open_tasks if starts[id(t)] is None]
+    flexible.sort(key=lambda t: (
+        PRIO_ORDER.get(t.get("priority", "normal"), 2),
+        t.get("due_date") or "9999-99-99",
+        -task_minutes(t),
+    ))
+    for t in flexible:
+        duration = task_minutes(t)
+        if used + duration > capacity:
+            unplaced.append(_unplaced(t, "capacity"))
+            continue
+        not_before = start_min
+        while True:
+            s = free.first_fit(duration, not_before)
+            if s is None:
+                unplaced.append(_unplaced(t, "no_room"))
+                break
+            run_start = run_start_by_end.get(s, s)
+            if break_every <= 0 or break_minutes <= 0 or s == run_start or s + duration - run_start <= break_every:
+                e = s + duration
+                free.reserve(s, e)
+                blocks.append(_block(s, e, t))
+                used += duration
+                run_start_by_end[e] = run_start_by_end.pop(s, s)
+                break
+            # Too long without a break: take one here if the task still fits
+            # right after it; otherwise try the next gap (no orphan breaks)
+            brk_end = s + break_minutes
+            if free.gap_end(s) - brk_end >= duration:
+                free.reserve(s, brk_end)
+                blocks.append(_block(s, brk_end, label="Break"))
+                run_start_by_end.pop(s, None)
+                not_before = brk_end
+            else:
+                not_before = free.gap_end(s)
+
+    blocks.sort(key=lambda b: b["start"])
+    return {
+        "blocks": blocks,
+        "unplaced": unplaced,
+        "conflicts": conflicts,
+        "planned_hours": round(used / 60, 2),
+        "free_hours": round(free.total() / 60, 2),
+    }
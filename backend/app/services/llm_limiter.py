@@ -0,0 +1,162 @@
+"""Process-wide concurrency limiter for Anthropic calls, with priorities.
+
+Every LLM call takes a slot first. At most LLM_MAX_CONCURRENCY calls run at
+once; when all slots are busy, callers queue and the highest priority
+(lowest number) waiter gets the next free slot, so interactive parses
+always go ahead of background work such as summaries. Background calls
+also get at most LLM_BACKGROUND_MAX_CONCURRENCY slots of their own, and are
+rejected straight away (LimiterBusy) when the queue is already deep;
+background jobs are re-requested later, so they defer rather than pile up.
+
+The limiter covers one process (a warm Lambda container or the local dev
+server). Work started by an async Lambda self-invoke runs in its own
+container and isn't counted against this one.
+"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from ..config import (
+    LLM_MAX_CONCURRENCY, LLM_BACKGROUND_MAX_CONCURRENCY, LLM_BACKGROUND_MAX_QUEUE,
+    LLM_BACKGROUND_MAX_WAIT_SECONDS,
+)
+from ..tracing import set_attrs
+
+INTERACTIVE = 0
+BACKGROUND = 10
+
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+# Priority for slot() calls that don't pass one; see priority()
+_default_priority: ContextVar = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+class LimiterBusy(Exception):
+    """No slot: the queue was too deep, or the wait ran past its timeout."""
+
+
+class PriorityLimiter:
+    def __init__(self, max_concurrent: int, background_max_concurrent: int, background_max_queue: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self.background_max_concurrent = max(1, min(background_max_concurrent, self.max_concurrent))
+        self.background_max_queue = background_max_queue
+        self._cond = threading.Condition()
+        self._queue = []  # waiting (priority, seq); seq keeps FIFO order within a priority
+        self._seq = itertools.count()
+        self._running = {}  # priority -> calls holding a slot
+        self._stats = {}  # priority name -> counters
+
+    def _in_flight(self) -> int:
+        return sum(self._running.values())
+
+    def _can_run(self, priority: int) -> bool:
+        if self._in_flight() >= self.max_concurrent:
+            return False
+        if priority >= BACKGROUND:
+            background = sum(n for p, n in self._running.items() if p >= BACKGROUND)
+            return background < self.background_max_concurrent
+        return True
+
+    def _next_runnable(self):
+        """The queue entry that gets the next free slot, if any can run now.
+
+        Background entries the background cap holds back don't block the
+        interactive entries behind them.
+        """
+        for entry in sorted(self._queue):
+            if self._can_run(entry[0]):
+                return entry
+        return None
+
+    @contextmanager
+    def slot(self, priority: int = INTERACTIVE, timeout: float = None):
+        """Hold a slot for the duration of the block.
+
+        Raises LimiterBusy if background work meets a deep queue, or if no
+        slot frees up within `timeout` seconds.
+        """
+        name = _PRIORITY_NAMES.get(priority, str(priority))
+        t0 = time.monotonic()
+        with self._cond:
+            stats = self._stats.setdefault(name, {
+                "acquired": 0, "rejected": 0, "timed_out": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0,
+            })
+            if priority >= BACKGROUND and len(self._queue) >= self.background_max_queue:
+                stats["rejected"] += 1
+                raise LimiterBusy(f"{len(self._queue)} LLM calls already queued")
+
+            entry = (priority, next(self._seq))
+            self._queue.append(entry)
+            deadline = t0 + timeout if timeout is not None else None
+            while self._next_runnable() != entry:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    self._queue.remove(entry)
+                    stats["timed_out"] += 1
+                    self._cond.notify_all()
+                    raise LimiterBusy(f"no LLM slot within {timeout:.1f}s")
+                self._cond.wait(remaining)
+
+            self._queue.remove(entry)
+            self._running[priority] = self._running.get(priority, 0) + 1
+            wait_ms = (time.monotonic() - t0) * 1000
+            stats["acquired"] += 1
+            stats["wait_ms_total"] += wait_ms
+            stats["wait_ms_max"] = max(stats["wait_ms_max"], wait_ms)
+            # Others may be runnable too (e.g. several slots freed at once)
+            self._cond.notify_all()
+
+        set_attrs(llm_queue_ms=round(wait_ms, 2), llm_priority=name)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running[priority] -= 1
+                self._cond.notify_all()
+
+    def queued(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self) -> dict:
+        with self._cond:
+            out = {"in_flight": self._in_flight(), "queued": len(self._queue)}
+            for name, s in self._stats.items():
+                out[name] = {
+                    **s,
+                    "wait_ms_total": round(s["wait_ms_total"], 2),
+                    "wait_ms_max": round(s["wait_ms_max"], 2),
+                    "wait_ms_mean": round(s["wait_ms_total"] / s["acquired"], 2) if s["acquired"] else 0.0,
+                }
+            return out
+
+
+_limiter = PriorityLimiter(LLM_MAX_CONCURRENCY, LLM_BACKGROUND_MAX_CONCURRENCY, LLM_BACKGROUND_MAX_QUEUE)
+
+
+def slot(priority: int = None, timeout: float = None):
+    if priority is None:
+        priority = _default_priority.get()
+    if priority >= BACKGROUND and timeout is None:
+        timeout = LLM_BACKGROUND_MAX_WAIT_SECONDS
+    return _limiter.slot(priority, timeout)
+
+
+@contextmanager
+def priority(p: int):
+    """Run LLM calls made inside the block (without an explicit priority) at p."""
+    token = _default_priority.set(p)
+    try:
+        yield
+    finally:
+        _default_priority.reset(token)
+
+
+def background_queue_full() -> bool:
+    """Whether a background call made now would be rejected."""
+    return _limiter.queued() >= _limiter.background_max_queue
+
+
+def stats() -> dict:
+    return _limiter.stats()
@@ -0,0 +1,175 @@
+"""Time-aware next-task selection for one day.
+
+Built once per message from today's tasks and the day plan (see
+for_context): an id -> task index, and the day's work blocks ordered by
+start time, so "what's on now", "what's next" and "what did I miss" are a
+bisect into the block list instead of a scan of every task per block.
+
+Task status is read at lookup time, not at build time, so handlers that
+mark a task done mid-message get answers that already skip it.
+
+Selection order for next():
+  1. the block in progress at `now`, if its task is still open
+  2. the first block starting after `now` whose task is still open
+  3. everything else that is open (missed blocks, unscheduled tasks), by
+     priority, then due date, then planned start
+"""
+import bisect
+
+ACTIVE_STATUSES = ("todo", "doing")
+PRIORITY_RANK = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
+
+
+def _task_id(task: dict) -> str:
+    return task.get("id") or task.get("sk")
+
+
+def _minutes(hhmm) -> int | None:
+    """"HH:MM" -> minutes after midnight (ints pass through); None if unparseable."""
+    if hhmm is None or isinstance(hhmm, int):
+        return hhmm
+    try:
+        h, m = map(int, str(hhmm).split(":")[:2])
+        return h * 60 + m
+    except ValueError:
+        return None
+
+
+def _is_active(task: dict) -> bool:
+    return task.get("status") in ACTIVE_STATUSES
+
+
+class NextTaskEngine:
+    def __init__(self, tasks: list[dict], dayplan: dict = None, today: str = None):
+        self.source, self.source_len, self.dayplan = tasks, len(tasks), dayplan
+        self.today = today
+        self._by_id = {}
+        for t in tasks:
+            tid = _task_id(t)
+            if tid and tid not in self._by_id:
+                self._by_id[tid] = t
+
+        # (start, end, task) for each planned work block; tasks the plan
+        # doesn't cover fall back to their own block_start/block_end
+        slots = []
+        planned = set()
+        for block in (dayplan or {}).get("blocks") or []:
+            task = self._by_id.get(block.get("task_id"))
+            start = _minutes(block.get("start"))
+            if block.get("type") != "work" or task is None or start is None:
+                continue
+            end = _minutes(block.get("end"))
+            slots.append((start, end if end is not None else start, task))
+            planned.add(id(task))
+        for t in tasks:
+            start = _minutes(t.get("block_start"))
+            if id(t) not in planned and start is not None:
+                end = _minutes(t.get("block_end"))
+                slots.append((start, end if end is not None else start, t))
+
+        # Stable sort keeps plan order for blocks starting at the same time
+        slots.sort(key=lambda s: s[0])
+        self._starts = [s[0] for s in slots]
+        self._ends = [s[1] for s in slots]
+        self._tasks = [s[2] for s in slots]
+        # Latest end among blocks 0..i: a backwards walk from now can stop
+        # as soon as no earlier block reaches past now
+        self._reach = []
+        for end in self._ends:
+            self._reach.append(max(end, self._reach[-1]) if self._reach else end)
+        # Blocks by end time, for overdue()
+        by_end = sorted(range(len(slots)), key=lambda i: (self._ends[i], self._starts[i]))
+        self._end_order = [self._ends[i] for i in by_end]
+        self._by_end = [self._tasks[i] for i in by_end]
+        self._first_slot = {}  # id(task) -> (start, end) of its earliest block
+        for start, end, task in slots:
+            self._first_slot.setdefault(id(task), (start, end))
+
+        # Fallback ranking over every task; open ones are picked at lookup time
+        self._ranked = sorted(tasks, key=self._rank)
+
+    def _rank(self, task: dict) -> tuple:
+        slot = self._first_slot.get(id(task))
+        return (
+            PRIORITY_RANK.get(task.get("priority", "normal"), 2),
+            task.get("due_date") or "9999-99-99",
+            slot[0] if slot else 24 * 60,
+        )
+
+    def get(self, task_id: str) -> dict | None:
+        return self._by_id.get(task_id)
+
+    def block(self, task: dict) -> dict | None:
+        """{"start": "HH:MM", "end": "HH:MM"} of the task's earliest block today."""
+        slot = self._first_slot.get(id(task)) if task else None
+        if slot is None:
+            return None
+        return {"start": f"{slot[0] // 60:02d}:{slot[0] % 60:02d}", "end": f"{slot[1] // 60:02d}:{slot[1] % 60:02d}"}
+
+    def current(self, now=None, exclude=()) -> dict | None:
+        """The open task whose block contains now (latest-starting one wins)."""
+        now = _minutes(now)
+        if now is None:
+            return None
+        i = bisect.bisect_right(self._starts, now) - 1
+        while i >= 0 and self._reach[i] > now:
+            task = self._tasks[i]
+            if self._ends[i] > now and _is_active(task) and _task_id(task) not in exclude:
+                return task
+            i -= 1
+        return None
+
+    def upcoming(self, now=None, exclude=()) -> dict | None:
+        """The first open task with a block starting after now."""
+        now = _minutes(now)
+        i = 0 if now is None else bisect.bisect_right(self._starts, now)
+        for task in self._tasks[i:]:
+            if _is_active(task) and _task_id(task) not in exclude:
+                return task
+        return None
+
+    def overdue(self, now=None) -> list[dict]:
+        """Open tasks whose block has ended by now, or whose due date has passed."""
+        now = _minutes(now)
+        out, seen = [], set()
+        if now is not None:
+            for task in self._by_end[:bisect.bisect_right(self._end_order, now)]:
+                if _is_active(task) and id(task) not in seen:
+                    seen.add(id(task))
+                    out.append(task)
+        if self.today:
+            for task in self._ranked:
+                due = task.get("due_date")
+                if due and due < self.today and _is_active(task) and id(task) not in seen:
+                    seen.add(id(task))
+                    out.append(task)
+        return out
+
+    def next(self, now=None, exclude=()) -> dict | None:
+        """What to work on now; see the module docstring for the order.
+
+        now is "HH:MM" or minutes after midnight; None means the start of
+        the day (plan order, ignoring the clock). exclude is task ids to skip.
+        """
+        task = self.current(now, exclude) or self.upcoming(now, exclude)
+        if task:
+            return task
+        for task in self._ranked:
+            if _is_active(task) and _task_id(task) not in exclude:
+                return task
+        return None
+
+
+def for_context(context: dict) -> NextTaskEngine:
+    """The engine over this message's today tasks and day plan, built on first use.
+
+    Cached in the context; rebuilt if the task list or day plan is replaced
+    or the task list changes size.
+    """
+    tasks = context.get("today_tasks", [])
+    dayplan = context.get("dayplan")
+    engine = context.get("next_task_engine")
+    if engine is None or engine.source is not tasks or engine.source_len != len(tasks) or engine.dayplan is not dayplan:
+        engine = NextTaskEngine(tasks, dayplan, context.get("today"))
+        context["next_task_engine"] = engine
+    return engine
@@ -0,0 +1,136 @@
+"""BM25 index over agent notes, for picking the notes relevant to a message.
+
+The index lives for the lifetime of the process. Writes in this process
+update it directly (upsert/remove); sync() reconciles it against the active
+notes loaded for each message, so notes written by another container are
+picked up too, and only changed notes are re-tokenised.
+"""
+import math
+import re
+import threading
+from collections import Counter
+
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i if in into is it its me my no not of on or so "
+    "that the their then there these this to was we were will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for t in _TOKEN_RE.findall((text or "").lower()):
+        if t in _STOPWORDS:
+            continue
+        if len(t) > 3 and t.endswith("s") and not t.endswith("ss"):
+            t = t[:-1]
+        tokens.append(t)
+    return tokens
+
+
+def _note_id(note: dict) -> str:
+    return note.get("id") or note.get("sk")
+
+
+class NoteIndex:
+    def __init__(self):
+        self._docs = {}  # note id -> (text, Counter of terms, length)
+        self._df = Counter()
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def upsert(self, note: dict) -> None:
+        note_id, text = _note_id(note), note.get("note", "")
+        with self._lock:
+            current = self._docs.get(note_id)
+            if current is not None and current[0] == text:
+                return
+            self._remove(note_id)
+            terms = Counter(tokenize(text))
+            length = sum(terms.values())
+            self._docs[note_id] = (text, terms, length)
+            self._df.update(terms.keys())
+            self._total_len += length
+
+    def remove(self, note_id: str) -> None:
+        with self._lock:
+            self._remove(note_id)
+
+    def _remove(self, note_id: str) -> None:
+        doc = self._docs.pop(note_id, None)
+        if doc is None:
+            return
+        _, terms, length = doc
+        self._df.subtract(terms.keys())
+        self._total_len -= length
+
+    def sync(self, notes: list[dict]) -> None:
+        """Make the index hold exactly these notes."""
+        live = {_note_id(n) for n in notes}
+        for note_id in [i for i in self._docs if i not in live]:
+            self.remove(note_id)
+        for n in notes:
+            self.upsert(n)
+
+    def scores(self, query: str) -> dict[str, float]:
+        """BM25 score of every note that shares a term with the query."""
+        q_terms = set(tokenize(query))
+        if not q_terms or not self._docs:
+            return {}
+        with self._lock:
+            n_docs = len(self._docs)
+            avgdl = self._total_len / n_docs or 1.0
+            idf = {t: math.log(1 + (n_docs - self._df[t] + 0.5) / (self._df[t] + 0.5)) for t in q_terms if self._df[t]}
+            out = {}
+            for note_id, (_, terms, length) in self._docs.items():
+                score = 0.0
+                for t, w in idf.items():
+                    tf = terms.get(t)
+                    if tf:
+                        score += w * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avgdl))
+                if score:
+                    out[note_id] = score
+            return out
+
+
+_index = NoteIndex()
+
+
+def upsert(note: dict) -> None:
+    _index.upsert(note)
+
+
+def remove(note_id: str) -> None:
+    _index.remove(note_id)
+
+
+def top_notes(message: str, notes: list[dict], k: int, project_ids: set = (), task_ids: set = (),
+              project_boost: float = 2.0, task_boost: float = 2.0) -> list[dict]:
+    """The k notes most relevant to the message, in their original order.
+
+    BM25 on the note text, plus a boost for notes tagged with a project or
+    task the message refers to. With nothing relevant, the newest notes fill
+    the remaining slots.
+    """
+    if len(notes) <= k:
+        return notes
+    _index.sync(notes)
+    scores = _index.scores(message)
+
+    ranked = []
+    for i, n in enumerate(notes):
+        score = scores.get(_note_id(n), 0.0)
+        if n.get("tagged_project_id") in project_ids:
+            score += project_boost
+        if n.get("tagged_task_id") in task_ids:
+            score += task_boost
+        ranked.append((score, n.get("created_at", ""), i))
+    ranked.sort(reverse=True)
+    keep = {i for _, _, i in ranked[:k]}
+    return [n for i, n in enumerate(notes) if i in keep]
@@ -0,0 +1,135 @@
+"""Compiled project keyword matcher (Aho-Corasick).
+
+All project names and match_keywords go into one automaton, so a message
+is scanned once, in time linear in its length, no matter how many projects
+and keywords there are. Matches must sit on word boundaries ("ai" doesn't
+match inside "said"). The automaton is rebuilt only when the projects'
+names or keywords change (see for_projects).
+"""
+import bisect
+import threading
+from collections import deque
+
+_SEP = "\x00"
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum()
+
+
+class ProjectMatcher:
+    def __init__(self, projects: list[dict]):
+        self.projects = projects
+        # pattern -> [(project index, original keyword)]
+        patterns = {}
+        for i, p in enumerate(projects):
+            for kw in [p.get("name", "")] + list(p.get("match_keywords", [])):
+                kw_lower = (kw or "").lower().strip()
+                if kw_lower:
+                    patterns.setdefault(kw_lower, []).append((i, kw))
+        self._patterns = list(patterns)
+
+        # Trie as parallel lists; node 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]  # node -> [(pattern length, [(project index, keyword)])]
+        for pattern, owners in patterns.items():
+            node = 0
+            for c in pattern:
+                nxt = self._goto[node].get(c)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][c] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((len(pattern), owners))
+
+        # Failure links, breadth first; outputs inherit along them
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for c, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and c not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(c, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+        # All patterns in one string, for "hint inside a keyword" lookups
+        self._joined = _SEP.join(self._patterns)
+        self._starts = []
+        pos = 0
+        for pattern in self._patterns:
+            self._starts.append(pos)
+            pos += len(pattern) + 1
+        self._owners = [patterns[p] for p in self._patterns]
+
+    def scan(self, text: str) -> list[dict]:
+        """Every whole-word keyword/name occurrence in text, in order.
+
+        Returns [{"project": p, "keyword": kw, "start": s, "end": e}]; spans
+        index into text.
+        """
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            lowered = "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+        hits = []
+        node = 0
+        for pos, c in enumerate(lowered):
+            while node and c not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(c, 0)
+            for length, owners in self._out[node]:
+                start, end = pos - length + 1, pos + 1
+                if start > 0 and _is_word_char(lowered[start - 1]) and _is_word_char(lowered[start]):
+                    continue
+                if end < len(lowered) and _is_word_char(lowered[end]) and _is_word_char(lowered[end - 1]):
+                    continue
+                for i, kw in owners:
+                    hits.append({"project": self.projects[i], "keyword": kw, "start": start, "end": end})
+        hits.sort(key=lambda h: (h["start"], -h["end"]))
+        return hits
+
+    def match(self, text: str) -> list[dict]:
+        """Projects mentioned in text, in order of first mention."""
+        seen, out = set(), []
+        for hit in self.scan(text):
+            key = id(hit["project"])
+            if key not in seen:
+                seen.add(key)
+                out.append(hit["project"])
+        return out
+
+    def containing(self, hint: str) -> list[dict]:
+        """Projects whose name or a keyword contains hint (substring)."""
+        hint = hint.lower().strip()
+        if not hint or _SEP in hint:
+            return []
+        found = set()
+        pos = self._joined.find(hint)
+        while pos != -1:
+            k = bisect.bisect_right(self._starts, pos) - 1
+            found.update(i for i, _ in self._owners[k])
+            pos = self._joined.find(hint, pos + 1)
+        return [self.projects[i] for i in sorted(found)]
+
+
+_cache = {"key": None, "matcher": None}
+_lock = threading.Lock()
+
+
+def for_projects(projects: list[dict]) -> ProjectMatcher:
+    """The matcher for these projects, rebuilt only when they change.
+
+    Results are the project dicts the matcher was built from; a reload of
+    unchanged projects keeps the existing matcher.
+    """
+    key = tuple((p.get("id") or p.get("sk"), p.get("name"), p.get("area"), tuple(p.get("match_keywords", [])))
+                for p in projects)
+    with _lock:
+        if _cache["key"] != key:
+            _cache["key"], _cache["matcher"] = key, ProjectMatcher(projects)
+        return _cache["matcher"]
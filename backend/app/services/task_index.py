@@ -0,0 +1,167 @@
+"""Task-name index for fuzzy matching a user's description to a task.
+
+Built once per task list and shared by every handler of a message (see
+for_context). A lookup only scores tasks that share a word, a similar word
+or the query's character trigrams with it, so matching stays cheap with
+thousands of open tasks.
+
+Scoring follows the original find_matching_task rules:
+  - substring: the query appears in the name -> len(query) / len(name) + 0.1
+  - word overlap: shared words / max(query words, name words)
+plus typo tolerance: a query word missing from the name counts as
+SIMILAR_WORD_WEIGHT x its bigram (Dice) similarity to the closest name word,
+when that similarity is at least MIN_WORD_SIMILARITY ("grdaing" ~ "grading"
+scores 0.625); a swapped pair of letters breaks fewer bigrams than trigrams.
+Only query words of MIN_FUZZY_WORD_LEN+ letters are typo-matched.
+"""
+import re
+from collections import Counter, defaultdict
+
+MIN_WORD_SIMILARITY = 0.5
+MIN_FUZZY_WORD_LEN = 4
+SIMILAR_WORD_WEIGHT = 0.9
+# Candidates scoring within this of the best one make a match ambiguous
+AMBIGUITY_MARGIN = 0.05
+OPEN_STATUSES = ("todo", "doing")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _words(text: str) -> set[str]:
+    return set(_WORD_RE.findall(text))
+
+
+def _word_grams(word: str) -> set[str]:
+    padded = f"^{word}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def _text_grams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TaskIndex:
+    def __init__(self, tasks: list[dict]):
+        self.source, self.source_len = tasks, len(tasks)
+        self.tasks = [t for t in tasks if t.get("name")]
+        self._names = [t["name"].lower() for t in self.tasks]
+        self._words = [_words(n) for n in self._names]
+        self._by_word = defaultdict(set)  # word -> task positions
+        self._by_gram = defaultdict(set)  # name trigram -> task positions
+        self._vocab_by_gram = defaultdict(set)  # word bigram -> words
+        self._gram_count = {}  # word -> number of its bigrams
+        for i, (name, words) in enumerate(zip(self._names, self._words)):
+            for w in words:
+                self._by_word[w].add(i)
+            for g in _text_grams(name):
+                self._by_gram[g].add(i)
+        for w in self._by_word:
+            grams = _word_grams(w)
+            self._gram_count[w] = len(grams)
+            for g in grams:
+                self._vocab_by_gram[g].add(w)
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def _similar_words(self, word: str) -> dict[str, float]:
+        """Indexed words whose bigram (Dice) similarity to word is high enough."""
+        if len(word) < MIN_FUZZY_WORD_LEN:
+            return {}
+        grams = _word_grams(word)
+        shared = Counter()
+        for g in grams:
+            shared.update(self._vocab_by_gram.get(g, ()))
+        out = {}
+        for other, n in shared.items():
+            if other == word:
+                continue
+            sim = 2 * n / (len(grams) + self._gram_count[other])
+            if sim >= MIN_WORD_SIMILARITY:
+                out[other] = sim
+        return out
+
+    def _substring_candidates(self, query: str) -> set[int]:
+        if len(query) < 3:
+            return {i for i, name in enumerate(self._names) if query in name}
+        postings = sorted((self._by_gram.get(g, set()) for g in _text_grams(query)), key=len)
+        found = set(postings[0])
+        for p in postings[1:]:
+            found &= p
+            if not found:
+                break
+        return {i for i in found if query in self._names[i]}
+
+    def search(self, query: str, limit: int = None) -> list[tuple[float, dict]]:
+        """Scored candidates for the query, best first (ties keep list order)."""
+        q = (query or "").lower().strip()
+        if not q or not self.tasks:
+            return []
+        q_words = _words(q)
+        similar = {w: self._similar_words(w) for w in q_words}
+
+        # Word overlap, accumulated from the postings: exact words count 1,
+        # a similar word counts its weighted similarity (best one per query word)
+        overlap = defaultdict(float)
+        for w in q_words:
+            exact = self._by_word.get(w, set())
+            for i in exact:
+                overlap[i] += 1
+            fuzzy = {}
+            for other, sim in similar[w].items():
+                for i in self._by_word[other]:
+                    if i not in exact and sim > fuzzy.get(i, 0.0):
+                        fuzzy[i] = sim
+            for i, sim in fuzzy.items():
+                overlap[i] += SIMILAR_WORD_WEIGHT * sim
+
+        substring = self._substring_candidates(q)
+        scored = []
+        for i in substring | overlap.keys():
+            score = len(q) / len(self._names[i]) + 0.1 if i in substring else 0.0
+            if i in overlap:
+                score = max(score, overlap[i] / max(len(q_words), len(self._words[i])))
+            scored.append((score, i))
+
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        if limit:
+            scored = scored[:limit]
+        return [(score, self.tasks[i]) for score, i in scored]
+
+    def best(self, query: str, prefer=None) -> dict:
+        """The best match, with the close runners-up.
+
+        prefer(task) -> bool ranks preferred tasks (e.g. today's) above all
+        others, as if they had been searched first. Among candidates within
+        AMBIGUITY_MARGIN of the best, open (todo/doing) tasks win over
+        closed ones, so a done "Office hours" doesn't compete with this
+        week's open one. Returns {"task": task or None, "score": float,
+        "candidates": [(score, task)], "ambiguous": bool}; ambiguous means
+        more than one such candidate is left.
+        """
+        results = self.search(query)
+        if prefer is not None:
+            preferred = [r for r in results if prefer(r[1])]
+            if preferred:
+                results = preferred
+        if not results:
+            return {"task": None, "score": 0.0, "candidates": [], "ambiguous": False}
+        top = results[0][0]
+        close = [r for r in results if r[0] >= top - AMBIGUITY_MARGIN]
+        open_close = [r for r in close if r[1].get("status") in OPEN_STATUSES]
+        if open_close:
+            close = open_close
+        return {"task": close[0][1], "score": close[0][0], "candidates": close, "ambiguous": len(close) > 1}
+
+
+def for_context(context: dict) -> TaskIndex:
+    """The index over this message's week tasks, built on first use.
+
+    Cached in the context; rebuilt if the week task list has changed size.
+    """
+    tasks = context.get("week_tasks", [])
+    index = context.get("task_index")
+    if index is None or index.source is not tasks or index.source_len != len(tasks):
+        index = TaskIndex(tasks)
+        context["task_index"] = index
+    return index
@@ -2,6 +2,10 @@ import uuid
 from datetime import datetime
 from .. import db
 from ..config import HOUR_DEFAULTS
+from . import project_matcher
+from .next_task import NextTaskEngine
+from .task_index import TaskIndex
+from .week_snapshot import WeekSnapshot
 
 
 def _round_to_5min(minutes: int) -> int:
@@ -10,82 +14,40 @@ def _round_to_5min(minutes: int) -> int:
 
 
 def find_matching_task(match_string: str, tasks: list[dict]) -> dict | None:
-    """Fuzzy match a user description to a task name."""
+    """Fuzzy match a user description to a task name.
+
+    One-off lookup; handlers share a prebuilt index instead (task_index.for_context).
+    """
     if not match_string or not tasks:
         return None
+    return TaskIndex(tasks).best(match_string)["task"]
 
-    match_lower = match_string.lower().strip()
-    best_match = None
-    best_score = 0
-
-    for task in tasks:
-        name_lower = (task.get("name") or "").lower()
-        if not name_lower:
-            continue
-
-        # Exact substring
-        if match_lower in name_lower:
-            score = len(match_lower) / len(name_lower) + 0.1
-            if score > best_score:
-                best_score = score
-                best_match = task
-
-        # Word overlap
-        match_words = set(match_lower.split())
-        name_words = set(name_lower.split())
-        overlap = match_words & name_words
-        if overlap:
-            score = len(overlap) / max(len(match_words), len(name_words))
-            if score > best_score:
-                best_score = score
-                best_match = task
-
-    return best_match
-
-
-def get_next_task(tasks: list[dict], dayplan: dict = None) -> dict | None:
-    """Get the next undone task based on day plan order or priority."""
-    active = [t for t in tasks if t.get("status") in ("todo", "doing")]
-    if not active:
-        return None
 
-    # If dayplan has blocks, find the first undone block
-    if dayplan and dayplan.get("blocks"):
-        for block in dayplan["blocks"]:
-            if block.get("task_id") and block["type"] == "work":
-                task = next((t for t in active if (t.get("id") or t.get("sk")) == block["task_id"]), None)
-                if task:
-                    return task
+def get_next_task(tasks: list[dict], dayplan: dict = None, now: str = None) -> dict | None:
+    """Get the next undone task: the block in progress at `now` ("HH:MM"), the
+    next block after it, then priority order.
 
-    # Fall back to priority order
-    prio = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
-    active.sort(key=lambda t: prio.get(t.get("priority", "normal"), 2))
-    return active[0]
+    One-off lookup; handlers share a prebuilt engine instead (next_task.for_context).
+    """
+    return NextTaskEngine(tasks, dayplan).next(now)
 
 
 def calculate_day_load(tasks: list[dict], day: str) -> float:
     """Calculate total hours for a specific day."""
-    return sum(
-        t.get("estimated_hours", 0)
-        for t in tasks
-        if t.get("day") == day and t.get("status") not in ("dropped",)
-    )
+    return WeekSnapshot(tasks).day_load(day)
 
 
 def get_free_slots(tasks: list[dict], daily_capacity: float = 8) -> dict:
     """Return free hours per day."""
-    days = ["monday", "tuesday", "wednesday", "thursday", "friday"]
-    result = {}
-    for day in days:
-        used = calculate_day_load(tasks, day)
-        free = max(0, daily_capacity - used)
-        if free > 0:
-            result[day] = free
-    return result
+    return WeekSnapshot(tasks).free_slots(daily_capacity)
 
 
 def create_task_from_intent(task_data: dict, context: dict) -> dict:
-    """Create a task from parsed WhatsApp intent data."""
+    """Create a task from parsed WhatsApp intent data.
+
+    The task is added to the context's week (and today) task lists, so later
+    actions of the same message can find it.
+    """
     week_id = context.get("week_id", "")
     task_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
@@ -150,21 +112,19 @@ def create_task_from_intent(task_data: dict, context: dict) -> dict:
     }
     item = {k: v for k, v in item.items() if v is not None}
     db.put_item(item)
+    context.setdefault("week_tasks", []).append(item)
+    if day and day == context.get("day_of_week", "").lower():
+        context.setdefault("today_tasks", []).append(item)
     return item
 
 
 def match_project_by_keywords(hint: str, projects: list[dict]) -> list[dict]:
-    """Match a text hint against project keywords."""
-    hint_lower = hint.lower()
-    matches = []
-    for p in projects:
-        keywords = p.get("match_keywords", [])
-        name_lower = p.get("name", "").lower()
-        if hint_lower in name_lower:
-            matches.append(p)
-            continue
-        for kw in keywords:
-            if kw.lower() in hint_lower or hint_lower in kw.lower():
-                matches.append(p)
-                break
-    return matches
+    """Match a text hint against project keywords.
+
+    Projects whose name or a keyword appears in the hint (as whole words),
+    then projects whose name or a keyword contains the hint.
+    """
+    matcher = project_matcher.for_projects(projects)
+    matches = matcher.match(hint)
+    seen = {id(p) for p in matches}
+    return matches + [p for p in matcher.containing(hint) if id(p) not in seen]
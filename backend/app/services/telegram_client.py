@@ -4,8 +4,10 @@ import urllib.parse
 import json
 
 from ..config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+from ..tracing import traced
 
 
+@traced("send_telegram")
 def send_telegram(text: str, chat_id: str = None, parse_mode: str = "Markdown") -> dict | None:
     """Send a Telegram message. Returns API response or None in dev mode."""
     if not TELEGRAM_BOT_TOKEN:
@@ -1,4 +1,5 @@
 from ..config import TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_WHATSAPP_FROM, WHATSAPP_TO
+from ..tracing import traced
 
 _client = None
 
@@ -11,6 +12,7 @@ def get_client():
     return _client
 
 
+@traced("send_whatsapp")
 def send_whatsapp(body: str, to: str = None) -> str | None:
     """Send a WhatsApp message via Twilio. Returns message SID or None in dev mode."""
     if not TWILIO_ACCOUNT_SID:
@@ -0,0 +1,175 @@
+"""Columnar snapshot of a week's tasks, with its aggregates.
+
+The week's tasks are packed once into parallel columns (day, status,
+priority, hours, project, area) and every aggregate the app reports is
+counted in that same pass: totals, per-day and per-area task/done/hours,
+status counts. Consumers (the prompt's week section, query_week, week
+stats, briefing, evening summary, free-slot and day-load lookups) read the
+aggregates instead of each re-walking the task dicts.
+
+Dropped tasks are kept in the columns but left out of every aggregate.
+Hours keep the tasks' own number types, so sums print the way they did.
+"""
+from array import array
+
+from ..constants import AREAS, DAYS
+
+WORKDAYS = DAYS[:5]
+UNSCHEDULED = "unscheduled"
+UNKNOWN_AREA = "unknown"
+OPEN_STATUSES = ("todo", "doing")
+
+
+class _Codes:
+    """Small-int codes for a column's distinct values."""
+
+    def __init__(self, seed=()):
+        self.names = []
+        self.index = {}
+        for name in seed:
+            self.code(name)
+
+    def code(self, name) -> int:
+        c = self.index.get(name)
+        if c is None:
+            c = self.index[name] = len(self.names)
+            self.names.append(name)
+        return c
+
+
+class WeekSnapshot:
+    def __init__(self, tasks: list[dict], project_map: dict = None):
+        """project_map: project id -> project, for the area column."""
+        self.tasks = tasks
+        self._days = _Codes(DAYS + [UNSCHEDULED])
+        self._statuses = _Codes(("todo", "doing", "done", "skipped", "dropped"))
+        self._priorities = _Codes(("urgent", "high", "normal", "low"))
+        self._areas = _Codes(AREAS + [UNKNOWN_AREA])
+        self.day = array("B")
+        self.status = array("B")
+        self.priority = array("B")
+        self.area = array("B")
+        self.hours = []
+        self.project = []
+
+        self.total = 0
+        self.done = 0
+        self.status_counts = {}
+        self.days = {}  # day -> {"tasks", "hours", "done", "done_hours"}, first-seen order
+        self.areas = {}  # area -> {"total", "done", "hours", "done_hours"}, first-seen order
+        self._rows_by_day = {}  # day code -> row positions (not dropped)
+
+        project_map = project_map or {}
+        dropped = self._statuses.code("dropped")
+        done = self._statuses.code("done")
+        for i, t in enumerate(tasks):
+            day = t.get("day") or UNSCHEDULED
+            status = t.get("status", "todo")
+            hours = t.get("estimated_hours", 0)
+            project_id = t.get("project_id")
+            area = project_map.get(project_id, {}).get("area") or UNKNOWN_AREA
+
+            day_c = self._days.code(day)
+            status_c = self._statuses.code(status)
+            self.day.append(day_c)
+            self.status.append(status_c)
+            self.priority.append(self._priorities.code(t.get("priority", "normal")))
+            self.area.append(self._areas.code(area))
+            self.hours.append(hours)
+            self.project.append(project_id)
+            if status_c == dropped:
+                continue
+
+            is_done = status_c == done
+            self.total += 1
+            self.done += is_done
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            self._rows_by_day.setdefault(day_c, []).append(i)
+
+            d = self.days.get(day)
+            if d is None:
+                d = self.days[day] = {"tasks": 0, "hours": 0, "done": 0, "done_hours": 0}
+            d["tasks"] += 1
+            d["hours"] += hours
+            a = self.areas.get(area)
+            if a is None:
+                a = self.areas[area] = {"total": 0, "done": 0, "hours": 0, "done_hours": 0}
+            a["total"] += 1
+            a["hours"] += hours
+            if is_done:
+                d["done"] += 1
+                d["done_hours"] += hours
+                a["done"] += 1
+                a["done_hours"] += hours
+
+    @property
+    def pct_done(self) -> int:
+        return round(self.done / self.total * 100) if self.total else 0
+
+    def day_stats(self, day: str) -> dict:
+        return self.days.get(day) or {"tasks": 0, "hours": 0, "done": 0, "done_hours": 0}
+
+    def day_load(self, day: str) -> float:
+        """Planned hours on a day (everything but dropped)."""
+        return self.day_stats(day)["hours"]
+
+    def free_slots(self, daily_capacity: float = 8, days=WORKDAYS) -> dict:
+        """Free hours per day, for days that have any."""
+        result = {}
+        for day in days:
+            free = max(0, daily_capacity - self.day_load(day))
+            if free > 0:
+                result[day] = free
+        return result
+
+    def neglected(self, areas=AREAS) -> list[str]:
+        """Areas with no tasks this week."""
+        return [a for a in areas if not self.areas.get(a, {}).get("total")]
+
+    def rows(self, day: str = None, status=None, priority=None) -> list[dict]:
+        """Tasks (not dropped) matching the filters, in list order.
+
+        status and priority take one value or a tuple of values.
+        """
+        if day is None:
+            positions = sorted(i for rows in self._rows_by_day.values() for i in rows)
+        else:
+            c = self._days.index.get(day)
+            positions = self._rows_by_day.get(c, []) if c is not None else []
+        status_c = self._codes_for(self._statuses, status)
+        priority_c = self._codes_for(self._priorities, priority)
+        return [
+            self.tasks[i] for i in positions
+            if (status_c is None or self.status[i] in status_c)
+            and (priority_c is None or self.priority[i] in priority_c)
+        ]
+
+    @staticmethod
+    def _codes_for(codes: _Codes, values):
+        if values is None:
+            return None
+        if isinstance(values, str):
+            values = (values,)
+        return {codes.index[v] for v in values if v in codes.index}
+
+
+def _fingerprint(tasks: list[dict]) -> tuple:
+    return tuple((t.get("day"), t.get("status"), t.get("priority"), t.get("estimated_hours", 0), t.get("project_id"))
+                 for t in tasks)
+
+
+def for_context(context: dict) -> WeekSnapshot:
+    """The snapshot of this message's week tasks, shared by its consumers.
+
+    Cached in the context; rebuilt when a handler has changed a task's day,
+    status, priority, hours or project (or added/removed a task).
+    """
+    tasks = context.get("week_tasks", [])
+    key = _fingerprint(tasks)
+    snapshot = context.get("week_snapshot")
+    if snapshot is None or snapshot.tasks is not tasks or snapshot.key != key:
+        projects = context.get("projects", [])
+        snapshot = WeekSnapshot(tasks, {(p.get("id") or p.get("sk")): p for p in projects})
+        snapshot.key = key
+        context["week_snapshot"] = snapshot
+    return snapshot
@@ -0,0 +1,123 @@
+"""Lightweight in-process tracing for the message pipeline.
+
+Spans nest through a context variable. A trace starts at a root span (the
+webhook handler); every span opened inside it — DB calls, LLM calls, sends —
+is attached as a child. When the root finishes, the whole tree is emitted as
+one JSON line to the configured exporters (console and/or a local file).
+
+Spans opened outside a root (e.g. DB calls from dashboard routes) are no-ops.
+"""
+import functools
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from .config import TRACE_EXPORT, TRACE_FILE
+
+_current: ContextVar = ContextVar("current_span", default=None)
+_exporters = {e.strip() for e in TRACE_EXPORT.split(",") if e.strip() and e.strip() != "off"}
+
+
+class Span:
+    __slots__ = ("name", "attrs", "children", "trace_id", "started_at", "_t0", "_t1")
+
+    def __init__(self, name: str, trace_id: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.children = []
+        self.trace_id = trace_id
+        self.started_at = datetime.utcnow().isoformat()
+        self._t0 = time.perf_counter()
+        self._t1 = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self._t1 if self._t1 is not None else time.perf_counter()
+        return round((end - self._t0) * 1000, 2)
+
+    def to_dict(self, root_t0: float) -> dict:
+        out = {
+            "name": self.name,
+            "offset_ms": round((self._t0 - root_t0) * 1000, 2),
+            "duration_ms": self.duration_ms,
+        }
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.children:
+            out["spans"] = [c.to_dict(root_t0) for c in self.children]
+        return out
+
+
+class _NoopSpan:
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, root: bool = False, **attrs):
+    """Open a span. Pass root=True at the entry point of a request to start a trace."""
+    parent = _current.get()
+    if not _exporters or (parent is None and not root):
+        yield _NOOP
+        return
+
+    trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+    s = Span(name, trace_id, attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except Exception as e:
+        s.attrs["error"] = repr(e)[:200]
+        raise
+    finally:
+        s._t1 = time.perf_counter()
+        _current.reset(token)
+        if parent is not None:
+            parent.children.append(s)
+        else:
+            _export(s)
+
+
+def traced(name: str):
+    """Decorator form of span() for functions that are a pipeline stage."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_attrs(**attrs) -> None:
+    """Attach attributes to the current span, if any."""
+    s = _current.get()
+    if s is not None:
+        s.set(**attrs)
+
+
+def _export(root: Span) -> None:
+    record = {
+        "type": "trace",
+        "trace_id": root.trace_id,
+        "started_at": root.started_at,
+        **root.to_dict(root._t0),
+    }
+    line = json.dumps(record, default=str, ensure_ascii=False)
+    if "console" in _exporters:
+        print(f"[TRACE] {line}")
+    if "file" in _exporters and TRACE_FILE:
+        try:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"[TRACE ERROR] {e}")
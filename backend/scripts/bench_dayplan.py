@@ -0,0 +1,120 @@
+"""Day-plan scheduler benchmark.
+
+Generates random days of N open tasks (a share of them pinned to a
+block_start, mixed priorities, due dates and estimates), plans each one
+with app.services.day_scheduler.schedule_day, checks the plan (no
+overlapping blocks other than reported fixed-block conflicts, no break
+without work right after it, everything inside the day, capacity
+respected, every task either placed or reported) and reports latency per
+task count.
+
+Usage:
+    python scripts/bench_dayplan.py
+    python scripts/bench_dayplan.py --tasks 100,250,500 --runs 200 --max-p95-ms 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.day_scheduler import fmt_time, schedule_day, to_minutes
+
+PRIORITIES = ["urgent", "high", "normal", "normal", "low"]
+HOURS = [0.25, 0.5, 0.5, 1, 1, 1.5, 2, 3]
+
+
+def make_tasks(n: int, rng: random.Random, fixed_share: float) -> list[dict]:
+    tasks = []
+    for i in range(n):
+        t = {
+            "sk": f"task-{i}", "id": f"task-{i}", "name": f"Task {i}",
+            "status": rng.choice(["todo", "todo", "todo", "doing", "done"]),
+            "priority": rng.choice(PRIORITIES),
+            "estimated_hours": rng.choice(HOURS),
+        }
+        if rng.random() < 0.3:
+            t["due_date"] = f"2026-10-{rng.randint(1, 28):02d}"
+        if rng.random() < fixed_share:
+            start = rng.randrange(8 * 60, 17 * 60, 15)
+            t["block_start"] = fmt_time(start)
+            t["block_end"] = fmt_time(start + int(t["estimated_hours"] * 60))
+        tasks.append(t)
+    return tasks
+
+
+def check(tasks: list[dict], result: dict, capacity: float) -> list[str]:
+    """Problems with a plan; empty when it's valid."""
+    problems = []
+    fixed_ids = {t["sk"] for t in tasks if t.get("block_start")}
+    conflicted = {c["task_id"] for c in result["conflicts"]}
+    spans = sorted(((to_minutes(b["start"]), to_minutes(b["end"]), b) for b in result["blocks"]), key=lambda s: s[:2])
+    for (_, e1, b1), (s2, _, b2) in zip(spans, spans[1:]):
+        if s2 < e1 and not {b1["task_id"], b2["task_id"]} & conflicted:
+            problems.append(f"overlap {b1['start']}-{b1['end']} / {b2['start']}-{b2['end']}")
+    for i, (_, e, b) in enumerate(spans):
+        if b["label"] == "Break" and not any(s2 == e and b2["task_id"] for s2, _, b2 in spans[i + 1:i + 3]):
+            problems.append(f"break {b['start']}-{b['end']} has no work right after it")
+    fixed_minutes = 0
+    for s, e, b in spans:
+        if b["task_id"] in fixed_ids:
+            fixed_minutes += e - s
+        elif s < 8 * 60 or e > 18 * 60:
+            problems.append(f"outside the day: {b['start']}-{b['end']}")
+    # Fixed blocks can exceed capacity on their own; packed tasks never add past it
+    if result["planned_hours"] > max(capacity, fixed_minutes / 60) + 1e-9:
+        problems.append(f"over capacity: {result['planned_hours']}h > {capacity}h")
+    placed = {b["task_id"] for b in result["blocks"] if b["task_id"]}
+    reported = {u["task_id"] for u in result["unplaced"]}
+    for t in tasks:
+        if t["status"] not in ("dropped", "done") and (t["sk"] in placed) == (t["sk"] in reported):
+            problems.append(f"{t['sk']} is {'placed and reported unplaced' if t['sk'] in placed else 'missing'}")
+    return problems
+
+
+def _pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", default="10,50,100,200,500", help="comma-separated task counts")
+    parser.add_argument("--runs", type=int, default=100, help="random days per task count")
+    parser.add_argument("--capacity", type=float, default=8)
+    parser.add_argument("--fixed-share", type=float, default=0.1, help="share of tasks with a block_start")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-p95-ms", type=float, help="exit non-zero if any p95 is above this")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failed = False
+    print(f"\nDay-plan scheduler benchmark — {args.runs} random days per size, capacity {args.capacity}h\n")
+    print(f"  {'tasks':>5}  {'p50 ms':>7}  {'p95 ms':>7}  {'max ms':>7}  {'placed':>6}  {'unplaced':>8}  {'conflicts':>9}")
+    for n in [int(x) for x in args.tasks.split(",")]:
+        times, placed, unplaced, conflicts = [], 0, 0, 0
+        for _ in range(args.runs):
+            tasks = make_tasks(n, rng, args.fixed_share)
+            t0 = time.perf_counter()
+            result = schedule_day(tasks, args.capacity)
+            times.append((time.perf_counter() - t0) * 1000)
+            problems = check(tasks, result, args.capacity)
+            if problems:
+                failed = True
+                print(f"  INVALID PLAN ({n} tasks): {problems[:3]}")
+            placed += sum(1 for b in result["blocks"] if b["task_id"])
+            unplaced += len(result["unplaced"])
+            conflicts += len(result["conflicts"])
+        p95 = _pct(times, 95)
+        print(f"  {n:>5}  {_pct(times, 50):>7.2f}  {p95:>7.2f}  {max(times):>7.2f}  "
+              f"{placed / args.runs:>6.1f}  {unplaced / args.runs:>8.1f}  {conflicts / args.runs:>9.1f}")
+        if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,577 @@
+"""Offline intent-parsing benchmark.
+
+Runs the fixture corpus (scripts/fixtures/intent_corpus.json) through the
+real message pipeline — context build, parse_intent, execute, respond —
+against an in-memory table, and reports accuracy per intent, prompt tokens
+and latency. Nothing touches AWS, Twilio or (except --mode record) Anthropic.
+
+Modes:
+    rules     the rule-based parser (no LLM)
+    stub      a local stand-in for Claude with configurable latency; answers
+              with the rule parser, or with the expected intent
+              (--stub-answer expected) to time the pipeline around a perfect parse
+    cassette  replay Claude responses recorded with --mode record
+    record    call the live API once per fixture and save a cassette
+
+Usage:
+    python scripts/bench_intents.py --mode stub --latency 0.8 --jitter 0.2
+    python scripts/bench_intents.py --mode cassette --min-accuracy 0.9
+    ANTHROPIC_API_KEY=... python scripts/bench_intents.py --mode record
+
+Exits non-zero when the 200-task week's context is over
+PROMPT_CONTEXT_TOKEN_BUDGET, or accuracy is below --min-accuracy.
+"""
+import argparse
+import asyncio
+import contextlib
+import copy
+import hashlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from types import SimpleNamespace
+
+from boto3.dynamodb.types import TypeDeserializer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Keep the run quiet and deterministic: no trace output, no burst window
+os.environ.setdefault("TRACE_EXPORT", "off")
+os.environ["BURST_WINDOW_SECONDS"] = "0"
+
+from app import db
+from app.config import PROMPT_CONTEXT_TOKEN_BUDGET
+from app.agents import intent_parser
+from app.agents.prompt_budget import estimate_tokens
+from app.routes import whatsapp
+from seed_data import DEFAULT_PROJECTS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+DEFAULT_CORPUS = os.path.join(FIXTURES_DIR, "intent_corpus.json")
+DEFAULT_CASSETTE = os.path.join(FIXTURES_DIR, "intent_cassette.json")
+
+DAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+# ── In-memory table ──
+
+
+class _ConditionFailed(Exception):
+    pass
+
+
+_deserialize = TypeDeserializer().deserialize
+
+
+class MemoryTable:
+    """Just enough of the boto3 Table API for the pipeline's db calls."""
+
+    def __init__(self):
+        self.items = {}
+        self.meta = SimpleNamespace(client=SimpleNamespace(
+            exceptions=SimpleNamespace(ConditionalCheckFailedException=_ConditionFailed),
+            transact_write_items=self.transact_write_items,
+        ))
+
+    def put_item(self, Item, ConditionExpression=None, **kwargs):
+        key = (Item["pk"], Item["sk"])
+        if ConditionExpression and key in self.items:
+            raise _ConditionFailed(ConditionExpression)
+        self.items[key] = copy.deepcopy(Item)
+
+    def get_item(self, Key):
+        item = self.items.get((Key["pk"], Key["sk"]))
+        return {"Item": copy.deepcopy(item)} if item else {}
+
+    def delete_item(self, Key, ConditionExpression=None, **kwargs):
+        self.items.pop((Key["pk"], Key["sk"]), None)
+
+    def query(self, KeyConditionExpression, FilterExpression=None, Limit=None, **kwargs):
+        items = [i for i in self.items.values() if _matches(KeyConditionExpression, i)]
+        if FilterExpression is not None:
+            items = [i for i in items if _matches(FilterExpression, i)]
+        items.sort(key=lambda i: i["sk"])
+        return {"Items": copy.deepcopy(items[:Limit] if Limit else items)}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues, **kwargs):
+        item = self.items.setdefault((Key["pk"], Key["sk"]), dict(Key))
+        for part in UpdateExpression.removeprefix("SET ").split(", "):
+            name, value = part.split(" = ")
+            item[ExpressionAttributeNames[name]] = ExpressionAttributeValues[value]
+        return {"Attributes": copy.deepcopy(item)}
+
+    def transact_write_items(self, TransactItems):
+        # Low-level client call: attribute values arrive in DynamoDB JSON
+        plain = lambda attrs: {k: _deserialize(v) for k, v in attrs.items()}
+        for op in TransactItems:
+            if "Put" in op:
+                self.put_item(Item=plain(op["Put"]["Item"]))
+            elif "Delete" in op:
+                self.delete_item(Key=plain(op["Delete"]["Key"]))
+            else:
+                u = op["Update"]
+                self.update_item(Key=plain(u["Key"]), UpdateExpression=u["UpdateExpression"],
+                                 ExpressionAttributeNames=u["ExpressionAttributeNames"],
+                                 ExpressionAttributeValues=plain(u["ExpressionAttributeValues"]))
+
+    @contextlib.contextmanager
+    def batch_writer(self, **kwargs):
+        yield SimpleNamespace(
+            put_item=lambda Item: self.put_item(Item=Item),
+            delete_item=lambda Key: self.delete_item(Key=Key),
+        )
+
+
+def _matches(condition, item) -> bool:
+    expr = condition.get_expression()
+    op, values = expr["operator"], expr["values"]
+    if op == "AND":
+        return _matches(values[0], item) and _matches(values[1], item)
+    attr, value = item.get(values[0].name), values[1]
+    if op == "=":
+        return attr == value
+    if op == "begins_with":
+        return isinstance(attr, str) and attr.startswith(value)
+    raise NotImplementedError(f"condition operator {op}")
+
+
+# ── World seeding ──
+
+
+def _resolve_day(day: str) -> tuple[str, str, str]:
+    """'today' / 'tomorrow' / a weekday name (this week) -> (week_id, day, date)."""
+    today = whatsapp._local_now().date()
+    if day in ("today", "tomorrow"):
+        d = today + timedelta(days=1 if day == "tomorrow" else 0)
+    else:
+        d = today + timedelta(days=DAY_NAMES.index(day) - today.weekday())
+    iso = d.isocalendar()
+    return f"{iso[0]}-W{iso[1]:02d}", DAY_NAMES[d.weekday()], d.isoformat()
+
+
+def _project_id(name: str) -> str:
+    return "proj-" + name.lower().replace(" ", "-")
+
+
+def _task_item(spec: dict) -> dict:
+    week_id, day, date = _resolve_day(spec.get("day", "today"))
+    task_id = str(uuid.uuid4())
+    return {
+        "pk": "TASK",
+        "sk": task_id,
+        "id": task_id,
+        "name": spec["name"],
+        "project_id": _project_id(spec["project"]) if spec.get("project") else "",
+        "week_id": week_id,
+        "day": day,
+        "date": date,
+        "block_start": spec.get("block_start"),
+        "block_end": spec.get("block_end"),
+        "estimated_hours": spec.get("estimated_hours", 1),
+        "priority": spec.get("priority", "normal"),
+        "status": spec.get("status", "todo"),
+    }
+
+
+def seed_world(world: dict, state: dict = None) -> MemoryTable:
+    table = MemoryTable()
+    db._table = table
+    for proj in DEFAULT_PROJECTS:
+        pid = _project_id(proj["name"])
+        table.put_item(Item={"pk": "PROJECT", "sk": pid, "id": pid, **proj, "active": True})
+
+    tasks = {}
+    for spec in world.get("tasks", []):
+        item = _task_item(spec)
+        tasks[item["name"]] = item
+        table.put_item(Item=item)
+
+    for n, spec in enumerate(world.get("reminders", [])):
+        _, _, date = _resolve_day(spec.get("date", "today"))
+        table.put_item(Item={
+            "pk": "REMINDER", "sk": f"rem-{n}", "id": f"rem-{n}", "type": "one_time",
+            "message": spec["message"], "trigger_date": date,
+            "trigger_time": spec.get("time", "09:00"), "active": True,
+        })
+
+    state = state or {}
+    if state.get("pending"):
+        db.save_pending_task(state["pending"])
+    if state.get("checkin"):
+        task = tasks[state["checkin"]]
+        table.put_item(Item={
+            "pk": f"CHECKIN#{task['date']}", "sk": "00-checkin", "id": "00-checkin",
+            "date": task["date"], "task_id": task["id"], "type": "block_end",
+            "message_sent": f"Did you finish {task['name']}?",
+        })
+    return table
+
+
+# ── Claude stand-ins ──
+
+
+def _usage(system: list, tools: list, output: dict, warm: bool) -> SimpleNamespace:
+    cached = sum(estimate_tokens(b["text"]) for b in system if b.get("cache_control"))
+    cached += estimate_tokens(json.dumps(tools))
+    fresh = sum(estimate_tokens(b["text"]) for b in system if not b.get("cache_control"))
+    return SimpleNamespace(
+        input_tokens=fresh,
+        output_tokens=estimate_tokens(json.dumps(output)),
+        cache_read_input_tokens=cached if warm else 0,
+        cache_creation_input_tokens=0 if warm else cached,
+    )
+
+
+def _tool_response(tool_input: dict, usage) -> SimpleNamespace:
+    block = SimpleNamespace(type="tool_use", name=intent_parser.INTENT_TOOL_NAME, input=tool_input)
+    return SimpleNamespace(content=[block], usage=usage, stop_reason="tool_use")
+
+
+# Share of the latency before the first tool-input token arrives
+STREAM_FIRST_TOKEN_FRACTION = 0.3
+STREAM_CHUNK_CHARS = 12
+
+
+class _FakeStream:
+    """Replays a tool call as input_json_delta events spread over `latency` seconds."""
+
+    def __init__(self, response: SimpleNamespace, latency: float):
+        self.response = response
+        self.latency = latency
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        text = json.dumps(self.response.content[0].input)
+        chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        time.sleep(self.latency * STREAM_FIRST_TOKEN_FRACTION)
+        gap = self.latency * (1 - STREAM_FIRST_TOKEN_FRACTION) / max(len(chunks), 1)
+        for chunk in chunks:
+            yield SimpleNamespace(
+                type="content_block_delta",
+                delta=SimpleNamespace(type="input_json_delta", partial_json=chunk),
+            )
+            time.sleep(gap)
+
+    def get_final_message(self):
+        return self.response
+
+
+class StubClient:
+    """Answers like Claude after a sampled delay, without any network call."""
+
+    def __init__(self, latency: float, jitter: float, answer: str, expected: dict, seed: int = 7):
+        self.latency = latency
+        self.jitter = jitter
+        self.answer = answer
+        self.expected = expected
+        self.rng = random.Random(seed)
+        self.warm = False
+        self.messages = self
+
+    def stream(self, model, system, tools, messages, **kwargs):
+        latency = max(0.0, self.rng.gauss(self.latency, self.jitter))
+        return _FakeStream(self._respond(system, tools, messages), latency)
+
+    def create(self, model, system, tools, messages, **kwargs):
+        time.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+        return self._respond(system, tools, messages)
+
+    def _respond(self, system, tools, messages):
+        message = messages[-1]["content"]
+        if self.answer == "expected" and message in self.expected:
+            tool_input = copy.deepcopy(self.expected[message])
+        else:
+            tool_input = intent_parser._mock_parse(message)
+        usage = _usage(system, tools, tool_input, self.warm)
+        self.warm = True
+        return _tool_response(tool_input, usage)
+
+
+def _cassette_key(model: str, message: str) -> str:
+    return hashlib.sha1(f"{model}\n{message}".encode()).hexdigest()[:16]
+
+
+class CassetteClient:
+    """Replays (or, wrapping a live client, records) Claude tool calls by model + message."""
+
+    def __init__(self, cassette: dict, live=None, replay_latency: bool = False):
+        self.cassette = cassette
+        self.live = live
+        self.replay_latency = replay_latency
+        self.misses = []
+        self.messages = self
+
+    def stream(self, model, system, tools, messages, **kwargs):
+        message = messages[-1]["content"]
+        if self.live is not None:
+            return _FakeStream(self._record(model, system, tools, messages, **kwargs), 0.0)
+        entry = self._entry(model, message)
+        latency = entry.get("latency_s", 0) if self.replay_latency else 0.0
+        return _FakeStream(_tool_response(copy.deepcopy(entry["input"]), SimpleNamespace(**entry["usage"])), latency)
+
+    def create(self, model, system, tools, messages, **kwargs):
+        if self.live is not None:
+            return self._record(model, system, tools, messages, **kwargs)
+        entry = self._entry(model, messages[-1]["content"])
+        if self.replay_latency:
+            time.sleep(entry.get("latency_s", 0))
+        return _tool_response(copy.deepcopy(entry["input"]), SimpleNamespace(**entry["usage"]))
+
+    def _record(self, model, system, tools, messages, **kwargs):
+        message = messages[-1]["content"]
+        t0 = time.perf_counter()
+        response = self.live.messages.create(model=model, system=system, tools=tools, messages=messages, **kwargs)
+        tool_input = intent_parser._tool_input(response, message)
+        self.cassette[_cassette_key(model, message)] = {
+            "model": model,
+            "message": message,
+            "input": tool_input,
+            "latency_s": round(time.perf_counter() - t0, 3),
+            "usage": {
+                "input_tokens": response.usage.input_tokens,
+                "output_tokens": response.usage.output_tokens,
+                "cache_read_input_tokens": getattr(response.usage, "cache_read_input_tokens", 0) or 0,
+                "cache_creation_input_tokens": getattr(response.usage, "cache_creation_input_tokens", 0) or 0,
+            },
+        }
+        return response
+
+    def _entry(self, model: str, message: str) -> dict:
+        entry = self.cassette.get(_cassette_key(model, message))
+        if entry is None:
+            self.misses.append(f"{model}: {message}")
+            raise LookupError(f"no cassette entry for {model!r} / {message!r}")
+        return entry
+
+
+def install_parser(mode: str, args, corpus: dict):
+    """Point intent_parser at the client for this mode. Returns the client (or None)."""
+    intent_parser._client = None
+    if mode == "rules":
+        intent_parser.ANTHROPIC_API_KEY = ""
+        return None
+
+    intent_parser.ANTHROPIC_API_KEY = intent_parser.ANTHROPIC_API_KEY or "offline"
+    if mode == "stub":
+        expected = {f["message"]: f["expected"] for f in corpus["fixtures"]}
+        client = StubClient(args.latency, args.jitter, args.stub_answer, expected)
+    else:
+        cassette = {}
+        if os.path.exists(args.cassette):
+            with open(args.cassette) as f:
+                cassette = json.load(f)
+        elif mode == "cassette":
+            sys.exit(f"No cassette at {args.cassette}; record one with --mode record")
+        live = None
+        if mode == "record":
+            if intent_parser.ANTHROPIC_API_KEY == "offline":
+                sys.exit("--mode record needs ANTHROPIC_API_KEY")
+            import anthropic
+            live = anthropic.Anthropic(api_key=intent_parser.ANTHROPIC_API_KEY)
+        client = CassetteClient(cassette, live=live, replay_latency=args.replay_latency)
+    intent_parser._client = client
+    return client
+
+
+# ── Running and scoring ──
+
+
+def score(expected: dict, actual: dict) -> bool:
+    """The intent must match; expected string params must appear in the actual
+    value (case-insensitive), a batch's intents are scored item by item,
+    anything else must be equal."""
+    for key, want in expected.items():
+        got = actual.get(key)
+        if key == "intents" and isinstance(want, list):
+            if not isinstance(got, list) or len(got) != len(want) or not all(map(score, want, got)):
+                return False
+        elif isinstance(want, str):
+            if not isinstance(got, str) or want.lower() not in got.lower():
+                return False
+        elif isinstance(want, (int, float)) and isinstance(got, (int, float)):
+            if float(want) != float(got):
+                return False
+        elif want != got:
+            return False
+    return True
+
+
+def run_fixture(fixture: dict, world: dict, verbose: bool) -> dict:
+    seed_world(world, fixture.get("state"))
+    intent_parser._intent_cache.clear()
+
+    prompt_ctx = whatsapp._build_context()
+    system = intent_parser._build_system_prompt(prompt_ctx, fixture["message"])
+    context_tokens = estimate_tokens(system[1]["text"])
+
+    parsed, replies = {}, []
+    real_parse = whatsapp.parse_intent
+
+    def timed_parse(message, context, **kwargs):
+        t0 = time.perf_counter()
+        parsed["intent"] = real_parse(message, context, **kwargs)
+        parsed["ms"] = (time.perf_counter() - t0) * 1000
+        return parsed["intent"]
+
+    whatsapp.parse_intent = timed_parse
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if verbose else out):
+            t0 = time.perf_counter()
+            asyncio.run(whatsapp._handle_message("bench", fixture["message"], replies.append))
+            pipeline_ms = (time.perf_counter() - t0) * 1000
+    finally:
+        whatsapp.parse_intent = real_parse
+
+    actual = parsed.get("intent", {})
+    return {
+        "id": fixture["id"],
+        "message": fixture["message"],
+        "expected": fixture["expected"],
+        "actual": actual,
+        "ok": score(fixture["expected"], actual),
+        "parse_ms": round(parsed.get("ms", 0.0), 2),
+        "pipeline_ms": round(pipeline_ms, 2),
+        "context_tokens": context_tokens,
+        "reply": replies[-1] if replies else None,
+        "error": "error" in actual or "[ERROR]" in out.getvalue(),
+    }
+
+
+def stress_context_tokens(world: dict, n_tasks: int = 200) -> dict:
+    """Prompt size for a week with n_tasks tasks (the context budget check)."""
+    seed_world({**world, "tasks": []})
+    for i in range(n_tasks):
+        spec = {
+            "name": f"Synthetic task {i:03d} with a reasonably descriptive name",
+            "project": DEFAULT_PROJECTS[i % len(DEFAULT_PROJECTS)]["name"],
+            "day": DAY_NAMES[i % 7],
+            "block_start": f"{8 + i % 9:02d}:00", "block_end": f"{9 + i % 9:02d}:00",
+        }
+        db._table.put_item(Item=_task_item(spec))
+    ctx = whatsapp._build_context()
+    return {
+        "tasks": n_tasks,
+        "context_tokens": estimate_tokens(intent_parser._build_context_prompt(ctx)),
+        "budget": PROMPT_CONTEXT_TOKEN_BUDGET,
+    }
+
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))], 2)
+
+
+def summarize(results: list[dict], stress: dict, client) -> dict:
+    per_intent = defaultdict(lambda: {"n": 0, "ok": 0})
+    for r in results:
+        bucket = per_intent[r["expected"]["intent"]]
+        bucket["n"] += 1
+        bucket["ok"] += r["ok"]
+
+    parse = [r["parse_ms"] for r in results]
+    pipeline = [r["pipeline_ms"] for r in results]
+    ctx_tokens = [r["context_tokens"] for r in results]
+    static_tokens = estimate_tokens(intent_parser._STATIC_PROMPT) + estimate_tokens(json.dumps(intent_parser._INTENT_TOOL))
+    return {
+        "fixtures": len(results),
+        "accuracy": round(sum(r["ok"] for r in results) / len(results), 3) if results else 0.0,
+        "errors": sum(r["error"] for r in results),
+        "per_intent": {k: {**v, "accuracy": round(v["ok"] / v["n"], 3)} for k, v in sorted(per_intent.items())},
+        "prompt_tokens": {
+            "static": static_tokens,
+            "context_mean": round(statistics.mean(ctx_tokens), 1) if ctx_tokens else 0,
+            "context_max": max(ctx_tokens, default=0),
+        },
+        "parse_ms": {"p50": _pct(parse, 50), "p95": _pct(parse, 95), "max": _pct(parse, 100)},
+        "pipeline_ms": {"p50": _pct(pipeline, 50), "p95": _pct(pipeline, 95), "max": _pct(pipeline, 100)},
+        "stress": stress,
+        "cassette_misses": getattr(client, "misses", []),
+    }
+
+
+def print_report(mode: str, summary: dict, results: list[dict]) -> None:
+    print(f"\nIntent benchmark — mode={mode}, {summary['fixtures']} fixtures\n")
+    print(f"  {'intent':<20} {'n':>3} {'ok':>3}  accuracy")
+    for intent, s in summary["per_intent"].items():
+        print(f"  {intent:<20} {s['n']:>3} {s['ok']:>3}  {s['accuracy']:.0%}")
+    print(f"\n  overall accuracy   {summary['accuracy']:.1%}   ({summary['errors']} errors)")
+
+    pt = summary["prompt_tokens"]
+    print(f"  prompt tokens      static {pt['static']}, context mean {pt['context_mean']} / max {pt['context_max']}")
+    for name in ("parse_ms", "pipeline_ms"):
+        t = summary[name]
+        print(f"  {name:<18} p50 {t['p50']:.1f}  p95 {t['p95']:.1f}  max {t['max']:.1f}")
+    st = summary["stress"]
+    flag = "OK" if st["context_tokens"] <= st["budget"] else "OVER BUDGET"
+    print(f"  {st['tasks']}-task week      context {st['context_tokens']} tokens (budget {st['budget']}) {flag}")
+
+    failures = [r for r in results if not r["ok"]]
+    if failures:
+        print("\n  Misses:")
+        for r in failures:
+            got = {k: v for k, v in r["actual"].items() if k in r["expected"] or k == "intent"}
+            print(f"    {r['id']:<12} {r['message']!r}\n                 expected {r['expected']} got {got}")
+    if summary["cassette_misses"]:
+        print(f"\n  {len(summary['cassette_misses'])} fixture(s) missing from the cassette; re-record with --mode record")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["rules", "stub", "cassette", "record"], default="stub")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub: mean LLM latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="stub: latency standard deviation")
+    parser.add_argument("--stub-answer", choices=["rules", "expected"], default="rules")
+    parser.add_argument("--replay-latency", action="store_true", help="cassette: sleep for the recorded latency")
+    parser.add_argument("--only", help="comma-separated fixture ids or intents to run")
+    parser.add_argument("--json", dest="json_out", help="write the full results to this file")
+    parser.add_argument("--min-accuracy", type=float, help="exit non-zero below this accuracy (0-1)")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline output")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = json.load(f)
+    fixtures = corpus["fixtures"]
+    if args.only:
+        wanted = set(args.only.split(","))
+        fixtures = [f for f in fixtures if f["id"] in wanted or f["expected"]["intent"] in wanted]
+
+    client = install_parser(args.mode, args, corpus)
+    results = [run_fixture(f, corpus["world"], args.verbose) for f in fixtures]
+    stress = stress_context_tokens(corpus["world"])
+
+    if args.mode == "record":
+        with open(args.cassette, "w") as f:
+            json.dump(client.cassette, f, indent=2, ensure_ascii=False, sort_keys=True)
+        print(f"Recorded {len(client.cassette)} responses to {args.cassette}")
+
+    summary = summarize(results, stress, client)
+    print_report(args.mode, summary, results)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"mode": args.mode, "summary": summary, "results": results}, f, indent=2, default=str)
+
+    if args.min_accuracy is not None and summary["accuracy"] < args.min_accuracy:
+        sys.exit(1)
+    if summary["stress"]["context_tokens"] > summary["stress"]["budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Train the local intent classifier from the chat log.
+
+Each assistant message in CHAT#<date> carries the intent that was resolved
+for the user message before it, and the route that resolved it; those
+(message, intent) pairs are the training data. Only clean pairs are used:
+exactly one user message followed by one assistant reply (burst-merged
+messages are skipped), labelled by the LLM. Intents the rules or this
+classifier answered are left out, so the model never trains on its own
+predictions. Items logged before routes were recorded count as LLM-labelled
+(the LLM was the only parser then, short of running without an API key).
+
+Usage:
+    python scripts/train_intent_classifier.py --days 120
+    python scripts/train_intent_classifier.py --days 120 --out /tmp/model.json --threshold 0.85
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Load env if .env exists
+env_path = os.path.join(os.path.dirname(__file__), "..", "..", ".env")
+if os.path.exists(env_path):
+    with open(env_path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                key, val = line.split("=", 1)
+                os.environ.setdefault(key.strip(), val.strip())
+
+from app.db import get_chat_log
+from app.config import INTENT_CLASSIFIER_PATH, INTENT_CLASSIFIER_THRESHOLD
+from app.agents.intent_classifier import IntentClassifier, LOCAL_INTENTS, OTHER
+
+# Routes whose intents are trusted as labels (None: logged before routes were)
+LABEL_ROUTES = ("llm", None)
+
+
+def load_examples(days: int) -> list[tuple[str, str]]:
+    examples = []
+    today = date.today()
+    for n in range(days):
+        msgs = get_chat_log((today - timedelta(days=n)).isoformat(), limit=0)
+        user_run = []
+        for m in msgs:
+            if m.get("role") == "user":
+                user_run.append(m.get("content", ""))
+                continue
+            if len(user_run) == 1 and m.get("intent") and m.get("route") in LABEL_ROUTES:
+                examples.append((user_run[0], m["intent"]))
+            user_run = []
+    return examples
+
+
+def evaluate(model: IntentClassifier, examples: list[tuple[str, str]], threshold: float) -> dict:
+    """Coverage = share of messages answered locally; precision = how many of those were right."""
+    handled = correct = 0
+    t0 = time.perf_counter()
+    for text, label in examples:
+        pred, conf = model.predict(text)
+        if pred != OTHER and conf >= threshold:
+            handled += 1
+            correct += pred == label
+    per_msg_ms = (time.perf_counter() - t0) * 1000 / max(len(examples), 1)
+    return {
+        "examples": len(examples),
+        "coverage": round(handled / len(examples), 3) if examples else 0.0,
+        "precision": round(correct / handled, 3) if handled else 0.0,
+        "ms_per_message": round(per_msg_ms, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local intent classifier from the chat log.")
+    parser.add_argument("--days", type=int, default=90, help="how many days of chat log to read")
+    parser.add_argument("--out", default=INTENT_CLASSIFIER_PATH)
+    parser.add_argument("--threshold", type=float, default=INTENT_CLASSIFIER_THRESHOLD,
+                        help="confidence threshold to report coverage/precision at")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of examples held out for evaluation")
+    args = parser.parse_args()
+
+    examples = load_examples(args.days)
+    if not examples:
+        print("No labelled messages found in the chat log.")
+        return
+    counts = Counter(label if label in LOCAL_INTENTS else OTHER for _, label in examples)
+    print(f"Loaded {len(examples)} examples: " + ", ".join(f"{k}={v}" for k, v in counts.most_common()))
+
+    rng = random.Random(7)
+    rng.shuffle(examples)
+    n_test = int(len(examples) * args.holdout)
+    test, train = examples[:n_test], examples[n_test:]
+
+    model = IntentClassifier.train(train, epochs=args.epochs)
+    if test:
+        print(f"Holdout @ {args.threshold}: {evaluate(model, test, args.threshold)}")
+
+    # Ship a model trained on everything
+    model = IntentClassifier.train(examples, epochs=args.epochs)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(model.to_json(), f, separators=(",", ":"))
+    print(f"Wrote {args.out} ({os.path.getsize(args.out) // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+from app import db
+from app.routes import whatsapp
+
+
+class _Table:
+    def __init__(self):
+        self.meta = type("Meta", (), {"client": type("Client", (), {"transact_write_items": lambda self, **kw: None})()})()
+
+
+def test_later_action_sees_task_added_earlier_in_the_batch(monkeypatch):
+    monkeypatch.setattr(db, "get_table", lambda: _Table())
+    context = {
+        "week_id": "2026-W43", "day_of_week": "Monday", "projects": [],
+        "week_tasks": [{"id": "t1", "name": "Grade midterms", "day": "monday", "status": "todo"}],
+        "today_tasks": [],
+    }
+    intent = {"intent": "batch", "intents": [
+        {"intent": "add_task", "tasks": [{"name": "Email for 550", "day": "monday", "estimated_hours": 0.5}]},
+        {"intent": "move_task", "task_match": "email for 550", "to_day": "thursday"},
+    ]}
+    results = whatsapp._handle_batch(intent, context)["results"]
+    assert "error" not in results[1]
+    assert results[1]["task"]["name"] == "Email for 550"
+    assert results[1]["task"]["day"] == "thursday"
+    assert results[1]["day_load"] == 0.5
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from app import config
+from app.agents import conversation_summary
+
+
+def _history(n):
+    return [{"role": "user", "content": f"m{i}", "timestamp": f"2026-10-19T09:{i:02d}:00"} for i in range(n)]
+
+
+def test_first_summary_request_starts_the_cooldown(monkeypatch):
+    store = {}
+    requests = []
+
+    def update_item(pk, sk, updates):
+        store.update(updates)
+
+    monkeypatch.setattr(conversation_summary.db, "update_item", update_item)
+    monkeypatch.setattr(conversation_summary, "request_update", lambda: requests.append(True))
+    n = config.SUMMARY_EVERY_N_MESSAGES + config.SUMMARY_KEEP_RECENT_MESSAGES
+
+    context = {"today": "2026-10-19", "chat_history": _history(n), "conversation_summary": None}
+    conversation_summary.maybe_request_update(context)
+    assert requests == [True]
+    assert datetime.fromisoformat(store["update_requested_at"])
+
+    # Next message: the stub item is loaded as the summary; no second request
+    context = {"today": "2026-10-19", "chat_history": _history(n + 1), "conversation_summary": dict(store)}
+    conversation_summary.maybe_request_update(context)
+    assert requests == [True]
@@ -0,0 +1,49 @@
+from app.services.day_scheduler import parse_time, schedule_day, to_minutes
+
+
+def _task(sk, hours=1, **kw):
+    return {"sk": sk, "id": sk, "name": sk.title(), "status": "todo", "estimated_hours": hours, **kw}
+
+
+def test_parse_time_accepts_clock_formats():
+    assert parse_time("09:00") == 9 * 60
+    assert parse_time("9:30 AM") == 9 * 60 + 30
+    assert parse_time("2pm") == 14 * 60
+    assert parse_time("12 am") == 0
+    assert parse_time("after lunch") is None
+    assert parse_time("25:00") is None
+    assert parse_time(None) is None
+
+
+def test_am_pm_block_start_is_fixed():
+    plan = schedule_day([_task("class", 1.5, block_start="9:00 AM", block_end="10:30 AM")])
+    assert [(b["start"], b["end"], b["task_id"]) for b in plan["blocks"] if b["task_id"]] == [("09:00", "10:30", "class")]
+
+
+def test_unparseable_block_start_is_scheduled_as_flexible():
+    tasks = [_task("fixed", 1, block_start="08:00", block_end="09:00"), _task("vague", 1, block_start="after lunch")]
+    plan = schedule_day(tasks)
+    blocks = {b["task_id"]: b for b in plan["blocks"] if b["task_id"]}
+    assert set(blocks) == {"fixed", "vague"}
+    assert blocks["vague"]["start"] == "09:00"
+    assert not plan["unplaced"] and not plan["conflicts"]
+
+
+def test_no_break_without_work_right_after_it():
+    # 2.5h of fixed work until 10:30. The 1.5h task would fit before lunch
+    # but needs a break first, and after one it no longer fits, so it moves
+    # past lunch and no break may be left behind at 10:30
+    tasks = [_task("morning", 2.5, block_start="08:00", block_end="10:30"), _task("long", 1.5)]
+    plan = schedule_day(tasks, capacity_hours=8)
+    spans = [(b["start"], b["end"], b["label"]) for b in plan["blocks"]]
+    assert [s for s in spans if s[2] == "Break"] == []
+    assert ("13:00", "14:30", "Long") in spans
+
+
+def test_blocks_never_overlap():
+    tasks = [_task(f"t{i}", h, priority=p) for i, (h, p) in enumerate(
+        [(2, "high"), (0.5, "low"), (1.5, "urgent"), (3, "normal"), (1, "normal"), (0.25, "high")])]
+    tasks.append(_task("pinned", 1, block_start="10:00", block_end="11:00"))
+    plan = schedule_day(tasks, capacity_hours=10)
+    spans = sorted((to_minutes(b["start"]), to_minutes(b["end"])) for b in plan["blocks"])
+    assert all(e1 <= s2 for (_, e1), (s2, _) in zip(spans, spans[1:]))
@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from app import db
+
+
+def test_burst_read_is_strongly_consistent(monkeypatch):
+    calls = []
+
+    class _Table:
+        def query(self, **kwargs):
+            calls.append(kwargs)
+            return {"Items": [{"pk": "BURST#wa", "sk": "1", "received_at": datetime.utcnow().isoformat()}]}
+
+    monkeypatch.setattr(db, "get_table", lambda: _Table())
+    assert [m["sk"] for m in db.get_burst_messages("wa")] == ["1"]
+    assert calls[0]["ConsistentRead"] is True
@@ -0,0 +1,50 @@
+import pytest
+
+from app import db
+
+
+class _Client:
+    def __init__(self):
+        self.calls = []
+
+    def transact_write_items(self, TransactItems):
+        self.calls.append(TransactItems)
+
+
+class _Table:
+    def __init__(self):
+        self.meta = type("Meta", (), {"client": _Client()})()
+
+
+@pytest.fixture
+def table(monkeypatch):
+    t = _Table()
+    monkeypatch.setattr(db, "get_table", lambda: t)
+    return t
+
+
+def test_writes_go_out_in_one_call_and_then_after_commit_runs(table):
+    seen = []
+    with db.transaction():
+        db.put_item({"pk": "AGENTNOTE", "sk": "n1", "note": "x"})
+        db.after_commit(lambda: seen.append(len(table.meta.client.calls)))
+        assert seen == []
+    assert len(table.meta.client.calls) == 1
+    assert seen == [1]
+
+
+def test_over_limit_transaction_writes_nothing(table):
+    seen = []
+    with pytest.raises(ValueError):
+        with db.transaction():
+            for i in range(db.TRANSACTION_MAX_ITEMS + 1):
+                db.put_item({"pk": "TASK", "sk": f"t{i}"})
+            db.after_commit(lambda: seen.append(True))
+    assert table.meta.client.calls == []
+    assert seen == []
+
+
+def test_after_commit_runs_now_outside_a_transaction():
+    seen = []
+    db.after_commit(lambda: seen.append(True))
+    assert seen == [True]
@@ -0,0 +1,29 @@
+import pytest
+
+from app.agents import intent_parser
+
+
+@pytest.fixture
+def tiers(monkeypatch):
+    calls = []
+
+    def parse(message, system_prompt, tier, deadline, on_intent=None):
+        calls.append(tier)
+        return {"intent": "chat", "message": message, "reply": "..."}
+
+    monkeypatch.setattr(intent_parser, "ANTHROPIC_API_KEY", "test")
+    monkeypatch.setattr(intent_parser, "ROUTE_ESCALATE", True)
+    monkeypatch.setattr(intent_parser, "_local_parse", lambda message, context: None)
+    monkeypatch.setattr(intent_parser, "_build_system_prompt", lambda context, message: [])
+    monkeypatch.setattr(intent_parser, "_parse_within_budget", parse)
+    return calls
+
+
+def test_short_substantive_chat_escalates(tiers):
+    intent_parser.parse_intent("should I skip the gym", {"today": "2026-10-19"})
+    assert tiers == ["fast", "full"]
+
+
+def test_bare_acknowledgement_stays_on_the_fast_tier(tiers):
+    intent_parser.parse_intent("thanks!", {"today": "2026-10-19"})
+    assert tiers == ["fast"]
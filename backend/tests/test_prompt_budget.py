@@ -0,0 +1,47 @@
+from app.agents.intent_parser import _build_context_prompt
+from app.agents.prompt_budget import estimate_tokens
+from app.config import PROMPT_CONTEXT_TOKEN_BUDGET, SUMMARY_KEEP_RECENT_MESSAGES
+from app.constants import DAYS
+
+
+def _context(n_tasks: int, n_notes: int = 30) -> dict:
+    projects = [{"id": f"p{i}", "sk": f"p{i}", "name": f"Project {i}", "area": "research",
+                 "match_keywords": [f"kw{i}", f"topic {i}"]} for i in range(12)]
+    week = [{
+        "id": f"t{i}", "sk": f"t{i}",
+        "name": f"Synthetic task {i:03d} with a reasonably descriptive name",
+        "project_id": f"p{i % 12}", "day": DAYS[i % 7], "status": "todo", "priority": "normal",
+        "estimated_hours": 1, "block_start": f"{8 + i % 9:02d}:00", "block_end": f"{9 + i % 9:02d}:00",
+    } for i in range(n_tasks)]
+    notes = [{"id": f"n{i}", "note": f"Remember detail number {i} about the committee and grading",
+              "created_at": f"2026-10-{1 + i % 28:02d}"} for i in range(n_notes)]
+    return {
+        "today": "2026-10-19", "day_of_week": "Monday", "current_time": "10:00",
+        "settings": {}, "projects": projects, "week_tasks": week,
+        "today_tasks": [t for t in week if t["day"] == "monday"],
+        "pending": None, "recent_checkins": [], "agent_notes": notes,
+        "behavior_overrides": [], "chat_history": [], "conversation_summary": None,
+    }
+
+
+def test_200_task_week_stays_within_budget():
+    prompt = _build_context_prompt(_context(200), "add grading for project 3 on friday")
+    assert estimate_tokens(prompt) <= PROMPT_CONTEXT_TOKEN_BUDGET
+
+
+def test_small_week_is_not_trimmed():
+    prompt = _build_context_prompt(_context(10, n_notes=3), "what's next")
+    assert estimate_tokens(prompt) <= PROMPT_CONTEXT_TOKEN_BUDGET
+    for i in range(10):
+        assert f"Synthetic task {i:03d}" in prompt
+
+
+def test_only_the_last_few_unsummarized_messages_are_verbatim():
+    context = _context(10, n_notes=3)
+    context["chat_history"] = [
+        {"role": "user", "content": f"chat line {i:02d}", "timestamp": f"2026-10-19T09:{i:02d}:00"}
+        for i in range(15)
+    ]
+    prompt = _build_context_prompt(context, "what's next")
+    shown = [i for i in range(15) if f"chat line {i:02d}" in prompt]
+    assert shown == list(range(15 - SUMMARY_KEEP_RECENT_MESSAGES, 15))
@@ -0,0 +1,38 @@
+from app.services.task_index import TaskIndex
+
+
+def _tasks(*names):
+    return [{"id": f"t{i}", "name": n, "status": "todo"} for i, n in enumerate(names)]
+
+
+def test_transposed_letters_match():
+    index = TaskIndex(_tasks("Grading BADM 358 midterms", "Call accountant", "Lecture prep"))
+    assert index.best("grdaing")["task"]["name"] == "Grading BADM 358 midterms"
+    assert TaskIndex(_tasks("Grade homework", "Email dean")).best("grdae")["task"]["name"] == "Grade homework"
+
+
+def test_unrelated_word_does_not_match():
+    index = TaskIndex(_tasks("Grading BADM 358 midterms", "Call accountant"))
+    assert index.best("dentist")["task"] is None
+
+
+def test_short_words_are_not_typo_matched():
+    assert TaskIndex(_tasks("Dean meeting")).best("den")["task"] is None
+
+
+def test_open_task_wins_over_done_task_with_the_same_name():
+    tasks = [
+        {"id": "mon", "name": "Office Hours", "day": "monday", "status": "done"},
+        {"id": "wed", "name": "Office Hours", "day": "wednesday", "status": "todo"},
+    ]
+    match = TaskIndex(tasks).best("office hours")
+    assert match["task"]["id"] == "wed"
+    assert not match["ambiguous"]
+
+
+def test_same_named_open_tasks_stay_ambiguous():
+    tasks = [
+        {"id": "mon", "name": "Office Hours", "day": "monday", "status": "todo"},
+        {"id": "wed", "name": "Office Hours", "day": "wednesday", "status": "todo"},
+    ]
+    assert TaskIndex(tasks).best("office hours")["ambiguous"]
@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import train_intent_classifier
+
+
+def test_only_llm_labelled_pairs_are_training_data(monkeypatch):
+    # Items without a route predate route logging and were LLM-labelled
+    log = [
+        {"role": "user", "content": "what's next"},
+        {"role": "assistant", "intent": "query_next", "route": "classifier"},
+        {"role": "user", "content": "done"},
+        {"role": "assistant", "intent": "checkin_response", "route": "rules"},
+        {"role": "user", "content": "show my week"},
+        {"role": "assistant", "intent": "query_week", "route": "llm"},
+        {"role": "user", "content": "thanks"},
+        {"role": "assistant", "intent": "chat"},
+        {"role": "user", "content": "skip it"},
+        {"role": "assistant", "intent": "mark_skipped", "route": "fallback"},
+    ]
+    monkeypatch.setattr(train_intent_classifier, "get_chat_log", lambda date_str, limit=20: log)
+    assert train_intent_classifier.load_examples(1) == [("show my week", "query_week"), ("thanks", "chat")]
@@ -59,6 +59,13 @@ deploy_dynamodb() {
     echo "  Waiting for table to be active..."
     aws dynamodb wait table-exists --table-name $TABLE_NAME --region $REGION
     echo "  Table ready."
+
+    # Expire webhook dedupe records (WEBHOOK items) via the "ttl" attribute
+    aws dynamodb update-time-to-live \
+        --table-name $TABLE_NAME \
+        --time-to-live-specification "Enabled=true, AttributeName=ttl" \
+        --region $REGION \
+        2>/dev/null && echo "  TTL enabled." || echo "  TTL already enabled."
 }
 
 # ── IAM Role ──